@@ -0,0 +1,69 @@
+"""Measure how long the Lambda modules take to import, as on a cold start.
+
+Each module is imported in a fresh interpreter, several times, and the
+median is reported along with whether boto3 was imported along the way:
+
+    python3 benchmark/import_time.py
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# What each module is compared against: importing boto3 on its own is what
+# sync.py and alarm.py used to pay on every cold start
+DEFAULT_MODULES = ['sync', 'alarm', 'boto3']
+
+# Prints the import time in seconds, and whether boto3 is loaded
+SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, 'boto3' in sys.modules)
+'''
+
+
+def import_time(module, env):
+    """Import a module in a fresh interpreter.
+
+    :return: tuple of (seconds taken, whether boto3 was imported)
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', SCRIPT.format(module=module)],
+        cwd=ROOT / 'src',
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    return float(output[0]), output[1] == 'True'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                    prog = 'import_time',
+                    description = 'Measures cold import times of the Lambda modules')
+    parser.add_argument('-m', '--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('-r', '--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    # The environment of a deployed function: config, but no credentials
+    env = {
+        **os.environ,
+        'SLACK_CHANNEL': 'benchmark',
+        'SLACK_FOOTER_URL': 'https://example.com/benchmark',
+        'SLACK_TOPIC_ARN': 'arn:aws:sns:us-east-1:000000000000:benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'ACTION_NETWORK_SECRET_ID': 'actionnetwork/benchmark',
+        'AIRTABLE_SECRET_ID': 'airtable/benchmark',
+        'PYTHONDONTWRITEBYTECODE': '1',
+    }
+    for module in args.modules:
+        results = [import_time(module, env) for _ in range(args.repeat)]
+        seconds = statistics.median(seconds for seconds, _ in results)
+        boto3_imported = any(imported for _, imported in results)
+        print(f"{module:<10} {seconds * 1000:>8.1f}ms  boto3 imported: {boto3_imported}")
@@ -0,0 +1,243 @@
+"""Benchmark the sync against local stand-ins for ActionNetwork and Airtable.
+
+Each benchmark runs at every requested size, on synthetic data (see
+synthetic.py) served by local HTTP stand-ins (see standins.py), so no live
+API is touched. Results are printed as a table, and can be saved as JSON and
+compared against a saved baseline to catch regressions before deploying:
+
+    python3 benchmark/run.py --sizes 1000 10000 --output baseline.json
+    python3 benchmark/run.py --sizes 1000 10000 --baseline baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+# Run from a checkout, like src/sync.py
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / 'src'), str(ROOT)]
+
+from benchmark import synthetic
+from benchmark.standins import ActionNetworkStandIn
+from benchmark.standins import AirtableStandIn
+from event_connectors import actionnetwork
+from event_connectors import airtable
+from event_models.events import EventDiffer
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Default share of slowdown against the baseline that counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+# Write budget for the handler. The sync's own budget matches Airtable's rate
+# limit, which would make the write time depend on little else.
+DEFAULT_WRITE_REQUESTS_PER_SECOND = 100
+
+# Stand-in credentials
+AIRTABLE_TOKEN = 'patBenchmark'
+AIRTABLE_BASE_ID = 'appBenchmark'
+
+
+@contextlib.contextmanager
+def quiet():
+    """Hide the sync's progress output while it is being timed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def stand_ins(data, args):
+    """Serve the data from fresh stand-ins, and point the connectors at them."""
+    actionnetwork_stand_in = ActionNetworkStandIn(
+        data.events_by_group,
+        latency=args.latency,
+        requests_per_second=args.actionnetwork_rate_limit,
+    )
+    airtable_stand_in = AirtableStandIn(
+        data.airtable_records,
+        base_id=AIRTABLE_BASE_ID,
+        latency=args.latency,
+        requests_per_second=args.airtable_rate_limit,
+    )
+    with actionnetwork_stand_in, airtable_stand_in, \
+            mock.patch.object(actionnetwork, 'API_URL', actionnetwork_stand_in.api_url), \
+            mock.patch.object(airtable, 'API_URL', airtable_stand_in.api_url):
+        yield actionnetwork_stand_in, airtable_stand_in
+
+
+def bench_raw_events(data, args):
+    with stand_ins(data, args) as (actionnetwork_stand_in, _):
+        start = time.perf_counter()
+        with quiet():
+            for api_key in actionnetwork_stand_in.group_key_map.values():
+                actionnetwork.ActionNetwork(api_key).raw_events(
+                    page_workers=args.page_workers
+                )
+        return time.perf_counter() - start
+
+
+def bench_airtable_events(data, args):
+    with stand_ins(data, args):
+        start = time.perf_counter()
+        airtable.Airtable(AIRTABLE_TOKEN, AIRTABLE_BASE_ID).events()
+        return time.perf_counter() - start
+
+
+def bench_match_events(data, args):
+    differ = EventDiffer(data.source_events(), data.destination_events())
+    start = time.perf_counter()
+    with quiet():
+        differ.match_events()
+    return time.perf_counter() - start
+
+
+def bench_events_to_update(data, args):
+    differ = EventDiffer(data.source_events(), data.destination_events())
+    with quiet():
+        differ.match_events()
+        start = time.perf_counter()
+        differ.events_to_update()
+    return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def configured_sync(actionnetwork_stand_in, args):
+    """Import the sync module, configured to sync from the stand-ins.
+
+    The sync window is turned off, as the synthetic events are dated
+    relative to synthetic.NOW rather than today.
+
+    :return: the sync module
+    """
+    import sync
+
+    with mock.patch.object(sync, 'ACTION_NETWORK_GROUP_KEY_MAP', actionnetwork_stand_in.group_key_map), \
+            mock.patch.object(sync, 'AIRTABLE_PERSONAL_ACCESS_TOKEN', AIRTABLE_TOKEN), \
+            mock.patch.object(sync, 'AIRTABLE_BASE_ID', AIRTABLE_BASE_ID), \
+            mock.patch.object(sync, 'AIRTABLE_REQUESTS_PER_SECOND', args.write_requests_per_second), \
+            mock.patch.object(sync, 'SYNC_WINDOW_DAYS', 0):
+        yield sync
+
+
+def bench_handler(data, args):
+    with stand_ins(data, args) as (actionnetwork_stand_in, _), \
+            configured_sync(actionnetwork_stand_in, args) as sync:
+        start = time.perf_counter()
+        with quiet():
+            sync.handler({
+                'dryrun': False,
+                'page_workers': args.page_workers,
+                'stream': args.stream,
+                'async': args.use_async,
+            })
+        return time.perf_counter() - start
+
+
+BENCHMARKS = {
+    'raw_events': bench_raw_events,
+    'airtable_events': bench_airtable_events,
+    'match_events': bench_match_events,
+    'events_to_update': bench_events_to_update,
+    'handler': bench_handler,
+}
+
+
+def run(args):
+    """Run every selected benchmark at every size.
+
+    :return: best time in seconds, keyed by benchmark name and then size
+    :rtype: dict
+    """
+    results = {name: {} for name in args.benchmarks}
+    for size in args.sizes:
+        data = synthetic.generate(
+            size,
+            groups=args.groups,
+            change_ratio=args.change_ratio,
+            mean_description_size=args.description_size,
+            seed=args.seed,
+        )
+        print(
+            f"{size} events: {data.changed} changed, {data.new} new, "
+            f"{data.orphaned} orphaned", file=sys.stderr
+        )
+        for name in args.benchmarks:
+            times = [BENCHMARKS[name](data, args) for _ in range(args.repeat)]
+            results[name][str(size)] = round(min(times), 4)
+            print(f"{name:<18} {size:>8} {min(times):>10.3f}s")
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """Compare results against a baseline.
+
+    :return: descriptions of the benchmarks that got slower by more than the
+        tolerance
+    :rtype: list[str]
+    """
+    slower = []
+    for name, times in results.items():
+        for size, seconds in times.items():
+            before = baseline.get(name, {}).get(size)
+            if before and seconds > before * (1 + tolerance):
+                slower.append(
+                    f"{name} at {size} events: {before:.3f}s -> {seconds:.3f}s"
+                )
+    return slower
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser(
+                    prog = 'benchmark',
+                    description = 'Benchmarks the sync against local API stand-ins')
+    parser.add_argument('-b', '--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('-n', '--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('-r', '--repeat', type=int, default=1)
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--change-ratio', type=float, default=0.05)
+    parser.add_argument('--description-size', type=int, default=1500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every API response')
+    parser.add_argument('--actionnetwork-rate-limit', type=float, help='ActionNetwork requests per second')
+    parser.add_argument('--airtable-rate-limit', type=float, help='Airtable requests per second')
+    parser.add_argument('--write-requests-per-second', type=float, default=DEFAULT_WRITE_REQUESTS_PER_SECOND)
+    parser.add_argument('--page-workers', type=int, default=actionnetwork.DEFAULT_PAGE_WORKERS)
+    parser.add_argument('--stream', action='store_true')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='sync with the asyncio connectors')
+    parser.add_argument('-o', '--output', help='save the results as JSON')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    return parser
+
+
+def default_args(**kwargs):
+    """Get the default options, as parsed from an empty command line.
+
+    :param kwargs: options to override
+    :rtype: argparse.Namespace
+    """
+    args = argument_parser().parse_args([])
+    vars(args).update(kwargs)
+    return args
+
+
+if __name__ == '__main__':
+    args = argument_parser().parse_args()
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for regression in slower:
+            print(f"REGRESSION {regression}")
+        if slower:
+            sys.exit(1)
@@ -0,0 +1,334 @@
+"""Local HTTP stand-ins for the ActionNetwork and Airtable APIs.
+
+The stand-ins serve synthetic data (see synthetic.py) over real HTTP, so that
+benchmarks exercise the same sessions, paging and retries as a live sync. They
+implement just enough of each API for the sync: reading events from
+ActionNetwork, and listing, creating, updating and upserting Airtable records.
+
+Each stand-in can add latency to every response and enforce a request rate
+limit, answering 429 once the limit is exceeded.
+"""
+import json
+import math
+import re
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from datetime import timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmark.synthetic import ACTION_NETWORK_PAGE_SIZE
+from benchmark.synthetic import AIRTABLE_PAGE_SIZE
+from benchmark.synthetic import actionnetwork_page
+
+# Matches a single condition of an ActionNetwork OData filter, such as
+# modified_date gt '2024-01-01T00:00:00Z'
+FILTER_CONDITION = re.compile(r"(\w+) gt '([^']*)'")
+
+# Matches a lookup by actionnetwork_id in an Airtable formula, such as
+# {actionnetwork_id}='event-1'
+ACTIONNETWORK_ID_LOOKUP = re.compile(r"\{actionnetwork_id\}='([^']*)'")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep connections open, as the real APIs do, so sessions can reuse them
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, which Nagle's algorithm
+    # would otherwise hold up on every kept-alive request
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        self.server.stand_in.handle(self)
+
+    do_GET = do_POST = do_PATCH = _handle
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # socketserver only queues 5 connections by default, so clients opening
+    # many connections at once would have some dropped and retried a second
+    # later, which real APIs don't do
+    request_queue_size = 128
+
+
+class StandIn:
+    """Base class for API stand-ins, running in a background thread.
+
+    Use as a context manager, or call start and stop.
+    """
+
+    def __init__(self, latency=0, requests_per_second=None):
+        """
+        :param latency: seconds to wait before answering each request
+        :type latency: float, optional
+        :param requests_per_second: requests allowed in any one second before
+            answering 429. defaults to None (unlimited)
+        :type requests_per_second: float, optional
+        """
+        self.latency = latency
+        self.requests_per_second = requests_per_second
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self._lock = threading.Lock()
+        self._window_start = 0
+        self._window_count = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.stand_in = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _retry_after(self):
+        """Count a request against the rate limit.
+
+        :return: seconds until the request may be retried, or None if it is
+            within the limit
+        """
+        with self._lock:
+            self.request_count += 1
+            if not self.requests_per_second:
+                return None
+            now = time.monotonic()
+            if now - self._window_start >= 1:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            if self._window_count > self.requests_per_second:
+                self.rate_limited_count += 1
+                return 1 - (now - self._window_start)
+        return None
+
+    def handle(self, request):
+        length = int(request.headers.get('Content-Length') or 0)
+        body = json.loads(request.rfile.read(length)) if length else None
+        if self.latency:
+            time.sleep(self.latency)
+
+        retry_after = self._retry_after()
+        if retry_after is not None:
+            status = 429
+            response = {'errors': [{'error': 'RATE_LIMIT_REACHED'}]}
+            headers = {'Retry-After': str(math.ceil(retry_after))}
+        else:
+            url = urllib.parse.urlsplit(request.path)
+            status, response = self.respond(
+                request.command,
+                url.path,
+                urllib.parse.parse_qs(url.query),
+                body,
+                request.headers,
+            )
+            headers = {}
+
+        payload = json.dumps(response).encode()
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def respond(self, method, path, params, body, headers):
+        """Answer a request that is within the rate limit.
+
+        :param params: query params, as lists of values keyed by name
+        :return: tuple of (status code, response body)
+        """
+        raise NotImplementedError
+
+
+class ActionNetworkStandIn(StandIn):
+    """Serves the events of several ActionNetwork groups, one API key per
+    group.
+
+    Events are filtered by the created_date, modified_date and start_date
+    conditions of the filter param, and paged like the real API.
+    """
+
+    def __init__(self, events_by_group, page_size=ACTION_NETWORK_PAGE_SIZE, **kwargs):
+        """
+        :param events_by_group: raw events keyed by group name
+        :type events_by_group: dict
+        :param page_size: events per page
+        :type page_size: int, optional
+        :param kwargs: latency and rate limit; see StandIn
+        """
+        super().__init__(**kwargs)
+        self.events_by_group = events_by_group
+        self.page_size = page_size
+
+    @property
+    def api_url(self):
+        """The root URL of the API, in place of actionnetwork.API_URL"""
+        return f'{self.url}/api/v2/'
+
+    @property
+    def group_key_map(self):
+        """API keys for each group, in the format the sync is configured with"""
+        return {group: f'key-{group}' for group in self.events_by_group}
+
+    def respond(self, method, path, params, body, headers):
+        api_key = headers.get('OSDI-API-Token', '')
+        group = api_key[len('key-'):]
+        if group not in self.events_by_group:
+            return 401, {'error': 'API Key invalid or not present'}
+
+        if path == '/api/v2/':
+            return 200, {
+                'motd': 'Welcome to the ActionNetwork stand-in',
+                '_links': {'osdi:events': {'href': f'{self.api_url}events'}},
+            }
+        if path == '/api/v2/events':
+            query = {name: values[-1] for name, values in params.items()}
+            events = self.events_by_group[group]
+            for field, value in FILTER_CONDITION.findall(query.get('filter', '')):
+                after = datetime.fromisoformat(value)
+                events = [
+                    e for e in events
+                    if datetime.fromisoformat(e[field]) > after
+                ]
+            page = int(query.pop('page', 1))
+            return 200, actionnetwork_page(
+                events, page, f'{self.api_url}events', self.page_size, query
+            )
+        return 404, {'error': 'Not found'}
+
+
+class AirtableStandIn(StandIn):
+    """Serves a single Airtable table.
+
+    Listing ignores the filter formula, other than skipping records without an
+    actionnetwork_id and looking up records by actionnetwork_id, but honours
+    the requested fields. Writes change the table and the modified time of
+    the records they touch, so that a second sync against the same stand-in
+    sees the results of the first.
+    """
+
+    def __init__(self, records, base_id='appBenchmark', table_name='Events', page_size=AIRTABLE_PAGE_SIZE, **kwargs):
+        """
+        :param records: raw records in the table
+        :type records: list
+        :param base_id: ID of the base
+        :param table_name: name of the table
+        :param page_size: records per page when listing
+        :param kwargs: latency and rate limit; see StandIn
+        """
+        super().__init__(**kwargs)
+        self.records = {record['id']: record for record in records}
+        self.base_id = base_id
+        self.table_path = f'/v0/{base_id}/{urllib.parse.quote(table_name)}'
+        self.page_size = page_size
+        self.written_count = 0
+        self._listed = None
+        self._next_id = 0
+
+    @property
+    def api_url(self):
+        """The endpoint URL of the API, in place of airtable.API_URL"""
+        return self.url
+
+    def respond(self, method, path, params, body, headers):
+        if path == self.table_path and method == 'GET':
+            options = {name: values[-1] for name, values in params.items()}
+            return 200, self._list(options, params.get('fields[]'))
+        if path == f'{self.table_path}/listRecords' and method == 'POST':
+            return 200, self._list(body, body.get('fields'))
+        if path == self.table_path and method in ('POST', 'PATCH'):
+            with self._lock:
+                return self._write(method, body)
+        return 404, {'error': 'NOT_FOUND'}
+
+    def _list(self, options, fields):
+        with self._lock:
+            # Listing is paged, so only filter the table again after writes
+            if self._listed is None:
+                self._listed = [
+                    record for record in self.records.values()
+                    if record['fields'].get('actionnetwork_id')
+                ]
+            records = self._listed
+        lookup_ids = set(ACTIONNETWORK_ID_LOOKUP.findall(options.get('filterByFormula') or ''))
+        if lookup_ids:
+            records = [
+                record for record in records
+                if record['fields']['actionnetwork_id'] in lookup_ids
+            ]
+        offset = int(options.get('offset') or 0)
+        page_size = int(options.get('pageSize') or self.page_size)
+        page = records[offset:offset + page_size]
+        if fields:
+            page = [
+                {**record, 'fields': {
+                    name: value for name, value in record['fields'].items()
+                    if name in fields
+                }}
+                for record in page
+            ]
+        response = {'records': page}
+        if offset + page_size < len(records):
+            response['offset'] = str(offset + page_size)
+        return response
+
+    def _new_id(self):
+        self._next_id += 1
+        return f'recnew{self._next_id:011d}'
+
+    def _write(self, method, body):
+        upsert = body.get('performUpsert')
+        merge_fields = upsert['fieldsToMergeOn'] if upsert else []
+        by_merge_key = {}
+        if merge_fields:
+            by_merge_key = {
+                tuple(record['fields'].get(name) for name in merge_fields): record
+                for record in self.records.values()
+            }
+
+        written = []
+        for change in body['records']:
+            record = self.records.get(change.get('id'))
+            if record is None and merge_fields:
+                record = by_merge_key.get(tuple(
+                    change['fields'].get(name) for name in merge_fields
+                ))
+            if record is None:
+                if method == 'PATCH' and not merge_fields:
+                    return 422, {'error': {'type': 'ROW_DOES_NOT_EXIST'}}
+                record = {
+                    'id': self._new_id(),
+                    'createdTime': '2024-06-01T00:00:00.000Z',
+                    'fields': {},
+                }
+                self.records[record['id']] = record
+            record['fields'].update(change['fields'])
+            record['fields']['modified'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            written.append(record)
+        self.written_count += len(written)
+        self._listed = None
+        return 200, {'records': written}
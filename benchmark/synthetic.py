@@ -0,0 +1,240 @@
+"""Synthetic ActionNetwork events and Airtable records for benchmarks.
+
+Everything is generated from a seeded random.Random, so the same arguments
+always produce the same data.
+"""
+import random
+import urllib.parse
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from event_models.events import ActionNetworkEvent, AirtableEvent
+
+# Events per page returned by the ActionNetwork API
+ACTION_NETWORK_PAGE_SIZE = 25
+
+# Records per page returned by the Airtable API
+AIRTABLE_PAGE_SIZE = 100
+
+# Most events are held at one of a few regular venues, or online
+VENUES = [
+    {},
+    {'venue': 'Zoom'},
+    {
+        'venue': 'Boston Public Library',
+        'address_lines': ['700 Boylston St'],
+        'locality': 'Boston',
+        'region': 'MA',
+        'postal_code': '02116',
+    },
+    {
+        'venue': 'Somerville Public Library',
+        'address_lines': ['79 Highland Ave'],
+        'locality': 'Somerville',
+        'region': 'MA',
+        'postal_code': '02143',
+    },
+    {
+        'venue': 'Union Hall',
+        'address_lines': ['1 Main St'],
+        'locality': 'Cambridge',
+        'region': 'MA',
+        'postal_code': '02139',
+    },
+]
+
+WORDS = (
+    'solidarity meeting housing tenants union canvass transit general '
+    'reading group committee branch organizing campaign labor healthcare '
+    'childcare volunteers training phonebank rally potluck agenda notes'
+).split()
+
+# Time the generated modification times count back from
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class SyntheticData:
+    """A synthetic ActionNetwork account and the Airtable table synced from
+    it, with some of the events changed in between."""
+    # Raw ActionNetwork events, keyed by group name
+    events_by_group: dict = field(default_factory=dict)
+    # Raw Airtable records, as returned by the list records endpoint
+    airtable_records: list = field(default_factory=list)
+    # How many source events differ from their Airtable record, are missing
+    # from Airtable, or only exist in Airtable
+    changed: int = 0
+    new: int = 0
+    orphaned: int = 0
+
+    @property
+    def event_count(self):
+        return sum(len(events) for events in self.events_by_group.values())
+
+    def source_events(self):
+        """All generated events, as the sync reads them from ActionNetwork.
+
+        :return: list of ActionNetworkRecords
+        """
+        return [
+            ActionNetworkEvent(raw_event).to_record()
+            for events in self.events_by_group.values()
+            for raw_event in events
+            if raw_event['origin_system'] != 'Facebook Sync'
+        ]
+
+    def destination_events(self):
+        """All generated Airtable records, as the sync reads them.
+
+        :return: list of AirtableEvents
+        """
+        return [AirtableEvent(record) for record in self.airtable_records]
+
+
+def description(rng, mean_size=1500):
+    """Generate an event description.
+
+    Sizes follow a long-tailed distribution around mean_size characters, as
+    some hosts paste in long agendas (or embedded images).
+    """
+    size = min(int(rng.lognormvariate(0, 0.8) * mean_size * 0.75), 60000)
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraph = ' '.join(rng.choices(WORDS, k=rng.randint(20, 80)))
+        paragraphs.append(f'<p>{paragraph.capitalize()}.</p>')
+        length += len(paragraphs[-1])
+    return ''.join(paragraphs)[:max(size, 1)]
+
+
+def raw_event(rng, event_id, group, mean_description_size=1500):
+    """Generate a raw ActionNetwork event, as returned by the events API."""
+    start = NOW + timedelta(
+        days=rng.randint(-180, 180),
+        hours=rng.randint(9, 20),
+    )
+    event = {
+        'identifiers': [f'action_network:{event_id}'],
+        'browser_url': f'https://actionnetwork.org/events/{event_id}',
+        'title': ' '.join(rng.choices(WORDS, k=rng.randint(2, 6))).title(),
+        'description': description(rng, mean_description_size),
+        'start_date': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'location': dict(rng.choice(VENUES)),
+        'status': 'cancelled' if rng.random() < 0.03 else 'confirmed',
+        'action_network:sponsor': {'title': group},
+        # A few events are left over from the old Facebook sync, and skipped
+        'origin_system': 'Facebook Sync' if rng.random() < 0.01 else 'Action Network',
+        'modified_date': (
+            NOW - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        ).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'created_date': (NOW - timedelta(days=rng.randint(0, 300))).strftime('%Y-%m-%dT%H:%M:%SZ'),
+    }
+    if rng.random() < 0.7:
+        event['end_date'] = (start + timedelta(hours=rng.choice([1, 2, 3]))).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return event
+
+
+def airtable_record(rng, source_event, record_id):
+    """Build the Airtable record the sync would have created for an event."""
+    airtable_event = source_event.translate_to(AirtableEvent)
+    airtable_event.airtable_id = record_id
+    airtable_event.raw['createdTime'] = '2024-01-01T00:00:00.000Z'
+    airtable_event.raw['fields']['modified'] = (
+        NOW - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+    ).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    return airtable_event.raw
+
+
+def generate(
+    event_count,
+    groups=10,
+    change_ratio=0.05,
+    new_ratio=0.01,
+    orphan_ratio=0.01,
+    mean_description_size=1500,
+    seed=0,
+):
+    """Generate a synthetic ActionNetwork account and Airtable table.
+
+    :param event_count: total number of ActionNetwork events
+    :type event_count: int
+    :param groups: number of ActionNetwork groups. Events are split unevenly
+        between them, as a few large groups hold most events.
+    :type groups: int, optional
+    :param change_ratio: share of events whose title or description changed
+        since they were synced to Airtable
+    :type change_ratio: float, optional
+    :param new_ratio: share of events not yet in Airtable
+    :type new_ratio: float, optional
+    :param orphan_ratio: extra Airtable records, as a share of event_count,
+        whose event no longer exists in ActionNetwork
+    :type orphan_ratio: float, optional
+    :param mean_description_size: average description length in characters
+    :type mean_description_size: int, optional
+    :param seed: random seed
+    :type seed: int, optional
+    :rtype: SyntheticData
+    """
+    rng = random.Random(seed)
+    group_names = [f'Group {i}' for i in range(groups)]
+    weights = [1 / (i + 1) for i in range(groups)]
+    data = SyntheticData(events_by_group={group: [] for group in group_names})
+
+    for i in range(event_count):
+        group = rng.choices(group_names, weights)[0]
+        event = raw_event(rng, f'event-{i}', group, mean_description_size)
+        data.events_by_group[group].append(event)
+
+        if event['origin_system'] == 'Facebook Sync':
+            continue
+        roll = rng.random()
+        if roll < new_ratio:
+            data.new += 1
+            continue
+        record = airtable_record(
+            rng, ActionNetworkEvent(event), f'rec{i:014d}'
+        )
+        if roll < new_ratio + change_ratio:
+            if rng.random() < 0.5:
+                record['fields']['Event Title'] += ' (old title)'
+            else:
+                record['fields']['Description'] = description(rng, mean_description_size)
+            data.changed += 1
+        data.airtable_records.append(record)
+
+    for i in range(int(event_count * orphan_ratio)):
+        orphan = raw_event(rng, f'orphan-{i}', rng.choice(group_names))
+        data.airtable_records.append(airtable_record(
+            rng, ActionNetworkEvent(orphan), f'recorphan{i:09d}'
+        ))
+        data.orphaned += 1
+
+    rng.shuffle(data.airtable_records)
+    return data
+
+
+def actionnetwork_page(raw_events, page, events_url, page_size=ACTION_NETWORK_PAGE_SIZE, query=None):
+    """Build one page of an ActionNetwork events API response.
+
+    :param raw_events: the raw events of a single group, after filtering
+    :param page: page number, starting at 1
+    :param events_url: URL of the events endpoint, used for the links
+    :param query: other query params of the request (such as filters), which
+        are carried over to the links
+    :return: the response body
+    """
+    total_pages = max(1, -(-len(raw_events) // page_size))
+
+    def link(page):
+        return {'href': f"{events_url}?{urllib.parse.urlencode({**(query or {}), 'page': page})}"}
+
+    return {
+        'total_pages': total_pages,
+        'per_page': page_size,
+        'page': page,
+        'total_records': len(raw_events),
+        '_links': {'next': link(page + 1), 'self': link(page)},
+        '_embedded': {
+            'osdi:events': raw_events[(page - 1) * page_size:page * page_size],
+        },
+    }
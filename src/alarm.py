@@ -2,14 +2,11 @@ import json
 import os
 import urllib
 from datetime import datetime
+from functools import lru_cache
 
-import boto3
-
-SNS = boto3.client('sns')
-
-SLACK_CHANNEL = os.environ['SLACK_CHANNEL']
-SLACK_FOOTER_URL = os.environ['SLACK_FOOTER_URL']
-SLACK_TOPIC_ARN = os.environ['SLACK_TOPIC_ARN']
+SLACK_CHANNEL = os.environ.get('SLACK_CHANNEL')
+SLACK_FOOTER_URL = os.environ.get('SLACK_FOOTER_URL')
+SLACK_TOPIC_ARN = os.environ.get('SLACK_TOPIC_ARN')
 
 
 def get_alarm_attachments(footer, ts):
@@ -56,10 +53,18 @@ def handle_record(record):
     post_message(message)
 
 
+@lru_cache
+def sns_client():
+    """Get the SNS client, creating it on first use and keeping it for warm
+    invocations. boto3 is imported here as importing it slows cold starts."""
+    import boto3
+    return boto3.client('sns')
+
+
 def post_message(message):
     # Post message to Slack via SNS
     print(f'MESSAGE {json.dumps(message)}')
-    SNS.publish(
+    sns_client().publish(
         TopicArn=SLACK_TOPIC_ARN,
         Message=json.dumps(message),
         MessageAttributes={
@@ -1,47 +1,613 @@
+import queue
+import threading
+import urllib.parse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from datetime import timezone
+
 import pyactionnetwork
-import requests
+from event_connectors.metrics import ACTIONNETWORK
+from event_connectors.metrics import current_metrics
+from event_connectors.retries import request_with_retries
+from event_connectors.session import shared_session
 from event_models.events import ActionNetworkEvent
 
-CREATION_WINDOW_DAYS = 365
+# Root of the ActionNetwork API, which links to every other resource
+API_URL = "https://actionnetwork.org/api/v2/"
+
+# Number of groups fetched at the same time by fetch_group_events
+DEFAULT_MAX_WORKERS = 8
+
+# Number of event pages fetched at the same time for a single group. 1 follows
+# the 'next' links one page at a time.
+DEFAULT_PAGE_WORKERS = 1
+
+# Number of fetched pages GroupEventStream holds before fetching pauses to
+# let the consumer catch up
+DEFAULT_MAX_PENDING_PAGES = 8
 
 class ActionNetwork(pyactionnetwork.ActionNetworkApi):
-    def __init__(self, api_key):
+    def __init__(self, api_key, session=None):
+        """Create an ActionNetwork client for a single group.
+
+        :param api_key: the group's ActionNetwork API key
+        :type api_key: str
+        :param session: HTTP session to make requests with. defaults to the
+            process-wide shared session
+        :type session: requests.Session, optional
+        """
+        # Must be set before calling super, which fetches the API config
+        self.session = session or shared_session()
         super().__init__(api_key)
 
-    def _events(self, min_creation_time=None):
+    def _get(self, url, **kwargs):
+        response = request_with_retries(
+            lambda: self.session.get(url, headers=self.headers, **kwargs),
+            url,
+            ACTIONNETWORK,
+        )
+        # A failed page must fail the group, rather than be mistaken for an
+        # empty or final page
+        response.raise_for_status()
+        return response.json()
+
+    def refresh_config(self):
+        self.config = self._get(API_URL)
+
+    def _events(self, min_creation_time=None, min_modified_time=None, min_start_time=None):
         """
-        Pulls the first page of events from ActionNetwork, potentially filtered by the passed minimum creation time.
+        Pulls the first page of events from ActionNetwork, potentially filtered by the passed minimum creation/modification/start times.
 
         :param min_creation_time: ISO-Formatted timestamp.  If passed, will only get events created after the specified time.
+        :param min_modified_time: ISO-Formatted timestamp.  If passed, will only get events modified after the specified time.
+        :param min_start_time: ISO-Formatted timestamp.  If passed, will only get events starting after the specified time.
         :return:
         """
         url = self.resource_to_url('events')
+        return self._get(url, params=self._events_params(min_creation_time, min_modified_time, min_start_time))
+
+    @staticmethod
+    def _events_params(min_creation_time=None, min_modified_time=None, min_start_time=None):
+        """Build the query params filtering events by creation, modification
+        and start time; see _events."""
         params = {}
+        filters = []
         if min_creation_time is not None:
-            params['filter'] = f"created_date gt '{min_creation_time}'"
+            filters.append(f"created_date gt '{min_creation_time}'")
+        if min_modified_time is not None:
+            filters.append(f"modified_date gt '{min_modified_time}'")
+        if min_start_time is not None:
+            filters.append(f"start_date gt '{min_start_time}'")
+        if filters:
+            params['filter'] = ' and '.join(filters)
+        return params
+
+    @staticmethod
+    def _page_url(href, page):
+        """Rewrite an events page link to point at a different page number,
+        keeping any other query params (such as filters) intact."""
+        url = urllib.parse.urlparse(href)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        query['page'] = str(page)
+        return url._replace(query=urllib.parse.urlencode(query)).geturl()
+
+    @staticmethod
+    def _response_events(events_response):
+        """Get the raw events of a page of the events response.
+
+        :raises KeyError: if the response is missing events
+        """
+        return events_response['_embedded']['osdi:events'] or []
 
-        return requests.get(url, params=params, headers=self.headers).json()
+    @staticmethod
+    def _next_url(events_response):
+        """Get the link to the page after a page of the events response, or
+        None if it is the last page."""
+        if events_response['page'] < events_response['total_pages']:
+            return events_response['_links']['next']['href']
+        return None
+
+    @classmethod
+    def _remaining_page_urls(cls, events_response):
+        """Get the links to every page after a page of the events response,
+        worked out from its page count.
+
+        :return: list of page URLs, in page order
+        """
+        next_url = cls._next_url(events_response)
+        if next_url is None:
+            return []
+        return [
+            cls._page_url(next_url, page)
+            for page in range(
+                events_response['page'] + 1,
+                events_response['total_pages'] + 1
+            )
+        ]
+
+    def _page_events(self, url):
+        return self._response_events(self._get(url))
+
+    def _remaining_pages(self, page_urls, page_workers):
+        """Fetch every page after the first one concurrently.
+
+        :param page_urls: links to the remaining pages; see
+            _remaining_page_urls
+        :param page_workers: maximum number of pages fetched at the same time
+        :return: list of raw events from the remaining pages, in page order
+        """
+        print(f"Fetching {len(page_urls)} more event pages, {page_workers} at a time")
+        with ThreadPoolExecutor(
+            max_workers=min(page_workers, len(page_urls)),
+            thread_name_prefix='actionnetwork-page',
+        ) as executor:
+            pages = executor.map(self._page_events, page_urls)
+            return [event for page in pages for event in page]
+
+    def iter_linked_pages(self, start_url=None, **kwargs):
+        """Fetch raw events one page at a time, following the 'next' links,
+        along with the link to each page's next page.
+
+        :param start_url: link to the page to start from, such as a 'next'
+            link yielded before. defaults to the first page
+        :type start_url: str, optional
+        :return: generator of (list of raw event dicts, link to the next page
+            or None after the last page) pairs, in page order
+        """
+        if start_url is None:
+            events_response = self._events(**kwargs)
+        else:
+            events_response = self._get(start_url)
+        if '_embedded' not in events_response:
+            print('WARNING: Response was missing events')
+            return
+        while True:
+            next_url = self._next_url(events_response)
+            yield self._response_events(events_response), next_url
+
+            if next_url is None:
+                return
+            print(f"Fetching event page {events_response['page']} out of {events_response['total_pages']}")
+            events_response = self._get(next_url)
+
+    def iter_raw_pages(self, **kwargs):
+        """Fetch raw events one page at a time, following the 'next' links.
+
+        Each page is only requested once the previous one has been consumed,
+        so at most one page of events is held at a time.
+
+        :return: generator of lists of raw event dicts, in page order
+        """
+        for page_events, _ in self.iter_linked_pages(**kwargs):
+            yield page_events
+
+    def raw_events(self, page_workers=DEFAULT_PAGE_WORKERS, **kwargs):
+        """Get every raw event, following pagination.
+
+        :param page_workers: maximum number of pages to fetch at the same time.
+            When greater than 1, the page count reported by the first page is
+            used to fetch the rest concurrently instead of following the
+            'next' links one by one. The result is the same either way.
+            defaults to DEFAULT_PAGE_WORKERS
+        :type page_workers: int, optional
+        :return: list of raw event dicts, in page order
+        """
+        if page_workers <= 1:
+            return [
+                event for page in self.iter_raw_pages(**kwargs)
+                for event in page
+            ]
 
-    def raw_events(self, **kwargs):
         events_response = self._events(**kwargs)
-        events = []
         try:
-            events += events_response['_embedded']['osdi:events'] or []
+            events = list(self._response_events(events_response))
         except KeyError:
             print('WARNING: Response was missing events')
-            return events
-
-        while events_response['page'] < events_response['total_pages']:
-            print(f"Fetching event page {events_response['page']} out of {events_response['total_pages']}")
-            events_response = requests.get(events_response['_links']['next']['href'], headers=self.headers).json()
-            events += events_response['_embedded']['osdi:events'] or []
+            return []
 
+        page_urls = self._remaining_page_urls(events_response)
+        if page_urls:
+            events += self._remaining_pages(page_urls, page_workers)
         return events
 
-    def events(self, **kwargs):
-        """Get events as ActionNetworkEvents, filter out unwanted events"""
+    @staticmethod
+    def _is_wanted(raw_event):
+        # Skip events that were created by our old Facebook sync
+        return raw_event['origin_system'] != 'Facebook Sync'
+
+    @classmethod
+    def _records(cls, raw_events):
         return [
-            ActionNetworkEvent(raw_event)
-            for raw_event in self.raw_events(**kwargs)
-            if raw_event['origin_system'] != 'Facebook Sync'
+            ActionNetworkEvent(raw_event).to_record()
+            for raw_event in raw_events
+            if cls._is_wanted(raw_event)
         ]
+
+    def events(self, page_workers=DEFAULT_PAGE_WORKERS, **kwargs):
+        """Get events as compact ActionNetworkRecords, filter out unwanted
+        events.
+
+        When pages are fetched one at a time, each page is converted as it
+        arrives so that its raw events can be released straight away.
+        """
+        if page_workers <= 1:
+            return [
+                event for page in self.iter_event_pages(**kwargs)
+                for event in page
+            ]
+        return self._records(
+            self.raw_events(page_workers=page_workers, **kwargs)
+        )
+
+    def iter_event_pages(self, **kwargs):
+        """Like events, but lazily yields the events one page at a time.
+
+        :return: generator of lists of ActionNetworkRecords
+        """
+        for page in self.iter_raw_pages(**kwargs):
+            yield self._records(page)
+
+
+def iter_checkpointed_pages(group, api_key, checkpoint, session=None, **kwargs):
+    """Fetch a group's raw events one page at a time, saving each page to a
+    checkpoint.
+
+    Pages already saved in the checkpoint are replayed first, and fetching
+    carries on from where they left off, so a group that was fully fetched
+    makes no requests at all.
+
+    :param group: ActionNetwork group name
+    :param api_key: the group's ActionNetwork API key
+    :param checkpoint: checkpoint of the sync run
+    :type checkpoint: Checkpoint
+    :param session: HTTP session to make requests with
+    :param kwargs: any other arguments for ActionNetwork.iter_linked_pages
+    :return: generator of lists of raw event dicts, in page order
+    """
+    yield from checkpoint.pages(group)
+    done, next_url = checkpoint.group_progress(group)
+    if done:
+        return
+    if next_url is not None:
+        print(f"Resuming ActionNetwork events for {group} from {next_url}")
+    client = ActionNetwork(api_key, session=session)
+    for page, next_url in client.iter_linked_pages(start_url=next_url, **kwargs):
+        checkpoint.save_page(group, page, next_url)
+        yield page
+
+
+def _keyed_groups(group_key_map):
+    return {
+        group: api_key for group, api_key in group_key_map.items()
+        # Skip any keys that have not yet been populated
+        if api_key
+    }
+
+
+def _group_kwargs(group, since_by_group, kwargs):
+    """Get the arguments to fetch a group's events with, only fetching the
+    events modified since its timestamp in since_by_group, if it has one."""
+    group_kwargs = dict(kwargs)
+    if since_by_group and group in since_by_group:
+        group_kwargs['min_modified_time'] = since_by_group[group]
+    return group_kwargs
+
+
+def _group_results(tasks, not_done, timeout):
+    """Sort the results of fetching several groups' events into events and
+    errors.
+
+    :param tasks: mapping of each group's future (or asyncio task) to the
+        group's name, in group map order
+    :param not_done: the futures that had not finished within the timeout
+    :param timeout: the timeout the futures were waited for with
+    :return: tuple of (events keyed by group name, exceptions keyed by group
+        name)
+    :rtype: tuple[dict, dict]
+    """
+    events_by_group = {}
+    errors_by_group = {}
+    # Report results in the same order as the group map, regardless of the
+    # order in which the groups finished
+    for task, group in tasks.items():
+        if task in not_done:
+            errors_by_group[group] = TimeoutError(
+                f"Timed out after {timeout}s fetching events for {group}"
+            )
+        elif task.exception() is not None:
+            errors_by_group[group] = task.exception()
+        else:
+            events_by_group[group] = task.result()
+
+    for group, error in errors_by_group.items():
+        print(f"WARNING: Failed to fetch ActionNetwork events for {group}: {error!r}")
+
+    return events_by_group, errors_by_group
+
+
+def _fetch_group(group, api_key, session=None, checkpoint=None, **kwargs):
+    print(f"Fetching ActionNetwork events for: {group}")
+    metrics = current_metrics()
+    with metrics.timed('actionnetwork_fetch', group=group):
+        if checkpoint is None:
+            events = ActionNetwork(api_key, session=session).events(**kwargs)
+        else:
+            # Pages are checkpointed in order, so they are fetched one at a
+            # time
+            kwargs.pop('page_workers', None)
+            events = [
+                event
+                for page in iter_checkpointed_pages(
+                    group, api_key, checkpoint, session, **kwargs
+                )
+                for event in ActionNetwork._records(page)
+            ]
+    metrics.add('actionnetwork_events', len(events), group=group)
+    return events
+
+
+def fetch_group_events(
+    group_key_map,
+    max_workers=DEFAULT_MAX_WORKERS,
+    timeout=None,
+    session=None,
+    since_by_group=None,
+    checkpoint=None,
+    **kwargs
+):
+    """Fetch events for several ActionNetwork groups at once.
+
+    Each group is fetched on its own worker thread with its own client. A
+    group that raises, or that has not finished within the timeout, is
+    reported in the returned errors instead of aborting the other groups.
+
+    :param group_key_map: mapping of group names to ActionNetwork API keys.
+        Groups without a key are skipped.
+    :type group_key_map: dict
+    :param max_workers: maximum number of groups fetched at the same time.
+        Pass 1 to fetch groups one after another. defaults to
+        DEFAULT_MAX_WORKERS
+    :type max_workers: int, optional
+    :param timeout: seconds to wait for all groups before giving up on the
+        ones still running, defaults to None (wait forever)
+    :type timeout: float, optional
+    :param session: HTTP session shared by every group's client. defaults to
+        the process-wide shared session
+    :type session: requests.Session, optional
+    :param since_by_group: mapping of group names to ISO-formatted
+        timestamps. Groups in the mapping only fetch events modified after
+        their timestamp; other groups fetch everything.
+    :type since_by_group: dict, optional
+    :param checkpoint: checkpoint to save each fetched page to, and resume
+        from. Pages are then fetched one at a time, whatever page_workers is.
+    :type checkpoint: Checkpoint, optional
+    :return: tuple of (events keyed by group name, exceptions keyed by group
+        name)
+    :rtype: tuple[dict, dict]
+    """
+    group_key_map = _keyed_groups(group_key_map)
+    if not group_key_map:
+        return {}, {}
+
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(group_key_map))),
+        thread_name_prefix='actionnetwork',
+    )
+    futures = {}
+    for group, api_key in group_key_map.items():
+        future = executor.submit(
+            _fetch_group, group, api_key, session, checkpoint,
+            **_group_kwargs(group, since_by_group, kwargs)
+        )
+        futures[future] = group
+    _, not_done = wait(futures, timeout=timeout)
+    # Don't block on groups that are still hanging past the timeout
+    executor.shutdown(wait=False, cancel_futures=True)
+    return _group_results(futures, not_done, timeout)
+
+
+class GroupEventStream:
+    """Iterates over the events of several ActionNetwork groups as their
+    pages arrive.
+
+    Groups are fetched concurrently, as with fetch_group_events, but pages
+    are handed over through a bounded queue rather than collected into lists.
+    Once the queue is full, fetching pauses until the consumer catches up, so
+    memory use depends on the page size rather than the number of events.
+
+    Iterating yields (group name, ActionNetworkRecord) pairs. Once iteration
+    is finished, errors_by_group holds the exception for each group that
+    failed.
+    """
+    # Marks the end of a group's pages in the queue
+    _DONE = object()
+
+    def __init__(
+        self,
+        group_key_map,
+        max_workers=DEFAULT_MAX_WORKERS,
+        max_pending_pages=DEFAULT_MAX_PENDING_PAGES,
+        session=None,
+        since_by_group=None,
+        checkpoint=None,
+        **kwargs
+    ):
+        """
+        :param group_key_map: mapping of group names to ActionNetwork API keys.
+            Groups without a key are skipped.
+        :param max_workers: maximum number of groups fetched at the same time
+        :param max_pending_pages: maximum number of fetched pages waiting to
+            be consumed
+        :param session: HTTP session shared by every group's client
+        :param since_by_group: mapping of group names to ISO-formatted
+            timestamps; see fetch_group_events
+        :param checkpoint: checkpoint to save each fetched page to, and
+            resume from
+        :param kwargs: any other arguments for ActionNetwork.iter_raw_pages
+        """
+        self.group_key_map = _keyed_groups(group_key_map)
+        self.max_workers = max_workers
+        self.max_pending_pages = max_pending_pages
+        self.session = session
+        self.since_by_group = since_by_group
+        self.checkpoint = checkpoint
+        self.kwargs = kwargs
+        self.errors_by_group = {}
+
+        self._pages = queue.Queue(maxsize=max_pending_pages)
+        self._stop = threading.Event()
+        self._executor = None
+
+    def _put(self, pages, stop, item):
+        # Give up if the consumer has stopped iterating, rather than blocking
+        # on a full queue forever
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fetch_group(self, group, api_key, pages, stop):
+        kwargs = _group_kwargs(group, self.since_by_group, self.kwargs)
+        metrics = current_metrics()
+        try:
+            print(f"Fetching ActionNetwork events for: {group}")
+            # Includes time spent waiting for the consumer to make room
+            with metrics.timed('actionnetwork_fetch', group=group):
+                if self.checkpoint is None:
+                    client = ActionNetwork(api_key, session=self.session)
+                    event_pages = client.iter_event_pages(**kwargs)
+                else:
+                    event_pages = (
+                        ActionNetwork._records(page)
+                        for page in iter_checkpointed_pages(
+                            group, api_key, self.checkpoint, self.session,
+                            **kwargs
+                        )
+                    )
+                for page in event_pages:
+                    metrics.add('actionnetwork_events', len(page), group=group)
+                    if not self._put(pages, stop, (group, page)):
+                        return
+        except Exception as e:
+            print(f"WARNING: Failed to fetch ActionNetwork events for {group}: {e!r}")
+            self.errors_by_group[group] = e
+        self._put(pages, stop, (group, self._DONE))
+
+    def start(self):
+        """Start fetching in the background, before iteration begins.
+
+        Fetching pauses once max_pending_pages pages are waiting. Iterating
+        starts fetching automatically if this hasn't been called.
+        """
+        if self._executor is not None or not self.group_key_map:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(self.group_key_map))),
+            thread_name_prefix='actionnetwork',
+        )
+        for group, api_key in self.group_key_map.items():
+            self._executor.submit(
+                self._fetch_group, group, api_key, self._pages, self._stop
+            )
+
+    def __iter__(self):
+        self.start()
+        if self._executor is None:
+            return
+
+        try:
+            remaining_groups = len(self.group_key_map)
+            while remaining_groups:
+                group, page = self._pages.get()
+                if page is self._DONE:
+                    remaining_groups -= 1
+                    continue
+                for event in page:
+                    yield group, event
+        finally:
+            self._stop.set()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class EventIndex:
+    """ActionNetwork events from several groups, indexed by actionnetwork_id
+    as they arrive, keeping a single copy of each event.
+
+    An event co-sponsored by several groups is fetched once for each of them.
+    The index keeps the copy with the newest modified_date, with ties going
+    to the group that comes first by name, so the copy kept doesn't depend on
+    the order the groups' pages arrive in. Every other copy is counted as a
+    duplicate for the group it was fetched for.
+    """
+    # Sorts before any real modification time
+    _NEVER_MODIFIED = datetime.min.replace(tzinfo=timezone.utc)
+
+    def __init__(self):
+        self.duplicates_by_group = Counter()
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._events)
+
+    def _rank(self, group, event):
+        try:
+            modified = datetime.fromisoformat(event.updated_at)
+        except (TypeError, ValueError):
+            modified = self._NEVER_MODIFIED
+        return modified, group
+
+    def add(self, group, events):
+        """Index a page of a group's events.
+
+        :param group: name of the group the events were fetched for
+        :param events: the group's events
+        :type events: Iterable[ActionNetworkRecord]
+        :return: the events that are now the indexed copy: events seen for
+            the first time, and newer copies of events seen before
+        :rtype: list[ActionNetworkRecord]
+        """
+        kept = []
+        with self._lock:
+            for event in events:
+                common_id = event.actionnetwork_id
+                if common_id is None:
+                    continue
+                rank = self._rank(group, event)
+                current = self._events.get(common_id)
+                if current is not None:
+                    (modified, current_group), _ = current
+                    if rank[0] < modified or (rank[0] == modified and group >= current_group):
+                        self.duplicates_by_group[group] += 1
+                        continue
+                    self.duplicates_by_group[current_group] += 1
+                self._events[common_id] = (rank, event)
+                kept.append(event)
+        return kept
+
+    def iter_newest(self, group_events):
+        """Index (group name, event) pairs as they arrive, such as from a
+        GroupEventStream.
+
+        An event is passed on when it is first seen, and again whenever a
+        newer copy arrives, so consumers must let later copies of an event
+        replace earlier ones (as EventDiffer does).
+
+        :return: generator of (group name, event) pairs
+        """
+        for group, event in group_events:
+            if self.add(group, [event]):
+                yield group, event
+
+    def events(self):
+        """Get the indexed copy of every event, in the order they were first
+        seen.
+
+        :rtype: list[ActionNetworkRecord]
+        """
+        with self._lock:
+            return [event for _, event in self._events.values()]
@@ -1,8 +1,25 @@
 import pyairtable
+from pyairtable.formulas import AND, EQUAL, FIELD, OR, STR_VALUE
+from event_connectors.batch_writer import BatchWriter
+from event_connectors.batch_writer import DEFAULT_WRITE_WORKERS
+from event_connectors.batch_writer import DEFAULT_REQUESTS_PER_SECOND
+from event_connectors.batch_writer import WriteReport
+from event_connectors.metrics import AIRTABLE
+from event_connectors.retries import RetryingSession
+from event_connectors.session import DEFAULT_CONNECT_TIMEOUT
+from event_connectors.session import DEFAULT_READ_TIMEOUT
 from event_models.events import AirtableEvent
 
+API_URL = "https://api.airtable.com"
 TABLE_NAME = "Events"
 
+# Column used to match events to existing rows when upserting
+UPSERT_KEY_FIELD_NAMES = ['actionnetwork_id']
+
+# Most events to look up by actionnetwork_id in a single read, to keep the
+# filter formula to a reasonable length
+LOOKUP_BATCH_SIZE = 100
+
 class Airtable(pyairtable.Table):
     """Handles Airtable API interaction.
 
@@ -11,14 +28,229 @@ class Airtable(pyairtable.Table):
     is responsible for translating AirtableEvent objects into (or from) a
     format the API requires and calling the API functions.
     """
-    def __init__(self, personal_access_token: str, base_id: str):
-        super().__init__(personal_access_token, base_id, TABLE_NAME)
+    def __init__(
+        self,
+        personal_access_token: str,
+        base_id: str,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        write_workers: int = DEFAULT_WRITE_WORKERS
+    ):
+        """
+        :param personal_access_token: Airtable personal access token
+        :param base_id: ID of the base containing the events table
+        :param requests_per_second: request budget for writes to the base
+        :param write_workers: most write requests in flight at the same time
+        """
+        super().__init__(
+            personal_access_token,
+            base_id,
+            TABLE_NAME,
+            endpoint_url=API_URL,
+            timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+        )
+        self.writer = BatchWriter(
+            self.url,
+            headers={'Authorization': f'Bearer {personal_access_token}'},
+            requests_per_second=requests_per_second,
+            max_workers=write_workers,
+        )
+        # Reads go through pyairtable's own session, which is swapped for
+        # one that retries the same way as the writes (rather than with
+        # pyairtable's own urllib3 retries)
+        self.api.session = RetryingSession(AIRTABLE)
+
+    @staticmethod
+    def events_formula(min_start_time=None, modified_since=None) -> str:
+        """Build the filter formula used when reading events.
+
+        Only rows synced from ActionNetwork are read; rows entered manually
+        have no actionnetwork_id and are never compared against.
+
+        :param min_start_time: if given, only read events starting after this
+            time
+        :type min_start_time: datetime, optional
+        :param modified_since: if given, only read rows modified after this
+            Airtable timestamp
+        :type modified_since: str, optional
+        :return: an Airtable formula
+        """
+        conditions = [f"{FIELD('actionnetwork_id')} != ''"]
+        if min_start_time is not None:
+            conditions.append(
+                f"IS_AFTER({FIELD('Start Time')}, "
+                f"DATETIME_PARSE({STR_VALUE(min_start_time.isoformat())}))"
+            )
+        if modified_since is not None:
+            conditions.append(
+                f"IS_AFTER({FIELD('modified')}, "
+                f"DATETIME_PARSE({STR_VALUE(modified_since)}))"
+            )
+        return AND(*conditions)
+
+    def events(
+        self,
+        min_start_time=None,
+        fingerprints=False,
+        modified_since=None
+    ) -> list[AirtableEvent]:
+        """Get synced events, reading only the columns AirtableEvent uses.
+
+        :param min_start_time: if given, only get events starting after this
+            time
+        :type min_start_time: datetime, optional
+        :param fingerprints: whether to read the source fingerprint column,
+            which must exist in the table. Changes are then detected by
+            fingerprint, so the (large) descriptions are not read at all.
+            defaults to False
+        :type fingerprints: bool, optional
+        :param modified_since: if given, only get rows modified after this
+            Airtable timestamp
+        :type modified_since: str, optional
+        """
+        return self._read_events(
+            self.events_formula(min_start_time, modified_since), fingerprints
+        )
+
+    def events_by_actionnetwork_id(
+        self,
+        actionnetwork_ids,
+        fingerprints=False
+    ) -> list[AirtableEvent]:
+        """Get only the synced events for some ActionNetwork events, rather
+        than scanning the whole table.
+
+        :param actionnetwork_ids: ActionNetwork IDs of the events to get
+        :type actionnetwork_ids: Iterable[str]
+        :param fingerprints: whether to read the source fingerprint column;
+            see events
+        :type fingerprints: bool, optional
+        """
+        events = []
+        for formula in self.lookup_formulas(actionnetwork_ids):
+            events.extend(self._read_events(formula, fingerprints))
+        return events
+
+    @staticmethod
+    def lookup_formulas(actionnetwork_ids):
+        """Build the filter formulas used to look up events by
+        actionnetwork_id, LOOKUP_BATCH_SIZE events per formula.
+
+        :return: list of Airtable formulas
+        """
+        actionnetwork_ids = list(actionnetwork_ids)
+        return [
+            OR(*(
+                EQUAL(FIELD('actionnetwork_id'), STR_VALUE(actionnetwork_id))
+                for actionnetwork_id in actionnetwork_ids[start:start + LOOKUP_BATCH_SIZE]
+            ))
+            for start in range(0, len(actionnetwork_ids), LOOKUP_BATCH_SIZE)
+        ]
+
+    @staticmethod
+    def read_fields(fingerprints=False):
+        """Get the names of the columns to read; see events."""
+        fields = list(AirtableEvent.RAW_FIELD_NAMES)
+        if fingerprints:
+            fields.remove('Description')
+            fields.append(AirtableEvent.SOURCE_FINGERPRINT_FIELD_NAME)
+        return fields
+
+    def _read_events(self, formula, fingerprints):
+        records = super().all(fields=self.read_fields(fingerprints), formula=formula)
+        return [AirtableEvent(event) for event in records]
+
+    def add_events(
+        self,
+        events_to_add: list[AirtableEvent],
+        on_written=None
+    ) -> WriteReport:
+        """Create new events.
+
+        Rows are upserted on actionnetwork_id rather than posted, so a batch
+        that is retried after Airtable already created its rows (such as
+        after a read timeout) updates those rows instead of duplicating them.
+
+        :param events_to_add: events to create
+        :param on_written: called with the records of each committed batch;
+            see BatchWriter.write
+        :return: per-record results
+        """
+        return self.writer.write(
+            'patch',
+            [{"fields": event.raw["fields"]} for event in events_to_add],
+            on_written=on_written,
+            performUpsert={'fieldsToMergeOn': UPSERT_KEY_FIELD_NAMES},
+        )
+
+    def update_events(
+        self,
+        events_to_update: list[AirtableEvent],
+        changed_fields: dict[str, set[str]] = None,
+        on_written=None
+    ) -> WriteReport:
+        """Update existing events.
+
+        :param events_to_update: events to update, with their Airtable IDs set
+        :param changed_fields: names of the fields to update for each event,
+            keyed by Airtable ID. If given, only those fields are sent and any
+            other fields are left as they are in Airtable. Otherwise, every
+            field is sent.
+        :param on_written: called with the records of each committed batch;
+            see BatchWriter.write
+        :return: per-record results
+        """
+        return self.writer.write(
+            'patch',
+            self.update_records(events_to_update, changed_fields),
+            on_written=on_written,
+        )
+
+    @staticmethod
+    def update_records(events_to_update, changed_fields=None):
+        """Build the records to send to update events; see update_events."""
+        if changed_fields is None:
+            return [event.raw for event in events_to_update]
+        return [
+            event.subset(changed_fields[event.airtable_id]).raw
+            for event in events_to_update
+        ]
+
+
+    def upsert_events(
+        self,
+        events_to_upsert: list[AirtableEvent],
+        changed_fields: dict[str, set[str]] = None,
+        on_written=None
+    ) -> WriteReport:
+        """Create or update events in a single batched stream.
 
-    def events(self) -> list[AirtableEvent]:
-        return [AirtableEvent(event) for event in super().all()]
+        Events with an Airtable ID update that row. Events without one are
+        matched to existing rows by actionnetwork_id, and created if there is
+        no match, so no prior read of the table is needed to tell new events
+        from existing ones.
 
-    def add_events(self, events_to_add: list[AirtableEvent]):
-        self.batch_create([event.raw["fields"] for event in events_to_add])
+        :param events_to_upsert: events to create or update
+        :param changed_fields: names of the fields to update for events with
+            an Airtable ID, keyed by that ID. Only those fields are sent for
+            those events; see update_events.
+        :param on_written: called with the records of each committed batch;
+            see BatchWriter.write
+        :return: per-record results
+        """
+        return self.writer.write(
+            'patch',
+            self.upsert_records(events_to_upsert, changed_fields),
+            on_written=on_written,
+            performUpsert={'fieldsToMergeOn': UPSERT_KEY_FIELD_NAMES},
+        )
 
-    def update_events(self, events_to_update: list[AirtableEvent]):
-        self.batch_update([event.raw for event in events_to_update])
+    @staticmethod
+    def upsert_records(events_to_upsert, changed_fields=None):
+        """Build the records to send to upsert events; see upsert_events."""
+        changed_fields = changed_fields or {}
+        records = []
+        for event in events_to_upsert:
+            if event.airtable_id in changed_fields:
+                event = event.subset(changed_fields[event.airtable_id])
+            records.append(event.raw)
+        return records
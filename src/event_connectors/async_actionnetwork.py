@@ -0,0 +1,245 @@
+import asyncio
+
+from event_connectors import actionnetwork
+from event_connectors.actionnetwork import DEFAULT_MAX_WORKERS
+from event_connectors.actionnetwork import DEFAULT_PAGE_WORKERS
+from event_connectors.actionnetwork import ActionNetwork
+from event_connectors.async_http import request_with_retries
+from event_connectors.metrics import ACTIONNETWORK
+from event_connectors.metrics import current_metrics
+
+
+class AsyncActionNetwork:
+    """Asyncio counterpart of ActionNetwork, for a single group.
+
+    Has the same events() and iter_event_pages() surface, as a coroutine and
+    an async generator. Requests are made through an aiohttp session shared
+    with every other group (and with Airtable), so a run's connections are
+    pooled together.
+    """
+
+    def __init__(self, api_key, session):
+        """
+        :param api_key: the group's ActionNetwork API key
+        :type api_key: str
+        :param session: aiohttp session to make requests with; see
+            async_http.client_session
+        :type session: aiohttp.ClientSession
+        """
+        self.headers = {'OSDI-API-Token': api_key}
+        self.session = session
+        # Fetched with the first request, as it can't be awaited here
+        self.config = None
+
+    async def _get(self, url, **kwargs):
+        response = await request_with_retries(
+            self.session, 'GET', url, ACTIONNETWORK,
+            headers=self.headers, **kwargs
+        )
+        # A failed page must fail the group, rather than be mistaken for an
+        # empty or final page
+        response.raise_for_status()
+        return response.json()
+
+    async def refresh_config(self):
+        self.config = await self._get(actionnetwork.API_URL)
+
+    async def resource_to_url(self, resource):
+        if self.config is None:
+            await self.refresh_config()
+        links = self.config.get('_links', {})
+        return (links.get(resource) or links[f'osdi:{resource}'])['href']
+
+    async def _events(self, min_creation_time=None, min_modified_time=None, min_start_time=None):
+        """Pull the first page of events; see ActionNetwork._events."""
+        url = await self.resource_to_url('events')
+        return await self._get(
+            url,
+            params=ActionNetwork._events_params(
+                min_creation_time, min_modified_time, min_start_time
+            ),
+        )
+
+    async def _page_events(self, url):
+        return ActionNetwork._response_events(await self._get(url))
+
+    async def _remaining_pages(self, page_urls, page_workers):
+        """Fetch every page after the first one concurrently; see
+        ActionNetwork._remaining_pages."""
+        print(f"Fetching {len(page_urls)} more event pages, {page_workers} at a time")
+        semaphore = asyncio.Semaphore(page_workers)
+
+        async def page_events(url):
+            async with semaphore:
+                return await self._page_events(url)
+
+        pages = await asyncio.gather(*(page_events(url) for url in page_urls))
+        return [event for page in pages for event in page]
+
+    async def iter_linked_pages(self, start_url=None, **kwargs):
+        """Fetch raw events one page at a time, following the 'next' links;
+        see ActionNetwork.iter_linked_pages.
+
+        :return: async generator of (list of raw event dicts, link to the
+            next page or None after the last page) pairs, in page order
+        """
+        if start_url is None:
+            events_response = await self._events(**kwargs)
+        else:
+            events_response = await self._get(start_url)
+        if '_embedded' not in events_response:
+            print('WARNING: Response was missing events')
+            return
+        while True:
+            next_url = ActionNetwork._next_url(events_response)
+            yield ActionNetwork._response_events(events_response), next_url
+
+            if next_url is None:
+                return
+            print(f"Fetching event page {events_response['page']} out of {events_response['total_pages']}")
+            events_response = await self._get(next_url)
+
+    async def raw_events(self, page_workers=DEFAULT_PAGE_WORKERS, **kwargs):
+        """Get every raw event, following pagination; see
+        ActionNetwork.raw_events.
+
+        :return: list of raw event dicts, in page order
+        """
+        if page_workers <= 1:
+            return [
+                event
+                async for page, _ in self.iter_linked_pages(**kwargs)
+                for event in page
+            ]
+
+        events_response = await self._events(**kwargs)
+        try:
+            events = list(ActionNetwork._response_events(events_response))
+        except KeyError:
+            print('WARNING: Response was missing events')
+            return []
+
+        page_urls = ActionNetwork._remaining_page_urls(events_response)
+        if page_urls:
+            events += await self._remaining_pages(page_urls, page_workers)
+        return events
+
+    async def events(self, page_workers=DEFAULT_PAGE_WORKERS, **kwargs):
+        """Get events as compact ActionNetworkRecords, filtering out unwanted
+        events; see ActionNetwork.events."""
+        if page_workers <= 1:
+            return [
+                event
+                async for page in self.iter_event_pages(**kwargs)
+                for event in page
+            ]
+        return ActionNetwork._records(
+            await self.raw_events(page_workers=page_workers, **kwargs)
+        )
+
+    async def iter_event_pages(self, **kwargs):
+        """Like events, but lazily yields the events one page at a time.
+
+        :return: async generator of lists of ActionNetworkRecords
+        """
+        async for page, _ in self.iter_linked_pages(**kwargs):
+            yield ActionNetwork._records(page)
+
+
+async def iter_checkpointed_pages(group, api_key, checkpoint, session, **kwargs):
+    """Fetch a group's raw events one page at a time, saving each page to a
+    checkpoint; see actionnetwork.iter_checkpointed_pages.
+
+    The checkpoint is read and saved to on worker threads, so that file I/O
+    doesn't hold up the event loop.
+
+    :return: async generator of lists of raw event dicts, in page order
+    """
+    for page in await asyncio.to_thread(list, checkpoint.pages(group)):
+        yield page
+    done, next_url = checkpoint.group_progress(group)
+    if done:
+        return
+    if next_url is not None:
+        print(f"Resuming ActionNetwork events for {group} from {next_url}")
+    client = AsyncActionNetwork(api_key, session)
+    async for page, next_url in client.iter_linked_pages(start_url=next_url, **kwargs):
+        await asyncio.to_thread(checkpoint.save_page, group, page, next_url)
+        yield page
+
+
+async def _fetch_group(group, api_key, session, checkpoint=None, **kwargs):
+    print(f"Fetching ActionNetwork events for: {group}")
+    metrics = current_metrics()
+    with metrics.timed('actionnetwork_fetch', group=group):
+        if checkpoint is None:
+            events = await AsyncActionNetwork(api_key, session).events(**kwargs)
+        else:
+            # Pages are checkpointed in order, so they are fetched one at a
+            # time
+            kwargs.pop('page_workers', None)
+            events = [
+                event
+                async for page in iter_checkpointed_pages(
+                    group, api_key, checkpoint, session, **kwargs
+                )
+                for event in ActionNetwork._records(page)
+            ]
+    metrics.add('actionnetwork_events', len(events), group=group)
+    return events
+
+
+async def fetch_group_events(
+    group_key_map,
+    session,
+    max_workers=DEFAULT_MAX_WORKERS,
+    timeout=None,
+    since_by_group=None,
+    checkpoint=None,
+    **kwargs
+):
+    """Fetch events for several ActionNetwork groups at once, on the running
+    event loop; see actionnetwork.fetch_group_events.
+
+    At most max_workers groups are fetched at the same time. A group that
+    raises, or that has not finished within the timeout, is reported in the
+    returned errors instead of aborting the other groups.
+
+    :param group_key_map: mapping of group names to ActionNetwork API keys.
+        Groups without a key are skipped.
+    :type group_key_map: dict
+    :param session: aiohttp session shared by every group's client
+    :type session: aiohttp.ClientSession
+    :param max_workers: maximum number of groups fetched at the same time
+    :type max_workers: int, optional
+    :param timeout: seconds to wait for all groups before giving up on the
+        ones still running, defaults to None (wait forever)
+    :type timeout: float, optional
+    :param since_by_group: mapping of group names to ISO-formatted
+        timestamps; see actionnetwork.fetch_group_events
+    :type since_by_group: dict, optional
+    :param checkpoint: checkpoint to save each fetched page to, and resume
+        from
+    :type checkpoint: Checkpoint, optional
+    :return: tuple of (events keyed by group name, exceptions keyed by group
+        name)
+    :rtype: tuple[dict, dict]
+    """
+    group_key_map = actionnetwork._keyed_groups(group_key_map)
+    if not group_key_map:
+        return {}, {}
+
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def fetch(group, api_key, group_kwargs):
+        async with semaphore:
+            return await _fetch_group(group, api_key, session, checkpoint, **group_kwargs)
+
+    tasks = {}
+    for group, api_key in group_key_map.items():
+        group_kwargs = actionnetwork._group_kwargs(group, since_by_group, kwargs)
+        tasks[asyncio.create_task(fetch(group, api_key, group_kwargs))] = group
+    _, not_done = await asyncio.wait(tasks, timeout=timeout)
+    for task in not_done:
+        task.cancel()
+    return actionnetwork._group_results(tasks, not_done, timeout)
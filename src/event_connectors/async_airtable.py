@@ -0,0 +1,251 @@
+import asyncio
+import urllib.parse
+
+from event_connectors import airtable
+from event_connectors.airtable import TABLE_NAME
+from event_connectors.airtable import UPSERT_KEY_FIELD_NAMES
+from event_connectors.airtable import Airtable
+from event_connectors.async_http import REQUEST_ERRORS
+from event_connectors.async_http import request_with_retries
+from event_connectors.batch_writer import DEFAULT_REQUESTS_PER_SECOND
+from event_connectors.batch_writer import DEFAULT_WRITE_WORKERS
+from event_connectors.batch_writer import RATE_LIMIT_PENALTY_SECONDS
+from event_connectors.batch_writer import TokenBucket
+from event_connectors.batch_writer import WriteReport
+from event_connectors.batch_writer import record_chunks
+from event_connectors.metrics import AIRTABLE
+from event_connectors.metrics import current_metrics
+from event_connectors.retries import DEFAULT_BACKOFF_SECONDS
+from event_connectors.retries import DEFAULT_MAX_RETRIES
+from event_connectors.retries import RetryPolicy
+from event_models.events import AirtableEvent
+
+
+class AsyncTokenBucket(TokenBucket):
+    """Token bucket rate limiter whose acquire waits without blocking the
+    event loop."""
+
+    async def acquire(self):
+        """Take a token, waiting until one is available."""
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class AsyncBatchWriter:
+    """Asyncio counterpart of BatchWriter: writes records to an Airtable
+    table in concurrent chunks, within the base's requests-per-second budget.
+
+    At most max_workers requests to the base are in flight at the same time.
+    The semaphore bounding them is shared with AsyncAirtable's reads.
+    """
+
+    def __init__(
+        self,
+        url,
+        headers,
+        session,
+        requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+        max_workers=DEFAULT_WRITE_WORKERS,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+    ):
+        """
+        :param url: URL of the table's records endpoint
+        :param headers: headers to send with every request (authorization)
+        :param session: aiohttp session to make requests with
+        :param requests_per_second: request budget shared by all chunks
+        :param max_workers: most requests in flight at the same time
+        :param max_retries: times to retry a chunk before giving up on it
+        :param backoff_seconds: wait before the first retry, doubled after
+            each attempt. Ignored when the server sends Retry-After.
+        """
+        self.url = url
+        self.headers = headers
+        self.session = session
+        self.bucket = AsyncTokenBucket(requests_per_second)
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self.retry_policy = RetryPolicy(
+            max_retries=max_retries,
+            backoff_seconds=backoff_seconds,
+            rate_limit_penalty_seconds=RATE_LIMIT_PENALTY_SECONDS,
+        )
+
+    async def _throttle(self):
+        with current_metrics().timed(f'{AIRTABLE}_throttle'):
+            await self.bucket.acquire()
+
+    async def _write_chunk(self, method, chunk, options, on_written):
+        try:
+            async with self.semaphore:
+                response = await request_with_retries(
+                    self.session,
+                    method.upper(),
+                    self.url,
+                    AIRTABLE,
+                    self.retry_policy,
+                    before_attempt=self._throttle,
+                    # The rate limit applies to the whole base, so hold off
+                    # every chunk rather than just this one
+                    on_rate_limited=self.bucket.pause,
+                    json_body={'records': chunk, **options},
+                    # Creates that may have been committed aren't sent again
+                    idempotent=method.lower() != 'post',
+                    headers=self.headers,
+                )
+        except REQUEST_ERRORS as e:
+            return WriteReport.for_chunk(chunk, error=repr(e))
+        report = WriteReport.for_chunk(chunk, response)
+        if report.succeeded and on_written is not None:
+            await asyncio.to_thread(on_written, report.succeeded)
+        return report
+
+    async def write(self, method, records, on_written=None, **options):
+        """Write records in chunks; see BatchWriter.write.
+
+        :param on_written: called with the records returned by the API for
+            each chunk as soon as it is written, on a worker thread as it
+            may save to a file
+        :return: per-record results
+        :rtype: WriteReport
+        """
+        report = WriteReport()
+        chunk_reports = await asyncio.gather(*(
+            self._write_chunk(method, chunk, options, on_written)
+            for chunk in record_chunks(records)
+        ))
+        for chunk_report in chunk_reports:
+            report.extend(chunk_report)
+        return report
+
+
+class AsyncAirtable:
+    """Asyncio counterpart of Airtable, with the same events(),
+    events_by_actionnetwork_id(), add_events(), update_events() and
+    upsert_events() surface as coroutines.
+
+    Requests are made through an aiohttp session that can be shared with
+    ActionNetwork, so a run's connections are pooled together.
+    """
+
+    def __init__(
+        self,
+        personal_access_token: str,
+        base_id: str,
+        session,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        write_workers: int = DEFAULT_WRITE_WORKERS
+    ):
+        """
+        :param personal_access_token: Airtable personal access token
+        :param base_id: ID of the base containing the events table
+        :param session: aiohttp session to make requests with; see
+            async_http.client_session
+        :param requests_per_second: request budget for writes to the base
+        :param write_workers: most requests to the base in flight at the same
+            time
+        """
+        self.url = f'{airtable.API_URL}/v0/{base_id}/{urllib.parse.quote(TABLE_NAME)}'
+        self.headers = {'Authorization': f'Bearer {personal_access_token}'}
+        self.session = session
+        self.writer = AsyncBatchWriter(
+            self.url,
+            self.headers,
+            session,
+            requests_per_second=requests_per_second,
+            max_workers=write_workers,
+        )
+
+    async def _read_events(self, formula, fingerprints):
+        """Read every page of the events matching a formula.
+
+        Uses the POST form of listing records, which takes the formula in
+        the body rather than in a URL that may be too long for it.
+        """
+        url = f'{self.url}/listRecords'
+        options = {
+            'filterByFormula': formula,
+            'fields': Airtable.read_fields(fingerprints),
+        }
+        events = []
+        while True:
+            async with self.writer.semaphore:
+                response = await request_with_retries(
+                    self.session, 'POST', url, AIRTABLE,
+                    json_body=options, headers=self.headers,
+                )
+            response.raise_for_status()
+            page = response.json()
+            events += [AirtableEvent(record) for record in page['records']]
+            if not page.get('offset'):
+                return events
+            options['offset'] = page['offset']
+
+    async def events(
+        self,
+        min_start_time=None,
+        fingerprints=False,
+        modified_since=None
+    ) -> list[AirtableEvent]:
+        """Get synced events; see Airtable.events."""
+        return await self._read_events(
+            Airtable.events_formula(min_start_time, modified_since), fingerprints
+        )
+
+    async def events_by_actionnetwork_id(
+        self,
+        actionnetwork_ids,
+        fingerprints=False
+    ) -> list[AirtableEvent]:
+        """Get only the synced events for some ActionNetwork events; see
+        Airtable.events_by_actionnetwork_id. Batches of events are looked up
+        concurrently."""
+        pages = await asyncio.gather(*(
+            self._read_events(formula, fingerprints)
+            for formula in Airtable.lookup_formulas(actionnetwork_ids)
+        ))
+        return [event for page in pages for event in page]
+
+    async def add_events(
+        self,
+        events_to_add: list[AirtableEvent],
+        on_written=None
+    ) -> WriteReport:
+        """Create new events, upserted so that retries are safe; see
+        Airtable.add_events."""
+        return await self.writer.write(
+            'patch',
+            [{"fields": event.raw["fields"]} for event in events_to_add],
+            on_written=on_written,
+            performUpsert={'fieldsToMergeOn': UPSERT_KEY_FIELD_NAMES},
+        )
+
+    async def update_events(
+        self,
+        events_to_update: list[AirtableEvent],
+        changed_fields: dict[str, set[str]] = None,
+        on_written=None
+    ) -> WriteReport:
+        """Update existing events; see Airtable.update_events."""
+        return await self.writer.write(
+            'patch',
+            Airtable.update_records(events_to_update, changed_fields),
+            on_written=on_written,
+        )
+
+    async def upsert_events(
+        self,
+        events_to_upsert: list[AirtableEvent],
+        changed_fields: dict[str, set[str]] = None,
+        on_written=None
+    ) -> WriteReport:
+        """Create or update events in a single batched stream; see
+        Airtable.upsert_events."""
+        return await self.writer.write(
+            'patch',
+            Airtable.upsert_records(events_to_upsert, changed_fields),
+            on_written=on_written,
+            performUpsert={'fieldsToMergeOn': UPSERT_KEY_FIELD_NAMES},
+        )
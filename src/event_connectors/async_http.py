@@ -0,0 +1,160 @@
+import asyncio
+import json
+import types
+
+import aiohttp
+import requests
+from event_connectors.retries import DEFAULT_RETRY_POLICY
+from event_connectors.retries import Attempts
+from event_connectors.session import DEFAULT_CONNECT_TIMEOUT
+from event_connectors.session import DEFAULT_POOL_MAXSIZE
+from event_connectors.session import DEFAULT_READ_TIMEOUT
+
+# Errors a request can fail with, once retries are used up
+REQUEST_ERRORS = (
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    requests.exceptions.RequestException,
+)
+
+# Errors of attempts that failed to connect, so never reached the server
+CONNECT_ERRORS = (
+    aiohttp.ClientConnectorError,
+    aiohttp.ConnectionTimeoutError,
+)
+
+
+def client_session(
+    timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+    pool_maxsize=DEFAULT_POOL_MAXSIZE,
+):
+    """Create an aiohttp session, to be shared by every async connector in a
+    sync run.
+
+    Unlike the requests sessions in session.py, an aiohttp session belongs
+    to the event loop it was created on, so it can't be kept between runs.
+    Use it as an async context manager, so its connections are closed when
+    the run is done.
+
+    :param timeout: (connect, read) timeout in seconds for every request
+    :type timeout: tuple, optional
+    :param pool_maxsize: most connections open to a single host at the same
+        time
+    :type pool_maxsize: int, optional
+    :rtype: aiohttp.ClientSession
+    """
+    connect_timeout, read_timeout = timeout
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(
+            sock_connect=connect_timeout,
+            sock_read=read_timeout,
+        ),
+        connector=aiohttp.TCPConnector(limit_per_host=pool_maxsize),
+    )
+
+
+class Response:
+    """A fully read aiohttp response, with the same attributes as a
+    requests.Response where the connectors, retries and metrics use them.
+    """
+
+    def __init__(self, method, url, status_code, headers, content, body=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.request = types.SimpleNamespace(method=method, url=url, body=body)
+        # No urllib3 retries to count; see Metrics.record_response
+        self.raw = None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} [{self.status_code}]>"
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error for url: {self.url}",
+                response=self,
+            )
+
+
+async def request_with_retries(
+    session,
+    method,
+    url,
+    connector,
+    policy=DEFAULT_RETRY_POLICY,
+    before_attempt=None,
+    on_rate_limited=None,
+    json_body=None,
+    idempotent=True,
+    **kwargs
+):
+    """Make a request with aiohttp, retrying it with backoff if it fails,
+    through the circuit breaker for its host.
+
+    Retries, the circuit breaker and metrics work exactly as for
+    retries.request_with_retries, and share its per-host breakers, but
+    waiting between attempts leaves the event loop free for other requests.
+
+    :param session: the aiohttp session to make the request with
+    :param method: HTTP method
+    :param url: URL of the request
+    :param connector: name to record metrics under, such as ACTIONNETWORK
+    :param policy: when to retry
+    :type policy: RetryPolicy, optional
+    :param before_attempt: coroutine function awaited before each attempt,
+        such as to wait for a rate limiter
+    :param on_rate_limited: called with the seconds to wait when an attempt
+        is rate limited, before it is retried
+    :param json_body: JSON-serializable request body
+    :param idempotent: whether the request can safely be sent more than
+        once; see retries.request_with_retries
+    :type idempotent: bool, optional
+    :param kwargs: any other arguments for ClientSession.request, such as
+        headers and params
+    :raises CircuitOpenError: if the host's circuit breaker is open
+    :raises aiohttp.ClientError: if the last attempt failed without a
+        response
+    :return: the last attempt's response, which may be an error if every
+        attempt failed
+    :rtype: Response
+    """
+    body = None
+    if json_body is not None:
+        body = json.dumps(json_body).encode()
+        kwargs['headers'] = {**kwargs.get('headers', {}), 'Content-Type': 'application/json'}
+
+    attempts = Attempts(url, connector, policy, on_rate_limited, idempotent)
+    while True:
+        attempts.start()
+        if before_attempt is not None:
+            await before_attempt()
+        try:
+            async with session.request(method, url, data=body, **kwargs) as raw_response:
+                response = Response(
+                    method,
+                    str(raw_response.url),
+                    raw_response.status,
+                    raw_response.headers,
+                    await raw_response.read(),
+                    body,
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            delay = attempts.raised(e, not isinstance(e, CONNECT_ERRORS))
+        else:
+            delay = attempts.responded(response)
+        if delay is None:
+            return attempts.result()
+        await asyncio.sleep(delay)
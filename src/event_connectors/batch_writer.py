@@ -0,0 +1,234 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from event_connectors.metrics import AIRTABLE
+from event_connectors.metrics import current_metrics
+from event_connectors.retries import DEFAULT_BACKOFF_SECONDS
+from event_connectors.retries import DEFAULT_MAX_RETRIES
+from event_connectors.retries import RetryPolicy
+from event_connectors.retries import request_with_retries
+from event_connectors.session import shared_session
+
+# Airtable allows 5 requests per second per base, and at most 10 records per
+# create/update request
+DEFAULT_REQUESTS_PER_SECOND = 5
+MAX_RECORDS_PER_REQUEST = 10
+
+# Number of chunks written at the same time. Requests are still limited to
+# the requests-per-second budget; this only needs to be high enough to cover
+# request latency.
+DEFAULT_WRITE_WORKERS = 4
+
+# Airtable asks clients to wait 30 seconds after being rate limited, and
+# doesn't always send a Retry-After header saying so
+RATE_LIMIT_PENALTY_SECONDS = 30
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter.
+
+    Tokens are added continuously at the given rate up to the bucket's
+    capacity, and each request takes one token, waiting if there are none.
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: tokens added per second
+        :type rate: float
+        :param capacity: most tokens the bucket can hold, which is the largest
+            burst of requests allowed. defaults to rate
+        :type capacity: float, optional
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def _take(self):
+        """Take a token if one is available.
+
+        :return: 0 if a token was taken, otherwise the seconds to wait before
+            trying again
+        :rtype: float
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the given number of seconds."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class WriteReport:
+    """Per-record outcome of a batch write.
+
+    :ivar succeeded: records returned by the API for successful writes
+    :ivar failed: (record, error message) pairs for records that could not be
+        written
+    """
+    def __init__(self):
+        self.succeeded = []
+        self.failed = []
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} succeeded={len(self.succeeded)} "
+            f"failed={len(self.failed)}>"
+        )
+
+    def extend(self, other):
+        self.succeeded += other.succeeded
+        self.failed += other.failed
+
+    @classmethod
+    def for_chunk(cls, chunk, response=None, error=None):
+        """Build the report of a chunk's write request.
+
+        :param chunk: the records that were sent
+        :param response: the request's last response, if it got one
+        :param error: the error message the request failed with, if it got
+            no response
+        :rtype: WriteReport
+        """
+        report = cls()
+        if response is not None and response.ok:
+            report.succeeded += response.json()['records']
+            return report
+        if response is not None:
+            error = f"{response.status_code}: {response.text}"
+        print(f"WARNING: Failed to write {len(chunk)} records to Airtable: {error}")
+        report.failed += [(record, error) for record in chunk]
+        return report
+
+
+def record_chunks(records):
+    """Split records into chunks of at most MAX_RECORDS_PER_REQUEST, the
+    most Airtable accepts in a single write request."""
+    return [
+        records[i:i + MAX_RECORDS_PER_REQUEST]
+        for i in range(0, len(records), MAX_RECORDS_PER_REQUEST)
+    ]
+
+
+class BatchWriter:
+    """Writes records to an Airtable table in concurrent chunks.
+
+    Chunks share a token bucket so that the writer stays within the base's
+    requests-per-second budget no matter how many are in flight. Chunks that
+    are rate limited or hit a server error are retried with backoff; a chunk
+    that still fails is reported without stopping the other chunks.
+    """
+    def __init__(
+        self,
+        url,
+        headers,
+        session=None,
+        requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+        max_workers=DEFAULT_WRITE_WORKERS,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+    ):
+        """
+        :param url: URL of the table's records endpoint
+        :param headers: headers to send with every request (authorization)
+        :param session: HTTP session to make requests with. defaults to the
+            process-wide shared session
+        :param requests_per_second: request budget shared by all chunks
+        :param max_workers: most chunks written at the same time
+        :param max_retries: times to retry a chunk before giving up on it
+        :param backoff_seconds: wait before the first retry, doubled after
+            each attempt. Ignored when the server sends Retry-After.
+        """
+        self.url = url
+        self.headers = headers
+        self.session = session or shared_session()
+        self.bucket = TokenBucket(requests_per_second)
+        self.max_workers = max_workers
+        self.retry_policy = RetryPolicy(
+            max_retries=max_retries,
+            backoff_seconds=backoff_seconds,
+            rate_limit_penalty_seconds=RATE_LIMIT_PENALTY_SECONDS,
+        )
+
+    def _throttle(self):
+        with current_metrics().timed(f'{AIRTABLE}_throttle'):
+            self.bucket.acquire()
+
+    def _write_chunk(self, method, chunk, options, on_written):
+        try:
+            response = request_with_retries(
+                lambda: self.session.request(
+                    method,
+                    self.url,
+                    headers=self.headers,
+                    json={'records': chunk, **options},
+                ),
+                self.url,
+                AIRTABLE,
+                self.retry_policy,
+                before_attempt=self._throttle,
+                # The rate limit applies to the whole base, so hold off every
+                # chunk rather than just this one
+                on_rate_limited=self.bucket.pause,
+                # Creates that may have been committed aren't sent again
+                idempotent=method.lower() != 'post',
+            )
+        except requests.exceptions.RequestException as e:
+            return WriteReport.for_chunk(chunk, error=repr(e))
+        report = WriteReport.for_chunk(chunk, response)
+        if report.succeeded and on_written is not None:
+            on_written(report.succeeded)
+        return report
+
+    def write(self, method, records, on_written=None, **options):
+        """Write records in chunks of MAX_RECORDS_PER_REQUEST.
+
+        :param method: HTTP method; 'post' creates records, 'patch' updates
+        :param records: record dicts in the format the API expects
+        :param on_written: called with the records returned by the API for
+            each chunk as soon as it is written, from the worker thread that
+            wrote it
+        :param options: any other top-level JSON parameters for each request,
+            such as performUpsert
+        :return: per-record results
+        :rtype: WriteReport
+        """
+        report = WriteReport()
+        chunks = record_chunks(records)
+        if not chunks:
+            return report
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(chunks))),
+            thread_name_prefix='airtable-write',
+        ) as executor:
+            for chunk_report in executor.map(
+                lambda chunk: self._write_chunk(method, chunk, options, on_written),
+                chunks
+            ):
+                report.extend(chunk_report)
+        return report
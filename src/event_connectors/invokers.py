@@ -0,0 +1,82 @@
+import json
+import threading
+from functools import lru_cache
+
+# Seconds to wait for an invocation to return. Lambda functions run for at
+# most 15 minutes, and the client's default of 60 seconds would give up on
+# (and retry) any longer invocation.
+INVOKE_READ_TIMEOUT = 910
+
+
+@lru_cache
+def lambda_client():
+    """Get the process-wide Lambda client, creating it on first use.
+
+    Retries are turned off, as retrying an invocation that timed out on our
+    side would run it twice. boto3 is imported here to keep it out of cold
+    starts that never invoke anything.
+    """
+    import boto3
+    from botocore.config import Config
+    return boto3.client('lambda', config=Config(
+        read_timeout=INVOKE_READ_TIMEOUT,
+        retries={'total_max_attempts': 1},
+    ))
+
+
+class LambdaInvoker:
+    """Invokes a Lambda function and waits for its result."""
+
+    def __init__(self, function_name, client=None):
+        """
+        :param function_name: name or ARN of the function to invoke
+        :type function_name: str
+        :param client: Lambda client, defaults to the process-wide client
+        """
+        self.function_name = function_name
+        self.client = client
+
+    def invoke(self, payload):
+        """Invoke the function with an event, and wait for it to finish.
+
+        :param payload: the event, which must be JSON serializable
+        :type payload: dict
+        :raises RuntimeError: if the function raised an error
+        :return: the function's return value
+        """
+        client = self.client or lambda_client()
+        response = client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps(payload).encode(),
+        )
+        result = json.loads(response['Payload'].read() or 'null')
+        if response.get('FunctionError'):
+            raise RuntimeError(
+                f"{self.function_name} failed: "
+                f"{result.get('errorType')}: {result.get('errorMessage')}"
+            )
+        return result
+
+
+class LocalInvoker:
+    """Stands in for LambdaInvoker by calling a handler in this process.
+
+    Payloads and results go through JSON, as they would through Lambda.
+    Invocations run one at a time, as each Lambda container handles a single
+    invocation at a time, and handlers rely on process-wide state (such as
+    the current metrics).
+    """
+
+    def __init__(self, handler):
+        """
+        :param handler: the Lambda handler function to call
+        :type handler: callable
+        """
+        self.handler = handler
+        self._lock = threading.Lock()
+
+    def invoke(self, payload):
+        with self._lock:
+            result = self.handler(json.loads(json.dumps(payload)))
+        return json.loads(json.dumps(result))
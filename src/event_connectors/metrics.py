@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# CloudWatch namespace the metrics are published under
+DEFAULT_NAMESPACE = 'EventSync'
+
+# Names the connectors record HTTP metrics under
+ACTIONNETWORK = 'actionnetwork'
+AIRTABLE = 'airtable'
+
+
+class Metrics:
+    """Counters and timings collected over a single sync run.
+
+    Metrics are emitted as CloudWatch Embedded Metric Format (EMF) log lines,
+    which CloudWatch turns into metrics when they are printed from a Lambda,
+    and which can be read back from stdout anywhere else.
+
+    Recording is thread-safe, as groups are fetched and records written on
+    worker threads.
+    """
+
+    def __init__(self, namespace=DEFAULT_NAMESPACE, dimensions=None):
+        """
+        :param namespace: CloudWatch namespace for the metrics
+        :type namespace: str, optional
+        :param dimensions: dimensions every metric is published with
+        :type dimensions: dict, optional
+        """
+        self.namespace = namespace
+        self.dimensions = dimensions or {}
+        self.values = defaultdict(float)
+        self.units = {}
+        self.group_values = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+
+    def add(self, name, value=1, unit='Count', group=None):
+        """Add to a metric, which starts at 0.
+
+        :param name: metric name
+        :param value: amount to add
+        :param unit: CloudWatch unit of the metric
+        :param group: ActionNetwork group the value belongs to, for metrics
+            broken down by group
+        """
+        with self._lock:
+            values = self.values if group is None else self.group_values[group]
+            values[name] += value
+            self.units[name] = unit
+
+    @contextmanager
+    def timed(self, name, group=None):
+        """Record the wall time spent in a block as the metric
+        <name>_seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(
+                f'{name}_seconds',
+                time.perf_counter() - start,
+                unit='Seconds',
+                group=group,
+            )
+
+    def record_response(self, connector, response):
+        """Count an HTTP response: the request, the bytes sent and received,
+        and any retries and rate limiting before it.
+
+        Retries made by urllib3 (such as pyairtable's) are only visible
+        through the response's retry history, which is counted too.
+
+        :param connector: name to record the metrics under, such as
+            ACTIONNETWORK
+        :param response: the final response to the request
+        :type response: requests.Response
+        """
+        body = response.request.body if response.request is not None else None
+        self.add(f'{connector}_requests')
+        self.add(f'{connector}_bytes_sent', len(body or b''), unit='Bytes')
+        self.add(f'{connector}_bytes_received', len(response.content or b''), unit='Bytes')
+        if response.status_code == 429:
+            self.add(f'{connector}_rate_limited')
+        if response.status_code >= 400:
+            self.add(f'{connector}_errors')
+
+        retries = getattr(getattr(response.raw, 'retries', None), 'history', ())
+        if retries:
+            self.add(f'{connector}_retries', len(retries))
+            self.add(f'{connector}_rate_limited', sum(
+                1 for retry in retries if retry.status == 429
+            ))
+
+    def _document(self, values, dimensions, timestamp):
+        names = sorted(values)
+        return {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [list(dimensions)],
+                    'Metrics': [
+                        {'Name': name, 'Unit': self.units[name]}
+                        for name in names
+                    ],
+                }],
+            },
+            **dimensions,
+            **{name: round(values[name], 3) for name in names},
+        }
+
+    def documents(self, timestamp=None):
+        """Build the EMF documents for every metric recorded.
+
+        :param timestamp: milliseconds since the epoch, defaults to now
+        :return: one document for the run as a whole, then one for each
+            group with metrics, with the group as an extra dimension
+        :rtype: list[dict]
+        """
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        with self._lock:
+            documents = [self._document(self.values, self.dimensions, timestamp)]
+            for group, values in self.group_values.items():
+                documents.append(self._document(
+                    values, {**self.dimensions, 'Group': group}, timestamp
+                ))
+        return documents
+
+    def emit(self):
+        """Print the metrics as EMF log lines."""
+        for document in self.documents():
+            print(json.dumps(document))
+
+
+_current = Metrics()
+
+
+def current_metrics():
+    """Get the metrics of the sync run in progress.
+
+    Connectors record into whichever run is current, so metrics don't need
+    to be passed through every client.
+
+    :rtype: Metrics
+    """
+    return _current
+
+
+def start_metrics(**kwargs):
+    """Start collecting metrics for a new sync run.
+
+    :param kwargs: arguments for Metrics
+    :return: the new current metrics
+    :rtype: Metrics
+    """
+    global _current
+    _current = Metrics(**kwargs)
+    return _current
@@ -0,0 +1,390 @@
+import random
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+import urllib3
+from event_connectors.metrics import current_metrics
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_SECONDS = 0.5
+DEFAULT_MAX_BACKOFF_SECONDS = 30
+
+RETRIABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Consecutive failed requests to a host after which requests to it fail fast,
+# and how long to wait before letting requests through again
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of making a request to a host that keeps failing."""
+
+
+class RetryPolicy:
+    """How many times, and after how long, to retry a failed request."""
+
+    def __init__(
+        self,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+        max_backoff_seconds=DEFAULT_MAX_BACKOFF_SECONDS,
+        retriable_status_codes=RETRIABLE_STATUS_CODES,
+        rate_limit_penalty_seconds=None,
+    ):
+        """
+        :param max_retries: times to retry a request before giving up on it
+        :param backoff_seconds: wait before the first retry, doubled after
+            each attempt
+        :param max_backoff_seconds: longest wait between attempts, unless the
+            server asks for longer with Retry-After
+        :param retriable_status_codes: response statuses worth retrying.
+            Idempotent requests that fail to get a response at all are always
+            retried; see should_retry.
+        :param rate_limit_penalty_seconds: wait after a 429 response without
+            a Retry-After header, for APIs that penalize clients that retry
+            too soon. defaults to backing off as for any other failure
+        """
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retriable_status_codes = retriable_status_codes
+        self.rate_limit_penalty_seconds = rate_limit_penalty_seconds
+
+    def should_retry(self, response, idempotent=True, reached_server=True):
+        """Whether a failed attempt is worth retrying, if any retries are
+        left.
+
+        :param response: the attempt's response, or None if it didn't get one
+        :param idempotent: whether sending the request twice has the same
+            effect as sending it once. If not, only attempts the server can't
+            have acted on are retried: those that were rate limited, or that
+            never reached it.
+        :param reached_server: for an attempt without a response, whether the
+            request may have been sent to the server before it failed
+        :rtype: bool
+        """
+        if response is not None:
+            return response.status_code in self.retriable_status_codes and (
+                idempotent or response.status_code == 429
+            )
+        return idempotent or not reached_server
+
+    @staticmethod
+    def retry_after(response):
+        """Get the seconds to wait asked for by a response's Retry-After
+        header, which may be a number of seconds or an HTTP date.
+
+        :return: seconds to wait, or None if the header is missing or invalid
+        :rtype: float
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    def delay(self, response, attempt):
+        """Get the seconds to wait before retrying a request.
+
+        :param response: the failed attempt's response, or None if it didn't
+            get one
+        :param attempt: number of the failed attempt, starting at 0
+        """
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return retry_after
+        if (
+            response is not None and response.status_code == 429 and
+            self.rate_limit_penalty_seconds is not None
+        ):
+            return self.rate_limit_penalty_seconds
+        # Jitter keeps requests that failed together from retrying together
+        backoff = self.backoff_seconds * 2 ** attempt * random.uniform(0.5, 1.5)
+        return min(backoff, self.max_backoff_seconds)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class CircuitBreaker:
+    """Stops requests to a host that keeps failing, to fail fast rather than
+    spend the run's time (and the API's patience) on retries that won't
+    succeed.
+
+    The breaker opens after failure_threshold consecutive failures. While
+    open, requests are refused; once reset_seconds have passed, requests are
+    let through again, and the breaker closes after the first success or
+    opens again after the next failure.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        reset_seconds=DEFAULT_RESET_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return (
+                self.opened_at is not None and
+                time.monotonic() - self.opened_at < self.reset_seconds
+            )
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """Count a failed request.
+
+        :return: whether this failure opened the breaker
+        :rtype: bool
+        """
+        with self._lock:
+            self.failures += 1
+            now = time.monotonic()
+            already_open = (
+                self.opened_at is not None and
+                now - self.opened_at < self.reset_seconds
+            )
+            if self.failures >= self.failure_threshold and not already_open:
+                self.opened_at = now
+                return True
+            return False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(url):
+    """Get the process-wide circuit breaker for a URL's host.
+
+    :rtype: CircuitBreaker
+    """
+    host = urllib.parse.urlparse(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+def reached_server(error):
+    """Whether a request that failed with a requests exception may have been
+    sent to the server, as opposed to failing to connect.
+
+    :type error: requests.exceptions.RequestException
+    :rtype: bool
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return False
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return not isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+class Attempts:
+    """The attempts at a single request: the circuit breaker, metrics and
+    retry decisions shared by request_with_retries and its asyncio
+    counterpart, which only make each attempt and wait between them.
+
+    Every attempt's response is recorded in the current metrics, along with
+    each retry (as <connector>_retries), each time the breaker opens (as
+    <connector>_circuit_opened) and each request refused by an open breaker
+    (as <connector>_circuit_rejected).
+    """
+
+    def __init__(
+        self,
+        url,
+        connector,
+        policy=DEFAULT_RETRY_POLICY,
+        on_rate_limited=None,
+        idempotent=True,
+    ):
+        """
+        :param url: URL of the request, whose host picks the circuit breaker
+        :param connector: name to record metrics under, such as ACTIONNETWORK
+        :param policy: when to retry
+        :type policy: RetryPolicy, optional
+        :param on_rate_limited: called with the seconds to wait when an
+            attempt is rate limited, before it is retried
+        :type on_rate_limited: callable, optional
+        :param idempotent: whether the request can safely be sent more than
+            once; see RetryPolicy.should_retry
+        :type idempotent: bool, optional
+        """
+        self.url = url
+        self.connector = connector
+        self.policy = policy
+        self.on_rate_limited = on_rate_limited
+        self.idempotent = idempotent
+        self.metrics = current_metrics()
+        self.breaker = circuit_breaker(url)
+        self.attempt = 0
+        self.response = None
+        self.error = None
+
+    def start(self):
+        """Check that an attempt may be made.
+
+        :raises CircuitOpenError: if the host's circuit breaker is open
+        """
+        if self.breaker.is_open:
+            self.metrics.add(f'{self.connector}_circuit_rejected')
+            raise CircuitOpenError(
+                f"Not requesting {self.url}: too many recent failures"
+            )
+
+    def responded(self, response):
+        """Record an attempt that got a response.
+
+        :return: seconds to wait before retrying, or None if the attempt is
+            the last one
+        """
+        self.metrics.record_response(self.connector, response)
+        self.response = response
+        self.error = None
+        if response.status_code not in self.policy.retriable_status_codes:
+            self.breaker.record_success()
+            return None
+        return self._failed(f"{response.status_code}: {response.text}", True)
+
+    def raised(self, error, reached_server=True):
+        """Record an attempt that failed without a response.
+
+        :param error: the exception the attempt raised
+        :param reached_server: whether the request may have been sent before
+            it failed
+        :return: seconds to wait before retrying, or None if the attempt is
+            the last one
+        """
+        self.metrics.add(f'{self.connector}_errors')
+        self.response = None
+        self.error = error
+        return self._failed(error, reached_server)
+
+    def _failed(self, error, reached_server):
+        response = self.response
+        rate_limited = response is not None and response.status_code == 429
+        # Being rate limited says nothing about the host's health
+        if not rate_limited and self.breaker.record_failure():
+            print(f"WARNING: Failing requests to {urllib.parse.urlparse(self.url).netloc} fast for {self.breaker.reset_seconds}s")
+            self.metrics.add(f'{self.connector}_circuit_opened')
+
+        if (
+            self.attempt == self.policy.max_retries or
+            self.breaker.is_open or
+            not self.policy.should_retry(response, self.idempotent, reached_server)
+        ):
+            return None
+        delay = self.policy.delay(response, self.attempt)
+        if rate_limited and self.on_rate_limited is not None:
+            self.on_rate_limited(delay)
+        print(f"WARNING: Retrying {self.connector} request in {delay:.1f}s after {error}")
+        self.metrics.add(f'{self.connector}_retries')
+        self.attempt += 1
+        return delay
+
+    def result(self):
+        """Get the last attempt's response.
+
+        :raises Exception: the last attempt's error, if it got no response
+        """
+        if self.response is None:
+            raise self.error
+        return self.response
+
+
+def request_with_retries(
+    send,
+    url,
+    connector,
+    policy=DEFAULT_RETRY_POLICY,
+    before_attempt=None,
+    on_rate_limited=None,
+    idempotent=True,
+):
+    """Make a request, retrying it with backoff if it fails, through the
+    circuit breaker for its host; see Attempts for the metrics recorded.
+
+    :param send: makes a single attempt at the request, and returns its
+        response
+    :type send: callable
+    :param url: URL of the request, whose host picks the circuit breaker
+    :param connector: name to record metrics under, such as ACTIONNETWORK
+    :param policy: when to retry. defaults to DEFAULT_RETRY_POLICY
+    :type policy: RetryPolicy, optional
+    :param before_attempt: called before each attempt, such as to wait for
+        a rate limiter
+    :type before_attempt: callable, optional
+    :param on_rate_limited: called with the seconds to wait when an attempt
+        is rate limited, before it is retried
+    :type on_rate_limited: callable, optional
+    :param idempotent: whether the request can safely be sent more than
+        once. Pass False for requests such as creates, which are then not
+        retried after read timeouts or server errors, as the server may have
+        acted on them. defaults to True
+    :type idempotent: bool, optional
+    :raises CircuitOpenError: if the host's circuit breaker is open
+    :raises requests.exceptions.RequestException: if the last attempt
+        failed without a response
+    :return: the last attempt's response, which may be an error if every
+        attempt failed
+    :rtype: requests.Response
+    """
+    attempts = Attempts(url, connector, policy, on_rate_limited, idempotent)
+    while True:
+        attempts.start()
+        if before_attempt is not None:
+            before_attempt()
+        try:
+            delay = attempts.responded(send())
+        except requests.exceptions.RequestException as e:
+            delay = attempts.raised(e, reached_server(e))
+        if delay is None:
+            return attempts.result()
+        time.sleep(delay)
+
+
+class RetryingSession(requests.Session):
+    """A requests Session that sends every request through
+    request_with_retries, for clients that make their own requests (such as
+    pyairtable)."""
+
+    def __init__(self, connector, policy=DEFAULT_RETRY_POLICY):
+        """
+        :param connector: name to record metrics under
+        :param policy: when to retry
+        :type policy: RetryPolicy, optional
+        """
+        super().__init__()
+        self.connector = connector
+        self.policy = policy
+
+    def send(self, request, **kwargs):
+        return request_with_retries(
+            lambda: super(RetryingSession, self).send(request, **kwargs),
+            request.url,
+            self.connector,
+            self.policy,
+        )
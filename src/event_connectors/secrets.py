@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from functools import lru_cache
+
+# Seconds a secret is reused for before it is fetched again, so that warm
+# Lambda containers pick up rotated keys
+DEFAULT_SECRET_TTL = 900
+
+
+@lru_cache
+def secretsmanager_client():
+    """Get the process-wide Secrets Manager client, creating it on first use.
+
+    boto3 is imported here rather than at the top of the module, as
+    importing it takes a large part of a cold start and runs that have their
+    secrets in the environment don't need it at all.
+    """
+    import boto3
+    return boto3.client('secretsmanager')
+
+
+class SecretCache:
+    """JSON secrets from Secrets Manager, cached for a limited time.
+
+    Secrets requested together are fetched together, in a single
+    BatchGetSecretValue call. Clients from botocore releases that predate
+    BatchGetSecretValue fetch them one GetSecretValue call at a time instead.
+    """
+
+    def __init__(self, ttl=DEFAULT_SECRET_TTL, client=None):
+        """
+        :param ttl: seconds to cache each secret for
+        :type ttl: float, optional
+        :param client: Secrets Manager client. defaults to the process-wide
+            client, created when a secret is first fetched
+        """
+        self.ttl = ttl
+        self.client = client
+        self._secrets = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, secret_ids):
+        client = self.client or secretsmanager_client()
+        if not hasattr(client, 'batch_get_secret_value'):
+            return {
+                secret_id: json.loads(
+                    client.get_secret_value(SecretId=secret_id)['SecretString']
+                )
+                for secret_id in secret_ids
+            }
+
+        secrets = {}
+        kwargs = {'SecretIdList': list(secret_ids)}
+        while True:
+            response = client.batch_get_secret_value(**kwargs)
+            if response.get('Errors'):
+                raise RuntimeError(
+                    f"Failed to fetch secrets: {response['Errors']}"
+                )
+            for secret in response['SecretValues']:
+                # Secrets can be requested by name or ARN
+                for secret_id in secret_ids:
+                    if secret_id in (secret['Name'], secret['ARN']):
+                        secrets[secret_id] = json.loads(secret['SecretString'])
+            if not response.get('NextToken'):
+                break
+            kwargs['NextToken'] = response['NextToken']
+
+        missing = set(secret_ids) - set(secrets)
+        if missing:
+            raise RuntimeError(f"Secrets not returned: {sorted(missing)}")
+        return secrets
+
+    def get(self, *secret_ids):
+        """Get secrets, fetching any that aren't cached (or have expired).
+
+        :param secret_ids: names or ARNs of the secrets
+        :return: the parsed secrets, keyed by the given secret IDs
+        :rtype: dict
+        """
+        now = time.monotonic()
+        with self._lock:
+            missing = [
+                secret_id for secret_id in secret_ids
+                if secret_id not in self._secrets or
+                self._secrets[secret_id][0] <= now
+            ]
+            if missing:
+                for secret_id, secret in self._fetch(missing).items():
+                    self._secrets[secret_id] = (now + self.ttl, secret)
+            return {
+                secret_id: self._secrets[secret_id][1]
+                for secret_id in secret_ids
+            }
+
+    def clear(self):
+        """Forget every cached secret."""
+        with self._lock:
+            self._secrets = {}
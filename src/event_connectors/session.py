@@ -0,0 +1,72 @@
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Seconds to wait for a connection to be established, and for the server to
+# send a response once connected
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+# Number of hosts to keep pools for, and the number of connections kept alive
+# per host. The pool should be at least as large as the number of requests we
+# make at the same time or connections will be thrown away after use.
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+
+
+class TimeoutSession(requests.Session):
+    """A requests Session that applies a default timeout to every request.
+
+    requests has no session-wide timeout setting, and without one a request
+    to an unresponsive host will wait forever.
+    """
+    def __init__(
+        self,
+        timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+    ):
+        """Create a session with a connection pool mounted for http(s).
+
+        :param timeout: (connect, read) timeout in seconds applied to any
+            request that doesn't pass its own
+        :type timeout: tuple, optional
+        :param pool_connections: number of per-host pools to keep
+        :type pool_connections: int, optional
+        :param pool_maxsize: number of connections to keep alive per host
+        :type pool_maxsize: int, optional
+        """
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+        )
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+@lru_cache
+def shared_session(
+    timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+    pool_connections=DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize=DEFAULT_POOL_MAXSIZE,
+):
+    """Get the process-wide session for the given settings.
+
+    Sessions are kept for the life of the process, so connections stay open
+    between pages, between groups and between warm Lambda invocations.
+
+    :return: a session shared by every caller using the same settings
+    :rtype: TimeoutSession
+    """
+    return TimeoutSession(
+        timeout=timeout,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+    )
@@ -1,7 +1,16 @@
+import hashlib
+import json
+import sys
 from abc import ABC
+from collections.abc import Sequence
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+# Timezone we assume ActionNetwork event times are in; see
+# ActionNetworkEvent.to_datetime
+EASTERN = ZoneInfo("America/New_York")
+
 class Event(ABC):
     """Abstract base class for Event types.
 
@@ -15,6 +24,9 @@ class Event(ABC):
     those of other event types.
     """
 
+    # Lets compact subclasses (see ActionNetworkRecord) do without a __dict__
+    __slots__ = ()
+
     # Collection of names of fields which must be set on the event object
     # in order for it to be valid for pushing to the API for this event type
     REQUIRED_FIELD_NAMES = set()
@@ -28,6 +40,31 @@ class Event(ABC):
     # The name of the field to use as the primary ID for this event type
     PRIMARY_ID_NAME = None
 
+    # Names of the raw fields read by this event type's properties, for
+    # systems which let us request a subset of fields
+    RAW_FIELD_NAMES = []
+
+    # The name of the raw field this event type stores the fingerprint of its
+    # source event in, for event types that are synced from another system
+    SOURCE_FINGERPRINT_FIELD_NAME = None
+
+    # Names of fields which are not read along with the source fingerprint.
+    # The source fingerprint includes a fingerprint for each of them, so we
+    # can still tell whether they changed
+    FINGERPRINT_ONLY_FIELD_NAMES = set()
+
+    # Names of all properties containing information about the event.
+    # Computed once for each subclass when it is defined; see event_fields
+    _event_fields = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._event_fields = frozenset(
+            name for name in set(dir(cls)) - set(dir(Event))
+            # Skip internals such as __dict__ and dataclass bookkeeping
+            if not name.startswith('_')
+        ) - cls.DERIVED_FIELD_NAMES
+
     def __init__(self, raw_event=None):
         """Create an empty Event object, or create an Event representation of
         raw event info.
@@ -55,12 +92,30 @@ class Event(ABC):
 
     def print_diff(self, other):
         print(f"\nDifferences in Event: {self}")
-        for field in self.event_fields().union(other.event_fields()):
-            self_value = self.event_info()[field]
-            other_value = other.event_info()[field]
+        self_info = self.event_info()
+        other_info = other.event_info()
+        for field in self_info.keys() | other_info.keys():
+            self_value = self_info.get(field)
+            other_value = other_info.get(field)
             if self_value != other_value:
                 print(f"Field {field}: {self_value} >> {other_value}")
 
+    def changed_fields(self, other):
+        """Get the names of the fields whose values differ between this event
+        and another.
+
+        :param other: the event to compare against
+        :type other: Event
+        :return: set of field names
+        :rtype: set
+        """
+        self_info = self.event_info()
+        other_info = other.event_info()
+        return {
+            field for field in self_info.keys() | other_info.keys()
+            if self_info.get(field) != other_info.get(field)
+        }
+
     @property
     def primary_id(self):
         return getattr(self, self.PRIMARY_ID_NAME)
@@ -134,9 +189,9 @@ class Event(ABC):
         event.
 
         :return: set of property names
-        :rtype: set
+        :rtype: frozenset
         """
-        return set(dir(cls)) - set(dir(Event)) - cls.DERIVED_FIELD_NAMES
+        return cls._event_fields
 
     def event_info(self):
         """Get the names and values of all properties containing information
@@ -145,10 +200,43 @@ class Event(ABC):
         :return: dictionary of event information
         :rtype: dict
         """
-        return {
-            field: getattr(self, field)
-            for field in self.__class__.event_fields()
-        }
+        return {field: getattr(self, field) for field in self._event_fields}
+
+    def subset(self, fields):
+        """Copy the event, keeping only the primary ID and the given fields.
+
+        :param fields: names of the fields to keep
+        :type fields: Iterable[str]
+        :return: a new event of the same type
+        :rtype: Event
+        """
+        event = self.__class__()
+        event.primary_id = self.primary_id
+        for field in fields:
+            if field != self.PRIMARY_ID_NAME:
+                setattr(event, field, getattr(self, field))
+        return event
+
+    def fingerprint(self, fields=None):
+        """Get a hash of the event's information.
+
+        Two events of the same type with the same event_info have the same
+        fingerprint, so it can be stored and compared later on to tell whether
+        an event has changed without keeping all of its information around.
+
+        :param fields: names of the fields to hash, defaults to all of them
+        :type fields: Iterable[str], optional
+        :return: hex digest of the event information
+        :rtype: str
+        """
+        if fields is None:
+            info = self.event_info()
+        else:
+            info = {field: getattr(self, field) for field in fields}
+        # Values are serialized with str() where JSON has no equivalent
+        # (datetimes), which is stable for the types our properties return
+        normalized = json.dumps(info, sort_keys=True, default=str)
+        return hashlib.sha256(normalized.encode()).hexdigest()
 
     def translate_to(self, new_class):
         """Translate the event object to a different event format.
@@ -179,6 +267,18 @@ class Event(ABC):
             dt = datetime.fromisoformat(raw_time)
         return dt
 
+    def to_record(self):
+        """Compute every field once and store the results in a compact,
+        read-only record, so that the raw event can be released.
+
+        Defined here, like from_datetime, so that subclass implementations
+        are not counted in event_fields.
+
+        :return: a record with the same event_info as this event
+        :rtype: Event
+        """
+        raise NotImplementedError
+
     @classmethod
     def from_datetime(cls, dt):
         """Translates a datetime into the event type's native time format.
@@ -200,6 +300,26 @@ class AirtableEvent(Event):
         'description',
     }
     PRIMARY_ID_NAME = 'airtable_id'
+    # This column is optional, so it is not part of RAW_FIELD_NAMES
+    SOURCE_FINGERPRINT_FIELD_NAME = 'source_fingerprint'
+    # Descriptions can be very large, so they are not read when comparing
+    # events by fingerprint; see Airtable.read_fields
+    FINGERPRINT_ONLY_FIELD_NAMES = {'description'}
+
+    # Names of the Airtable columns read by this class' properties. Any other
+    # columns in the table are not needed to sync events.
+    RAW_FIELD_NAMES = [
+        'actionnetwork_id',
+        'actionnetwork_link',
+        'Event Title',
+        'Description',
+        'Host Group',
+        'Start Time',
+        'End Time',
+        'Location',
+        'removed',
+        'modified',
+    ]
 
     @property
     def airtable_id(self):
@@ -301,6 +421,14 @@ class AirtableEvent(Event):
     def removed(self, removed):
         self.set(removed, 'fields', 'removed')
 
+    @property
+    def source_fingerprint(self):
+        return self.lookup('fields', self.SOURCE_FINGERPRINT_FIELD_NAME)
+
+    @source_fingerprint.setter
+    def source_fingerprint(self, fingerprint):
+        self.set(fingerprint, 'fields', self.SOURCE_FINGERPRINT_FIELD_NAME)
+
 class ActionNetworkEvent(Event):
     PRIMARY_ID_NAME = 'actionnetwork_id'
 
@@ -354,7 +482,7 @@ class ActionNetworkEvent(Event):
         # user to enter a timezone manually, but this does not seem to
         # appear in the API response, so we treat it the same way.
         time_with_utc_zone = super().to_datetime(raw_time)
-        return time_with_utc_zone.replace(tzinfo=ZoneInfo("America/New_York"))
+        return time_with_utc_zone.replace(tzinfo=EASTERN)
 
     @property
     def location(self):
@@ -386,6 +514,35 @@ class ActionNetworkEvent(Event):
     def removed(self):
         return self.lookup('status') == 'cancelled'
 
+    def to_record(self):
+        info = self.event_info()
+        # Many events share a handful of locations (such as 'Online')
+        info['location'] = sys.intern(info['location'])
+        return ActionNetworkRecord(**info, updated_at=self.updated_at)
+
+
+@dataclass(frozen=True, slots=True, eq=False, repr=False)
+class ActionNetworkRecord(Event):
+    """Compact, read-only ActionNetwork event holding already computed field
+    values instead of the raw event.
+
+    Records have the same fields (and event_info, and fingerprint) as the
+    ActionNetworkEvent they were made from, so they can be diffed and
+    translated in the same way, at a fraction of the memory.
+    """
+    PRIMARY_ID_NAME = 'actionnetwork_id'
+
+    actionnetwork_id: str
+    actionnetwork_link: str
+    updated_at: str
+    title: str
+    description: str
+    host_group: str
+    start: datetime
+    end: datetime
+    location: str
+    removed: bool
+
 
 class EventDiffer():
     """Computes the difference between sets of events of different classes.
@@ -406,26 +563,64 @@ class EventDiffer():
         events_from_source,
         events_at_destination,
         destination_class=AirtableEvent,
-        verbose=False
+        source_class=ActionNetworkEvent,
+        verbose=False,
+        partial_source=False,
+        use_fingerprints=False,
+        window_start=None
     ):
         """Create an EventDiffer.
 
-        :param events_from_source: list of events to generate the diff for
-        :type events_from_source: List[Event]
+        :param events_from_source: events to generate the diff for. If this
+            is an iterator rather than a list, events are matched as they
+            arrive and matched events that are already up to date are dropped
+            straight away, so the source events never all need to be held in
+            memory at once
+        :type events_from_source: List[Event] or Iterator[Event]
         :param events_at_destination: the baseline events to compare against
         :type events_at_destination: List[Event]
         :param destination_class: The class to build new destination events
             with, in case there are no existing destination events to match
             against. defaults to AirtableEvent
         :type destination_class: class, optional
+        :param source_class: The class of the source events, in case there
+            are no source events to inspect. defaults to ActionNetworkEvent
+        :type source_class: class, optional
         :param verbose: Whether to print detailed information about the
             calculated changes. defaults to False
         :type verbose: boolean, optional
+        :param partial_source: Whether the source events are only a subset of
+            the source system's events (such as those modified since the last
+            sync). If so, events that only exist at the destination are
+            expected and are not reported. defaults to False
+        :type partial_source: boolean, optional
+        :param use_fingerprints: Whether destination events store the
+            fingerprint of the source event they were synced from. If so,
+            source events whose fingerprint matches are skipped without being
+            compared field by field, and every added or updated event records
+            its new fingerprint. The destination class'
+            FINGERPRINT_ONLY_FIELD_NAMES are not expected to have been read,
+            and are only reported as changed if their own fingerprints
+            differ. defaults to False
+        :type use_fingerprints: boolean, optional
+        :param window_start: start of the sync window, if only events
+            starting since then (or later) are synced. Source events that
+            started before the window are ignored, and destination events
+            that did are never reported as missing from the source. defaults
+            to None (no window)
+        :type window_start: datetime, optional
         """
         self.verbose = verbose
+        self.partial_source = partial_source
+        self.use_fingerprints = use_fingerprints
+        self.window_start = window_start
 
         self.events_from_source = events_from_source
-        self.source_class = self._event_class(events_from_source)
+        self.streaming = not isinstance(events_from_source, Sequence)
+        if events_from_source and not self.streaming:
+            self.source_class = self._event_class(events_from_source)
+        else:
+            self.source_class = source_class
 
         self.events_at_destination = events_at_destination
         if events_at_destination:
@@ -463,28 +658,61 @@ class EventDiffer():
             if getattr(e, self.common_id_name) is not None
         }
 
+    def _in_window(self, event):
+        if self.window_start is None:
+            return True
+        start = event.start
+        return start is None or start >= self.window_start
+
     def match_events(self):
         """Match up events across the source and destination systems and
         store in instance variables.
 
         Must be run before accessing the change sets (events_to_add, etc).
+        If the source has more than one copy of an event, the last copy
+        replaces the others.
         """
-        source_events = self._events_by_common_id(self.events_from_source)
         dest_events = self._events_by_common_id(self.events_at_destination)
 
-        not_in_destination = []
-        present_in_both = []
-        for common_id, source_event in source_events.items():
+        not_in_destination = {}
+        present_in_both = {}
+        updates = {}
+        matched_dest_events = {}
+        for source_event in self.events_from_source:
+            common_id = getattr(source_event, self.common_id_name)
+            if common_id is None or not self._in_window(source_event):
+                continue
             if common_id in dest_events:
-                dest_event = dest_events.pop(common_id)
-                present_in_both.append([dest_event, source_event])
+                matched_dest_events[common_id] = dest_events.pop(common_id)
+            if common_id in matched_dest_events:
+                dest_event = matched_dest_events[common_id]
+                if self.streaming:
+                    # Only keep hold of the events that need to be written
+                    update = self._updated_event(dest_event, source_event)
+                    if update is not None:
+                        updates[common_id] = update
+                    else:
+                        updates.pop(common_id, None)
+                else:
+                    present_in_both[common_id] = [dest_event, source_event]
             else:
-                not_in_destination.append(source_event)
-
-        self.new_source_events = not_in_destination
-        self.matching_source_dest_event_pairs = present_in_both
+                not_in_destination[common_id] = source_event
+
+        self.source_count = len(not_in_destination) + len(matched_dest_events)
+        self.new_source_events = list(not_in_destination.values())
+        self.matching_source_dest_event_pairs = list(present_in_both.values())
+        self.precomputed_updates = list(updates.values())
+        # Keyed by common ID. Only meaningful when the source is complete, or
+        # when combined with the results for the rest of the source.
+        # Events outside the sync window were never fetched from the source.
+        dest_events = {
+            common_id: dest_event
+            for common_id, dest_event in dest_events.items()
+            if self._in_window(dest_event)
+        }
+        self.destination_only_events = dest_events
 
-        if list(dest_events.values()):
+        if list(dest_events.values()) and not self.partial_source:
             print(
                 "WARNING: Events exist at the destination but are not "
                 f"present in the source: {dest_events}"
@@ -496,22 +724,95 @@ class EventDiffer():
 
         :return: list of destination-type events
         """
-        return [
-            source_event.translate_to(self.destination_class)
-            for source_event in self.new_source_events
-        ]
+        events_to_add = []
+        for source_event in self.new_source_events:
+            event = source_event.translate_to(self.destination_class)
+            if self.use_fingerprints:
+                event.source_fingerprint = self._source_fingerprint(source_event)
+            events_to_add.append(event)
+        return events_to_add
 
     def events_to_update(self):
         """Events that exist in both the source and destination and can be
         updated in the destination to bring it into alignment with the source.
 
+        The names of the fields that changed for each event are stored in
+        changed_fields, and the destination events they were compared
+        against in previous_events, both keyed by the event's primary ID.
+
         :return: list of destination-type events
         """
-        events_to_update = []
+        updates = list(self.precomputed_updates)
         for dest_event, source_event in self.matching_source_dest_event_pairs:
-            event = source_event.translate_to(self.destination_class)
-            event.primary_id = dest_event.primary_id
-            if dest_event != event:
-                if self.verbose: dest_event.print_diff(event)
-                events_to_update.append(event)
-        return events_to_update
+            update = self._updated_event(dest_event, source_event)
+            if update is not None:
+                updates.append(update)
+
+        self.changed_fields = {
+            event.primary_id: changed_fields
+            for event, changed_fields, _ in updates
+        }
+        self.previous_events = {
+            event.primary_id: dest_event
+            for event, _, dest_event in updates
+        }
+        return [event for event, _, _ in updates]
+
+    def _updated_event(self, dest_event, source_event):
+        """Build the updated destination event for a matched pair of events.
+
+        :return: tuple of (updated destination event, names of changed
+            fields, the destination event), or None if the destination event
+            is already up to date
+        """
+        if self.use_fingerprints:
+            fingerprint = self._source_fingerprint(source_event)
+            # Unchanged since it was last synced
+            if dest_event.source_fingerprint == fingerprint:
+                return None
+
+        event = source_event.translate_to(self.destination_class)
+        event.primary_id = dest_event.primary_id
+        if self.use_fingerprints:
+            event.source_fingerprint = fingerprint
+        changed_fields = dest_event.changed_fields(event)
+        if self.use_fingerprints:
+            changed_fields = self._fingerprint_changed_fields(
+                changed_fields, dest_event.source_fingerprint, fingerprint
+            )
+        if not changed_fields:
+            return None
+        if self.verbose: dest_event.print_diff(event)
+        return event, changed_fields, dest_event
+
+    def _source_fingerprint(self, source_event):
+        """Get the fingerprint for a destination event to store of the source
+        event it is synced from.
+
+        :return: the source event's fingerprint, followed by the fingerprint
+            of each of the destination class' FINGERPRINT_ONLY_FIELD_NAMES
+        :rtype: str
+        """
+        fields = sorted(self.destination_class.FINGERPRINT_ONLY_FIELD_NAMES)
+        return ' '.join([
+            source_event.fingerprint(),
+            *(source_event.fingerprint([field]) for field in fields),
+        ])
+
+    def _fingerprint_changed_fields(self, changed_fields, old_fingerprint, new_fingerprint):
+        """Correct the changed fields of an event for the fields that were
+        not read, using their fingerprints; see _source_fingerprint.
+
+        :return: names of the changed fields
+        :rtype: set
+        """
+        fields = sorted(self.destination_class.FINGERPRINT_ONLY_FIELD_NAMES)
+        old_fingerprints = (old_fingerprint or '').split(' ')[1:]
+        new_fingerprints = new_fingerprint.split(' ')[1:]
+        return (changed_fields - set(fields)) | {
+            field for i, field in enumerate(fields)
+            # Fingerprints stored before a field was fingerprinted on its own
+            # can't tell whether it changed
+            if len(old_fingerprints) != len(fields)
+            or old_fingerprints[i] != new_fingerprints[i]
+        }
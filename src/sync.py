@@ -1,39 +1,187 @@
 import argparse
+import asyncio
+import inspect
 import json
 import os
+import time
 import urllib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
 from pprint import pprint
 
-import boto3
-
-from event_connectors.actionnetwork import ActionNetwork
+from event_connectors.actionnetwork import DEFAULT_MAX_WORKERS
+from event_connectors.actionnetwork import EventIndex
+from event_connectors.actionnetwork import GroupEventStream
+from event_connectors.actionnetwork import DEFAULT_PAGE_WORKERS
+from event_connectors.actionnetwork import fetch_group_events
 from event_connectors.airtable import Airtable
+from event_connectors.batch_writer import DEFAULT_WRITE_WORKERS
+from event_connectors.batch_writer import DEFAULT_REQUESTS_PER_SECOND
+from event_connectors.batch_writer import WriteReport
+from event_connectors.invokers import LambdaInvoker
+from event_connectors.invokers import LocalInvoker
+from event_connectors.metrics import DEFAULT_NAMESPACE
+from event_connectors.metrics import start_metrics
+from event_connectors.secrets import DEFAULT_SECRET_TTL
+from event_connectors.secrets import SecretCache
+from event_connectors.session import DEFAULT_CONNECT_TIMEOUT
+from event_connectors.session import DEFAULT_POOL_MAXSIZE
+from event_connectors.session import DEFAULT_READ_TIMEOUT
+from event_connectors.session import shared_session
 from event_models.events import EventDiffer
+from sync_state.checkpoints import Checkpoint
+from sync_state.plans import Plan
+from sync_state.snapshots import Snapshot
+from sync_state.stores import LocalFileStore
+from sync_state.watermarks import Watermarks
+from sync_state.watermarks import newest_modified
+
+SLACK_CHANNEL = os.environ.get('SLACK_CHANNEL')
+SLACK_FOOTER_URL = os.environ.get('SLACK_FOOTER_URL')
+SLACK_TOPIC_ARN = os.environ.get('SLACK_TOPIC_ARN')
+
+# Maximum number of ActionNetwork groups to fetch at the same time, how
+# long (in seconds) to wait for all of them before giving up on stragglers,
+# and how many pages of a single group to fetch at the same time
+ACTION_NETWORK_MAX_WORKERS = int(
+    os.environ.get('ACTION_NETWORK_MAX_WORKERS') or DEFAULT_MAX_WORKERS
+)
+ACTION_NETWORK_FETCH_TIMEOUT = float(
+    os.environ.get('ACTION_NETWORK_FETCH_TIMEOUT') or 0
+) or None
+ACTION_NETWORK_PAGE_WORKERS = int(
+    os.environ.get('ACTION_NETWORK_PAGE_WORKERS') or DEFAULT_PAGE_WORKERS
+)
+
+# Timeouts (in seconds) and connection pool size for ActionNetwork requests
+HTTP_CONNECT_TIMEOUT = float(
+    os.environ.get('HTTP_CONNECT_TIMEOUT') or DEFAULT_CONNECT_TIMEOUT
+)
+HTTP_READ_TIMEOUT = float(
+    os.environ.get('HTTP_READ_TIMEOUT') or DEFAULT_READ_TIMEOUT
+)
+HTTP_POOL_MAXSIZE = int(
+    os.environ.get('HTTP_POOL_MAXSIZE') or DEFAULT_POOL_MAXSIZE
+)
+
+# Whether to stream ActionNetwork events into the differ page by page,
+# rather than fetching every event before diffing
+STREAM_EVENTS = os.environ.get('STREAM_EVENTS', '').lower() in ('1', 'true')
+
+# Whether to make every request of a run on a single asyncio event loop,
+# through the aiohttp connectors, rather than on worker threads. Streaming
+# isn't supported by the async connectors, so STREAM_EVENTS is ignored.
+SYNC_ASYNC = os.environ.get('SYNC_ASYNC', '').lower() in ('1', 'true')
+
+# Directory to persist sync state in between runs. When set, runs only fetch
+# ActionNetwork events modified since the previous run, with a full sync every
+# FULL_SYNC_INTERVAL_HOURS.
+SYNC_STATE_DIR = os.environ.get('SYNC_STATE_DIR')
+FULL_SYNC_INTERVAL_HOURS = float(os.environ.get('FULL_SYNC_INTERVAL_HOURS') or 24)
+
+# Only sync events starting in the last SYNC_WINDOW_DAYS days (or later), on
+# both the ActionNetwork and Airtable sides, so that past events that will
+# never change again aren't fetched or compared on every run. 0, the default,
+# syncs every event.
+SYNC_WINDOW_DAYS = int(os.environ.get('SYNC_WINDOW_DAYS') or 0)
 
-SLACK_CHANNEL = os.environ['SLACK_CHANNEL']
-SLACK_FOOTER_URL = os.environ['SLACK_FOOTER_URL']
-SLACK_TOPIC_ARN = os.environ['SLACK_TOPIC_ARN']
+# Whether to keep a snapshot of the last synced state of each event in
+# SYNC_STATE_DIR. Incremental runs then only upsert the events that changed
+# since the snapshot, and only read the Airtable rows modified since it, so
+# that rows edited in Airtable are still put back.
+SYNC_SNAPSHOT = os.environ.get('SYNC_SNAPSHOT', '').lower() in ('1', 'true')
 
-# AWS Clients
-SECRETSMANAGER = boto3.client('secretsmanager')
-SNS = boto3.client('sns')
+# Whether to checkpoint each run's progress in SYNC_STATE_DIR: every page of
+# events fetched, and every batch written to Airtable. A run that is cut short
+# (such as by the Lambda timeout) is then picked up where it left off by the
+# next run, as long as it started less than CHECKPOINT_MAX_AGE_HOURS ago.
+SYNC_CHECKPOINTS = os.environ.get('SYNC_CHECKPOINTS', '').lower() in ('1', 'true')
+CHECKPOINT_MAX_AGE_HOURS = float(os.environ.get('CHECKPOINT_MAX_AGE_HOURS') or 6)
 
-ACTION_NETWORK_GROUP_KEY_MAP = os.environ.get('ACTION_NETWORK_GROUP_KEY_MAP')
-if not ACTION_NETWORK_GROUP_KEY_MAP:
-    secret_id = os.environ.get('ACTION_NETWORK_SECRET_ID')
-    raw_secret = SECRETSMANAGER.get_secret_value(SecretId=secret_id)
-    ACTION_NETWORK_GROUP_KEY_MAP = json.loads(raw_secret['SecretString'])
+# How changes are written to Airtable: 'batch' creates and updates events in
+# separate batches, 'upsert' writes them all as one stream matched on
+# actionnetwork_id. Upserts also let incremental runs skip reading Airtable.
+AIRTABLE_WRITE_MODE = os.environ.get('AIRTABLE_WRITE_MODE') or 'batch'
 
+# Request budget for writes to the Airtable base, and the most write
+# requests in flight at the same time
+AIRTABLE_REQUESTS_PER_SECOND = float(
+    os.environ.get('AIRTABLE_REQUESTS_PER_SECOND') or DEFAULT_REQUESTS_PER_SECOND
+)
+AIRTABLE_WRITE_WORKERS = int(
+    os.environ.get('AIRTABLE_WRITE_WORKERS') or DEFAULT_WRITE_WORKERS
+)
+
+# Whether the Airtable table has a source_fingerprint column, used to skip
+# comparing events that haven't changed since they were last synced
+AIRTABLE_FINGERPRINTS = os.environ.get('AIRTABLE_FINGERPRINTS', '').lower() in ('1', 'true')
+
+# Number of shards to split the ActionNetwork groups into. With more than one,
+# the handler coordinates the sync: it invokes SYNC_FUNCTION_NAME once per
+# shard to sync that shard's groups, and combines the results. Outside of
+# Lambda, shards are synced one after another in this process instead.
+SYNC_SHARDS = int(os.environ.get('SYNC_SHARDS') or 1)
+SYNC_FUNCTION_NAME = (
+    os.environ.get('SYNC_FUNCTION_NAME') or
+    os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+)
+
+# CloudWatch namespace for the metrics printed at the end of each run
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE') or DEFAULT_NAMESPACE
+
+# Credentials given in the environment are used as they are. Otherwise they
+# are read from Secrets Manager when the handler first runs, rather than on
+# import, and reused by warm invocations for SECRET_TTL_SECONDS.
+ACTION_NETWORK_GROUP_KEY_MAP = json.loads(
+    os.environ.get('ACTION_NETWORK_GROUP_KEY_MAP') or 'null'
+)
+ACTION_NETWORK_SECRET_ID = os.environ.get('ACTION_NETWORK_SECRET_ID')
 AIRTABLE_PERSONAL_ACCESS_TOKEN = os.environ.get('AIRTABLE_PERSONAL_ACCESS_TOKEN')
 AIRTABLE_BASE_ID = os.environ.get('AIRTABLE_BASE_ID')
-if not AIRTABLE_PERSONAL_ACCESS_TOKEN and not AIRTABLE_BASE_ID:
-    secret_id = os.environ['AIRTABLE_SECRET_ID']
-    raw_secret = SECRETSMANAGER.get_secret_value(SecretId=secret_id)
-    secret = json.loads(raw_secret['SecretString'])
-    AIRTABLE_PERSONAL_ACCESS_TOKEN = secret['personal_access_token']
-    AIRTABLE_BASE_ID = secret['base_id']
+AIRTABLE_SECRET_ID = os.environ.get('AIRTABLE_SECRET_ID')
+SECRET_TTL_SECONDS = float(
+    os.environ.get('SECRET_TTL_SECONDS') or DEFAULT_SECRET_TTL
+)
+
+SECRETS = SecretCache(ttl=SECRET_TTL_SECONDS)
+
+
+def credentials(actionnetwork=True):
+    """Get the ActionNetwork API keys and Airtable credentials.
+
+    Any that aren't set in the environment are fetched from Secrets Manager,
+    all in one call.
+
+    :param actionnetwork: whether the ActionNetwork API keys are needed.
+        If not, they are returned as None. defaults to True
+    :type actionnetwork: bool, optional
+    :return: tuple of (API keys keyed by group name, Airtable personal access
+        token, Airtable base ID)
+    :rtype: tuple[dict, str, str]
+    """
+    group_key_map = ACTION_NETWORK_GROUP_KEY_MAP
+    airtable_token = AIRTABLE_PERSONAL_ACCESS_TOKEN
+    airtable_base_id = AIRTABLE_BASE_ID
+
+    secret_ids = []
+    if not group_key_map and actionnetwork:
+        secret_ids.append(ACTION_NETWORK_SECRET_ID)
+    if not airtable_token and not airtable_base_id:
+        secret_ids.append(AIRTABLE_SECRET_ID)
+    if not secret_ids:
+        return group_key_map, airtable_token, airtable_base_id
+
+    secrets = SECRETS.get(*secret_ids)
+    if not group_key_map and actionnetwork:
+        group_key_map = secrets[ACTION_NETWORK_SECRET_ID]
+    if not airtable_token and not airtable_base_id:
+        airtable_secret = secrets[AIRTABLE_SECRET_ID]
+        airtable_token = airtable_secret['personal_access_token']
+        airtable_base_id = airtable_secret['base_id']
+    return group_key_map, airtable_token, airtable_base_id
 
 def event_time(time):
     try:
@@ -134,56 +282,771 @@ def slack_message(results, channel=None, user=None):
     return message
 
 
+async def connector_call(method, *args, **kwargs):
+    """Call a connector method from the event loop: async connectors' methods
+    are awaited, and blocking connectors' methods run on a worker thread.
+    """
+    if inspect.iscoroutinefunction(method):
+        return await method(*args, **kwargs)
+    return await asyncio.to_thread(method, *args, **kwargs)
+
+
+async def read_airtable(airtable, metrics, **kwargs):
+    with metrics.timed('airtable_read'):
+        return await connector_call(airtable.events, **kwargs)
+
+
+def track_modified(group_events, modified_by_group):
+    """Pass through the events from a GroupEventStream, keeping track of the
+    newest modification time seen for each group.
+
+    :param group_events: (group name, event) pairs
+    :param modified_by_group: dict to record the newest modification time
+        for each group in, as a single-item list
+    :return: generator of events
+    """
+    for group, event in group_events:
+        modified_by_group[group] = [
+            newest_modified([*modified_by_group.get(group, []), event.updated_at])
+        ]
+        yield event
+
+
+def shard_groups(group_key_map, shard_count):
+    """Split groups into shards of roughly the same number of groups.
+
+    Groups are dealt out in name order, so the same groups always end up in
+    the same shards as long as the groups and shard count don't change.
+
+    :param group_key_map: mapping of group names to ActionNetwork API keys.
+        Groups without a key are left out.
+    :param shard_count: most shards to split the groups into
+    :return: lists of group names, one per (non-empty) shard
+    :rtype: list[list[str]]
+    """
+    groups = sorted(group for group, api_key in group_key_map.items() if api_key)
+    shards = [groups[i::shard_count] for i in range(shard_count)]
+    return [shard for shard in shards if shard]
+
+
+def coordinate(event, shard_count, invoker):
+    """Sync each shard of groups in its own invocation, then combine the
+    results.
+
+    Each shard syncs its own groups and writes their events to Airtable.
+    Events that only exist in Airtable can't be told apart by any one shard,
+    so they are found here: they are the events no shard found a source
+    event for.
+
+    :param event: the event the handler was invoked with, passed on to every
+        shard
+    :param shard_count: most shards to split the groups into
+    :param invoker: invokes the handler for a shard, such as LambdaInvoker
+    :raises RuntimeError: if any shard failed
+    :return: summary of the sync
+    :rtype: dict
+    """
+    group_key_map, _, _ = credentials()
+    shards = shard_groups(group_key_map, shard_count)
+    print(f"Syncing {len(shards)} shards of ActionNetwork groups")
+
+    metrics = start_metrics(
+        namespace=METRICS_NAMESPACE,
+        dimensions={'Service': 'sync-coordinator'},
+    )
+    handler_start = time.perf_counter()
+
+    payloads = [
+        {
+            **{key: value for key, value in event.items() if key != 'shards'},
+            'shard': {'index': index, 'count': len(shards), 'groups': groups},
+        }
+        for index, groups in enumerate(shards)
+    ]
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(shards)), thread_name_prefix='shard') as executor:
+        futures = {
+            executor.submit(invoker.invoke, payload): payload['shard']['index']
+            for payload in payloads
+        }
+        for future, index in futures.items():
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                print(f"WARNING: Shard {index} failed: {e!r}")
+                errors[index] = e
+
+    # Only complete syncs of every group say which events are missing from
+    # ActionNetwork
+    destination_only_ids = None
+    if not errors and all(
+        result['destination_only_ids'] is not None and not result['failed_groups']
+        for result in results.values()
+    ):
+        destination_only_ids = set.intersection(*(
+            set(result['destination_only_ids']) for result in results.values()
+        )) if results else set()
+        if destination_only_ids:
+            print(
+                "WARNING: Events exist at the destination but are not "
+                f"present in the source: {sorted(destination_only_ids)}"
+            )
+        metrics.add('destination_only_events', len(destination_only_ids))
+
+    metrics.add('shards', len(shards))
+    metrics.add('failed_shards', len(errors))
+    for name in ('source_events', 'new_events', 'changed_events', 'removed_events', 'written_events'):
+        metrics.add(name, sum(result[name] for result in results.values()))
+    metrics.add('total_seconds', time.perf_counter() - handler_start, unit='Seconds')
+    metrics.emit()
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(shards)} shards failed: {errors}")
+
+    return {
+        'shards': [results[index] for index in sorted(results)],
+        'destination_only_ids': (
+            sorted(destination_only_ids)
+            if destination_only_ids is not None else None
+        ),
+    }
+
+
 def handler(event, *_):
+    return asyncio.run(handler_async(event))
+
+
+async def handler_async(event):
+    """Sync ActionNetwork events to Airtable, on the running event loop.
+
+    With async connectors (the 'async' option, or SYNC_ASYNC), every request
+    of the run is made on the loop through one shared aiohttp session, which
+    is closed once the run is done. Otherwise the blocking connectors make
+    their requests on worker threads.
+    """
     # Log Event
     print(f'EVENT {json.dumps(event)}')
 
-    # Get args from event
     event = event or {}
-    channel = event.get('channel') or SLACK_CHANNEL
-    dryrun = event.get('dryrun') or False
-    user = event.get('user')
-    verbose = event.get('verbose') or False
-
-    actionnetwork_events = []
-    for actionnetwork_group, actionnetwork_key in ACTION_NETWORK_GROUP_KEY_MAP.items():
-        if not actionnetwork_key: continue  # Skip any keys that have not yet been populated
-
-        print(f"Fetching ActionNetwork events for: {actionnetwork_group}")
-        actionnetwork = ActionNetwork(actionnetwork_key)
-        actionnetwork_events.extend(actionnetwork.events())
-
-    airtable = Airtable(AIRTABLE_PERSONAL_ACCESS_TOKEN, AIRTABLE_BASE_ID)
-    airtable_events = airtable.events()
-
-    differ = EventDiffer(
-        events_from_source=actionnetwork_events,
-        events_at_destination=airtable_events,
-        verbose=verbose
-    )
-    differ.match_events()
+    if not (event.get('async') or SYNC_ASYNC):
+        return await _sync(event)
+
+    # Only imported when used, so that aiohttp is only needed by async runs
+    from event_connectors.async_http import client_session
+    async with client_session(
+        timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+    ) as session:
+        return await _sync(event, session)
+
+
+class SyncRun:
+    """Options and results of a single sync run, handed from one stage of
+    _sync to the next.
+
+    Creating a run resolves its options from the handler event and the
+    environment, and loads its sync state from SYNC_STATE_DIR, so it blocks
+    on file reads.
+
+    :ivar airtable_events: events read from Airtable, if it was read
+    :ivar new_events: events to add to Airtable
+    :ivar changed_events: events to update in Airtable
+    :ivar removed_events: events to mark removed in Airtable
+    :ivar changed_fields: fields to write for each updated record, or None
+        to write every field
+    :ivar source_count: number of events fetched from ActionNetwork
+    :ivar failed_groups: errors of the groups that couldn't be fetched, by
+        group name
+    :ivar modified_by_group: modification times of the fetched events, by
+        group name
+    :ivar destination_only_ids: actionnetwork_ids of the events that are
+        only in Airtable, or None if that isn't known
+    :ivar report: outcome of the writes to Airtable
+    """
+
+    def __init__(self, event, async_session=None):
+        """
+        :param event: the event the handler was invoked with
+        :param async_session: aiohttp session for the async connectors, or
+            None to use the blocking connectors
+        """
+        self.async_session = async_session
+        self.dryrun = event.get('dryrun') or False
+        self.verbose = event.get('verbose') or False
+        self.max_workers = event.get('max_workers') or ACTION_NETWORK_MAX_WORKERS
+        self.page_workers = event.get('page_workers') or ACTION_NETWORK_PAGE_WORKERS
+        self.write_mode = event.get('write_mode') or AIRTABLE_WRITE_MODE
+        self.stream = (event.get('stream') or STREAM_EVENTS) and async_session is None
+        self.window_days = event.get('window_days', SYNC_WINDOW_DAYS)
+        # Saving a plan to apply later never writes to Airtable
+        self.plan_path = event.get('plan')
+        if self.plan_path:
+            self.dryrun = True
+
+        self.group_key_map, airtable_token, self.airtable_base_id = credentials()
+
+        # Shards only sync their own groups, and keep their own sync state
+        self.shard = event.get('shard')
+        state_key_suffix = ''
+        if self.shard is not None:
+            self.group_key_map = {
+                group: api_key for group, api_key in self.group_key_map.items()
+                if group in self.shard['groups']
+            }
+            state_key_suffix = f"-shard-{self.shard['index']}-of-{self.shard['count']}"
+            # An event co-sponsored by groups in different shards is new to
+            # each of them, so every shard upserts it on actionnetwork_id
+            # rather than creating its own row
+            self.write_mode = 'upsert'
+            print(
+                f"Syncing shard {self.shard['index']} of {self.shard['count']}: "
+                f"{self.shard['groups']}"
+            )
+
+        self.watermarks = None
+        if SYNC_STATE_DIR:
+            self.watermarks = Watermarks(
+                LocalFileStore(SYNC_STATE_DIR),
+                full_sync_interval=timedelta(hours=FULL_SYNC_INTERVAL_HOURS),
+                key=Watermarks.KEY + state_key_suffix,
+            )
+        self.full_sync = (
+            self.watermarks is None or
+            event.get('full_sync') or
+            self.watermarks.full_sync_due()
+        )
+
+        self.snapshot = None
+        if SYNC_STATE_DIR and SYNC_SNAPSHOT:
+            self.snapshot = Snapshot(
+                LocalFileStore(SYNC_STATE_DIR, compress=True),
+                key=Snapshot.KEY + state_key_suffix,
+            )
+            if self.full_sync:
+                # Rebuild the snapshot from scratch along with everything else
+                self.snapshot.clear()
+            else:
+                self.write_mode = 'upsert'
+
+        if self.full_sync:
+            self.since_by_group = {}
+            print("Fetching all ActionNetwork events")
+        else:
+            self.since_by_group = self.watermarks.since_by_group(self.group_key_map)
+            print("Fetching ActionNetwork events modified since the last sync")
+
+        self.window_start = None
+        self.window_kwargs = {}
+        if self.window_days:
+            self.window_start = datetime.now(timezone.utc) - timedelta(days=self.window_days)
+            # ActionNetwork start times have no time zone, so allow a day either
+            # way. The differ drops any extra events by their actual start.
+            self.window_kwargs['min_start_time'] = (
+                self.window_start - timedelta(days=1)
+            ).strftime('%Y-%m-%dT%H:%M:%SZ')
+            print(f"Only syncing events starting in the last {self.window_days} days or later")
+
+        self.checkpoint = None
+        if SYNC_STATE_DIR and SYNC_CHECKPOINTS and not self.dryrun:
+            # Only resumed by a run that would fetch the same events
+            self.checkpoint = Checkpoint(
+                LocalFileStore(SYNC_STATE_DIR, compress=True),
+                key=Checkpoint.KEY + state_key_suffix,
+                run={
+                    'groups': sorted(self.group_key_map),
+                    'full_sync': bool(self.full_sync),
+                    'since_by_group': self.since_by_group,
+                    'window_days': self.window_days,
+                    'write_mode': self.write_mode,
+                },
+                max_age=timedelta(hours=CHECKPOINT_MAX_AGE_HOURS),
+            )
+        self.resumed_plan = self.checkpoint.plan() if self.checkpoint is not None else None
+
+        if async_session is not None:
+            from event_connectors.async_airtable import AsyncAirtable
+            self.airtable = AsyncAirtable(
+                airtable_token,
+                self.airtable_base_id,
+                async_session,
+                requests_per_second=AIRTABLE_REQUESTS_PER_SECOND,
+                write_workers=AIRTABLE_WRITE_WORKERS,
+            )
+        else:
+            self.airtable = Airtable(
+                airtable_token,
+                self.airtable_base_id,
+                requests_per_second=AIRTABLE_REQUESTS_PER_SECOND,
+                write_workers=AIRTABLE_WRITE_WORKERS,
+            )
 
-    new_events = differ.events_to_add()
+        # Set by _fetch_source
+        self.index = None
+        self.group_events = None
 
-    updated_events = differ.events_to_update()
-    changed_events = [e for e in updated_events if not e.removed]
-    removed_events = [e for e in updated_events if e.removed]
+        self.airtable_events = []
+        self.new_events = []
+        self.changed_events = []
+        self.removed_events = []
+        self.changed_fields = None
+        self.source_count = 0
+        self.failed_groups = {}
+        self.modified_by_group = {}
+        self.destination_only_ids = None
+        self.report = WriteReport()
 
-    if verbose:
+    def resume(self):
+        """Pick up the changes planned by an earlier run that was cut short
+        after diffing, in place of fetching and diffing again."""
+        print("Resuming the writes planned by an earlier run")
+        changeset = Plan.from_document(self.resumed_plan['changes'])
+        self.new_events = changeset.new_events
+        self.changed_events = [e for e, _, _ in changeset.changed_events]
+        self.removed_events = [e for e, _, _ in changeset.removed_events]
+        # Planned updates only hold their changed fields already
+        self.changed_fields = None
+        self.source_count = self.resumed_plan['source_count']
+        self.failed_groups = self.resumed_plan['failed_groups']
+        self.modified_by_group = self.resumed_plan['modified_by_group']
+        self.destination_only_ids = self.resumed_plan['destination_only_ids']
+
+
+def _read_destination(run, metrics):
+    """Start reading Airtable in the background, while ActionNetwork is
+    fetched.
+
+    :return: task that results in the Airtable events, or None if Airtable
+        doesn't need to be read
+    """
+    if run.full_sync or run.write_mode != 'upsert':
+        return asyncio.create_task(read_airtable(
+            run.airtable, metrics,
+            min_start_time=run.window_start,
+            fingerprints=AIRTABLE_FINGERPRINTS,
+        ))
+    modified_since = run.snapshot.modified_since() if run.snapshot is not None else None
+    if modified_since is not None:
+        # Rows modified after the snapshot may have been edited by hand, and
+        # are compared against the snapshot's fingerprints
+        return asyncio.create_task(read_airtable(
+            run.airtable, metrics,
+            min_start_time=run.window_start,
+            fingerprints=AIRTABLE_FINGERPRINTS,
+            modified_since=modified_since,
+        ))
+    # Every modified event will be upserted, matched on actionnetwork_id, so
+    # there is no need to know which ones already exist
+    print("Skipping Airtable read for incremental upsert")
+    return None
+
+
+async def _fetch_source(run, metrics):
+    """Fetch the events of every group from ActionNetwork.
+
+    :return: the fetched events. When streaming, an iterator of the events
+        instead, which are only all fetched once it has been consumed.
+    """
+    if run.async_session is None:
+        # The session is cached, so connections are reused by warm
+        # invocations
+        session = shared_session(
+            timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+            pool_maxsize=HTTP_POOL_MAXSIZE,
+        )
+    if run.stream:
+        # Pages are fetched in the background until the queue is full, then
+        # consumed by the differ once the Airtable read is done. The fetch
+        # time is therefore counted as part of the diff.
+        run.group_events = GroupEventStream(
+            run.group_key_map,
+            max_workers=run.max_workers,
+            session=session,
+            since_by_group=run.since_by_group,
+            checkpoint=run.checkpoint,
+            **run.window_kwargs,
+        )
+        run.group_events.start()
+        # Co-sponsored events come through once per group
+        run.index = EventIndex()
+        actionnetwork_events = track_modified(
+            run.index.iter_newest(run.group_events), run.modified_by_group
+        )
+    else:
+        with metrics.timed('actionnetwork_fetch'):
+            if run.async_session is not None:
+                from event_connectors import async_actionnetwork
+                events_by_group, run.failed_groups = await async_actionnetwork.fetch_group_events(
+                    run.group_key_map,
+                    run.async_session,
+                    max_workers=run.max_workers,
+                    timeout=ACTION_NETWORK_FETCH_TIMEOUT,
+                    since_by_group=run.since_by_group,
+                    checkpoint=run.checkpoint,
+                    page_workers=run.page_workers,
+                    **run.window_kwargs,
+                )
+            else:
+                events_by_group, run.failed_groups = await asyncio.to_thread(
+                    fetch_group_events,
+                    run.group_key_map,
+                    max_workers=run.max_workers,
+                    timeout=ACTION_NETWORK_FETCH_TIMEOUT,
+                    session=session,
+                    since_by_group=run.since_by_group,
+                    checkpoint=run.checkpoint,
+                    page_workers=run.page_workers,
+                    **run.window_kwargs,
+                )
+        # Co-sponsored events are fetched once per group. Groups are indexed
+        # in a fixed order, so events come out in the same order every time.
+        run.index = EventIndex()
+        for group, group_events in events_by_group.items():
+            run.index.add(group, group_events)
+        actionnetwork_events = run.index.events()
+        run.modified_by_group = {
+            group: [e.updated_at for e in group_events]
+            for group, group_events in events_by_group.items()
+        }
+    return actionnetwork_events
+
+
+def _diff(run, metrics, actionnetwork_events, airtable_read):
+    """Compare the ActionNetwork events against Airtable, and save the
+    changes as a plan or checkpoint if asked to.
+
+    Consuming a stream of events waits on its fetches, and plans and
+    checkpoints are saved to files, so this blocks.
+
+    :param actionnetwork_events: events from _fetch_source
+    :param airtable_read: whether run.airtable_events were read from Airtable
+    """
+    if run.snapshot is not None:
+        # Incremental runs only need the events that changed since the
+        # snapshot, or whose rows were edited since; full syncs record every
+        # event
+        tracked_events = run.snapshot.track(
+            actionnetwork_events,
+            only_changed=not run.full_sync,
+            edited_ids=run.snapshot.edited(run.airtable_events),
+        )
+        actionnetwork_events = tracked_events if run.stream else list(tracked_events)
+
+    with metrics.timed('diff'):
+        differ = EventDiffer(
+            events_from_source=actionnetwork_events,
+            events_at_destination=run.airtable_events,
+            verbose=run.verbose,
+            # Each shard only has some of the groups' events
+            partial_source=not run.full_sync or run.shard is not None,
+            use_fingerprints=AIRTABLE_FINGERPRINTS,
+            window_start=run.window_start,
+        )
+        differ.match_events()
+
+        run.new_events = differ.events_to_add()
+
+        updated_events = differ.events_to_update()
+        run.changed_events = [e for e in updated_events if not e.removed]
+        run.removed_events = [e for e in updated_events if e.removed]
+
+    if run.stream:
+        run.failed_groups = run.group_events.errors_by_group
+
+    duplicates_by_group = run.index.duplicates_by_group
+    for group, duplicates in duplicates_by_group.items():
+        metrics.add('duplicate_events', duplicates, group=group)
+    metrics.add('duplicate_events', sum(duplicates_by_group.values()))
+    if duplicates_by_group:
+        print(
+            f"Skipped {sum(duplicates_by_group.values())} duplicate "
+            f"events: {dict(duplicates_by_group)}"
+        )
+
+    if run.verbose and not run.stream:
         print(f"All events retrieved from ActionNetwork: {actionnetwork_events}")
-        print(f"New events: {new_events}")
-        print(f"Changed events: {changed_events}")
-        print(f"Removed events: {removed_events}")
 
-    print(f"{len(actionnetwork_events)} events retrieved from ActionNetwork")
-    print(f"{len(new_events)} new events")
-    print(f"{len(changed_events)} changed events")
-    print(f"{len(removed_events)} Removed events")
+    run.source_count = differ.source_count
+    run.changed_fields = differ.changed_fields
+    # Only known when every event was fetched and compared against all of
+    # Airtable
+    run.destination_only_ids = (
+        sorted(differ.destination_only_events)
+        if run.full_sync and airtable_read else None
+    )
+
+    if run.checkpoint is not None or run.plan_path:
+        changeset = Plan.from_differ(
+            differ, run.new_events, run.changed_events, run.removed_events,
+            base_id=run.airtable_base_id,
+        )
+    if run.plan_path:
+        changeset.save(run.plan_path)
+        print(f"Saved a plan of {len(changeset)} changes to {run.plan_path}")
+    if run.checkpoint is not None:
+        run.checkpoint.save_plan({
+            'changes': changeset.to_document(),
+            'source_count': run.source_count,
+            'failed_groups': {
+                group: repr(error) for group, error in run.failed_groups.items()
+            },
+            'modified_by_group': {
+                group: [newest_modified(modified_times)]
+                for group, modified_times in run.modified_by_group.items()
+            },
+            'destination_only_ids': run.destination_only_ids,
+        })
+
+
+async def _write(run, metrics):
+    """Write the changes to Airtable, other than those an earlier attempt at
+    the same run already wrote."""
+    on_written = None
+    written = set()
+    if run.checkpoint is not None:
+        on_written = run.checkpoint.save_written
+        written = await asyncio.to_thread(run.checkpoint.written)
+        if written:
+            print(f"Skipping {len(written)} records written by an earlier run")
+
+    def unwritten(events):
+        return [
+            e for e in events
+            if e.airtable_id not in written and e.actionnetwork_id not in written
+        ]
+
+    with metrics.timed('airtable_write'):
+        if run.write_mode == 'upsert':
+            run.report.extend(await connector_call(
+                run.airtable.upsert_events,
+                unwritten(run.new_events + run.changed_events + run.removed_events),
+                changed_fields=run.changed_fields,
+                on_written=on_written,
+            ))
+        else:
+            run.report.extend(await connector_call(
+                run.airtable.add_events,
+                unwritten(run.new_events),
+                on_written=on_written,
+            ))
+            # Cancelled events are marked removed in Airtable by updating them
+            run.report.extend(await connector_call(
+                run.airtable.update_events,
+                unwritten(run.changed_events + run.removed_events),
+                changed_fields=run.changed_fields,
+                on_written=on_written,
+            ))
+
+    print(f"{len(run.report.succeeded)} events written to Airtable")
+
+    if run.checkpoint is not None:
+        # The run has gone as far as it can. Failed writes are retried by the
+        # next run from scratch, rather than resumed forever.
+        await asyncio.to_thread(run.checkpoint.clear)
+
+    # A resumed run didn't track any events, and leaves the snapshot as it
+    # was; the events it wrote are just upserted again next time
+    if run.snapshot is not None and run.resumed_plan is None:
+        await asyncio.to_thread(
+            run.snapshot.commit, run.report, destination_events=run.airtable_events
+        )
+
+
+async def _finalize(run, metrics, handler_start):
+    """Emit the run's metrics and advance the watermarks past the events it
+    synced.
+
+    :raises RuntimeError: if any events failed to write to Airtable
+    :return: summary of the sync
+    :rtype: dict
+    """
+    metrics.add('source_events', run.source_count)
+    metrics.add('new_events', len(run.new_events))
+    metrics.add('changed_events', len(run.changed_events))
+    metrics.add('removed_events', len(run.removed_events))
+    metrics.add('failed_groups', len(run.failed_groups))
+    if not run.dryrun:
+        metrics.add('written_events', len(run.report.succeeded))
+        metrics.add('failed_writes', len(run.report.failed))
+    if run.resumed_plan is not None:
+        metrics.add('resumed_runs')
+    metrics.add('total_seconds', time.perf_counter() - handler_start, unit='Seconds')
+    metrics.emit()
+
+    if not run.dryrun:
+        if run.report.failed:
+            # Fail the invocation (and leave the watermarks where they are)
+            # so the failures are retried and show up in the alarm
+            raise RuntimeError(
+                f"{len(run.report.failed)} events failed to write to Airtable: "
+                f"{sorted({error for _, error in run.report.failed})}"
+            )
 
-    if not dryrun:
-        airtable.add_events(new_events)
-        # Cancelled events are marked removed in Airtable by updating them
-        airtable.update_events(changed_events + removed_events)
+        if run.watermarks is not None:
+            # Groups that failed haven't been fully synced, so keep the next
+            # full sync due
+            await asyncio.to_thread(
+                run.watermarks.advance,
+                {
+                    group: modified_times
+                    for group, modified_times in run.modified_by_group.items()
+                    # Failed groups may have been partly fetched, and their
+                    # pages aren't ordered by modification time
+                    if group not in run.failed_groups
+                },
+                full_sync=run.full_sync and not run.failed_groups,
+            )
+
+    return {
+        'groups': list(run.group_key_map),
+        'failed_groups': list(run.failed_groups),
+        'source_events': run.source_count,
+        'new_events': len(run.new_events),
+        'changed_events': len(run.changed_events),
+        'removed_events': len(run.removed_events),
+        'written_events': 0 if run.dryrun else len(run.report.succeeded),
+        'destination_only_ids': run.destination_only_ids,
+    }
+
+
+async def _sync(event, async_session=None):
+    """Run a sync for handler_async, one stage at a time.
+
+    Stages that block, such as loading and saving sync state, and consuming
+    a stream of ActionNetwork events, run on worker threads so that the
+    event loop carries on with the async connectors' requests.
+
+    :param event: the event the handler was invoked with
+    :param async_session: aiohttp session for the async connectors, or None
+        to use the blocking connectors
+    """
+    shard_count = event.get('shards') or SYNC_SHARDS
+    # Plans cover every group, so they are computed in a single process
+    if event.get('shard') is None and shard_count > 1 and not event.get('plan'):
+        if SYNC_FUNCTION_NAME:
+            invoker = LambdaInvoker(SYNC_FUNCTION_NAME)
+        else:
+            invoker = LocalInvoker(handler)
+        return await asyncio.to_thread(coordinate, event, shard_count, invoker)
+
+    # Wall time per stage, HTTP calls and event counts for this run. The
+    # Airtable read and ActionNetwork fetch overlap, so their times can add
+    # up to more than the total
+    metrics = start_metrics(
+        namespace=METRICS_NAMESPACE,
+        dimensions={'Service': 'sync'},
+    )
+    handler_start = time.perf_counter()
+
+    run = await asyncio.to_thread(SyncRun, event, async_session)
+
+    if run.resumed_plan is None:
+        airtable_task = _read_destination(run, metrics)
+        actionnetwork_events = await _fetch_source(run, metrics)
+        with metrics.timed('airtable_wait'):
+            run.airtable_events = await airtable_task if airtable_task else []
+        await asyncio.to_thread(
+            _diff, run, metrics, actionnetwork_events, airtable_task is not None
+        )
+    else:
+        run.resume()
+
+    if run.verbose:
+        print(f"New events: {run.new_events}")
+        print(f"Changed events: {run.changed_events}")
+        print(f"Removed events: {run.removed_events}")
+
+    print(f"{run.source_count} events retrieved from ActionNetwork")
+    print(f"{len(run.new_events)} new events")
+    print(f"{len(run.changed_events)} changed events")
+    print(f"{len(run.removed_events)} Removed events")
+    if run.failed_groups:
+        print(f"{len(run.failed_groups)} groups failed: {list(run.failed_groups)}")
+
+    if not run.dryrun:
+        await _write(run, metrics)
+
+    return await _finalize(run, metrics, handler_start)
+
+
+def apply_plan(path, requests_per_second=None):
+    """Apply a plan saved by an earlier run (see the handler's 'plan'
+    option), without fetching from ActionNetwork or reading all of Airtable.
+
+    Only the rows the plan touches are read again, and changes to rows that
+    were created or edited since the plan was computed are left out; see
+    Plan.check.
+
+    :param path: the plan file
+    :type path: str
+    :param requests_per_second: request budget for the writes, to apply a
+        large plan slowly. defaults to AIRTABLE_REQUESTS_PER_SECOND
+    :type requests_per_second: float, optional
+    :raises RuntimeError: if the plan is for another Airtable base, or any
+        write failed
+    :return: summary of the changes applied
+    :rtype: dict
+    """
+    changeset = Plan.load(path)
+    _, airtable_token, airtable_base_id = credentials(actionnetwork=False)
+    if changeset.base_id and changeset.base_id != airtable_base_id:
+        raise RuntimeError(
+            f"{path} is a plan for Airtable base {changeset.base_id}, "
+            f"not {airtable_base_id}"
+        )
+    print(f"Applying {len(changeset)} changes planned at {changeset.created_at}")
+
+    metrics = start_metrics(
+        namespace=METRICS_NAMESPACE,
+        dimensions={'Service': 'apply-plan'},
+    )
+    handler_start = time.perf_counter()
+
+    airtable = Airtable(
+        airtable_token,
+        airtable_base_id,
+        requests_per_second=requests_per_second or AIRTABLE_REQUESTS_PER_SECOND,
+        write_workers=AIRTABLE_WRITE_WORKERS,
+    )
+    with metrics.timed('airtable_read'):
+        airtable_events = airtable.events_by_actionnetwork_id(
+            changeset.actionnetwork_ids()
+        )
+    changeset, skipped = changeset.check(airtable_events)
+    for actionnetwork_id, reason in skipped:
+        print(f"WARNING: Skipping planned change to {actionnetwork_id}: {reason}")
+
+    report = WriteReport()
+    with metrics.timed('airtable_write'):
+        report.extend(airtable.add_events(changeset.new_events))
+        # Planned updates only hold their changed fields
+        report.extend(airtable.update_events([
+            event for event, _, _ in changeset.changed_events + changeset.removed_events
+        ]))
+    print(f"{len(report.succeeded)} events written to Airtable")
+
+    metrics.add('new_events', len(changeset.new_events))
+    metrics.add('changed_events', len(changeset.changed_events))
+    metrics.add('removed_events', len(changeset.removed_events))
+    metrics.add('skipped_changes', len(skipped))
+    metrics.add('written_events', len(report.succeeded))
+    metrics.add('failed_writes', len(report.failed))
+    metrics.add('total_seconds', time.perf_counter() - handler_start, unit='Seconds')
+    metrics.emit()
+
+    if report.failed:
+        raise RuntimeError(
+            f"{len(report.failed)} events failed to write to Airtable: "
+            f"{sorted({error for _, error in report.failed})}"
+        )
+
+    return {
+        'new_events': len(changeset.new_events),
+        'changed_events': len(changeset.changed_events),
+        'removed_events': len(changeset.removed_events),
+        'skipped_changes': len(skipped),
+        'written_events': len(report.succeeded),
+    }
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -191,11 +1054,24 @@ if __name__ == '__main__':
                     description = 'Syncs events from ActionNetwork to Airtable')
     parser.add_argument('-s', '--sync', action='store_true')
     parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('-f', '--full-sync', action='store_true')
+    parser.add_argument('--shards', type=int, default=SYNC_SHARDS)
+    # Save the changes to a file instead of writing them, then apply that
+    # file (once reviewed) with --apply
+    parser.add_argument('--plan', metavar='FILE')
+    parser.add_argument('--apply', metavar='FILE')
+    parser.add_argument('--requests-per-second', type=float)
     args = parser.parse_args()
 
-    handler({
-        'dryrun': not args.sync,
-        'verbose': args.verbose,
-        'user': 'U7P1MU20P',
-        'channel': 'GB1SLKKL7',
-    })
+    if args.apply:
+        apply_plan(args.apply, requests_per_second=args.requests_per_second)
+    else:
+        handler({
+            'dryrun': not args.sync,
+            'verbose': args.verbose,
+            'full_sync': args.full_sync,
+            'shards': args.shards,
+            'plan': args.plan,
+            'user': 'U7P1MU20P',
+            'channel': 'GB1SLKKL7',
+        })
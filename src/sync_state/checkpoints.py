@@ -0,0 +1,216 @@
+import threading
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+# How long an unfinished run's checkpoint is resumed for. Older checkpoints
+# are discarded, as the events they hold are too stale to be worth writing.
+DEFAULT_MAX_AGE = timedelta(hours=6)
+
+
+class Checkpoint:
+    """Progress of a sync run, saved as it goes so that a run that is cut
+    short (such as by the Lambda timeout) can be resumed by the next one.
+
+    A run is checkpointed in two phases:
+
+    * fetching: each page of raw ActionNetwork events is saved as soon as it
+      is fetched, along with the link to the group's next page. Resuming
+      replays the saved pages and carries on from the next link, so neither
+      the pages nor the groups that were already fetched are requested
+      again.
+    * writing: once events have been diffed, the events to write are saved
+      as a plan, and the IDs of the records in each committed write batch
+      are added as the batches complete. Resuming writes whatever is left of
+      the plan, without fetching or diffing again.
+
+    A checkpoint only applies to a run with the same options (such as
+    whether it is a full sync); any other checkpoint is discarded when
+    loaded. Saving is thread-safe, as groups are fetched and batches written
+    on worker threads.
+    """
+
+    KEY = 'checkpoint'
+
+    def __init__(self, store, key=KEY, run=None, max_age=DEFAULT_MAX_AGE):
+        """Load the checkpoint saved in the given store, if it applies.
+
+        :param store: where the checkpoint is persisted between runs
+        :type store: StateStore
+        :param key: key the checkpoint is saved under; pages, the plan and
+            the written IDs are saved under keys starting with it. defaults
+            to KEY
+        :type key: str, optional
+        :param run: JSON-serializable options of the run being checkpointed.
+            A saved checkpoint is only resumed by a run with the same options.
+        :type run: dict, optional
+        :param max_age: age past which a saved checkpoint is discarded
+        :type max_age: timedelta, optional
+        """
+        self.store = store
+        self.key = key
+        self.run = run or {}
+        self._lock = threading.Lock()
+
+        manifest = store.load(key)
+        now = datetime.now(timezone.utc)
+        if manifest is not None and (
+            manifest['run'] != self.run or
+            now - datetime.fromisoformat(manifest['started_at']) > max_age
+        ):
+            print("Discarding checkpoint from a different or stale sync run")
+            self._delete(manifest)
+            manifest = None
+        if manifest is None:
+            manifest = {
+                'run': self.run,
+                'started_at': now.isoformat(),
+                'groups': {},
+                'planned': False,
+            }
+        elif manifest['groups'] or manifest['planned']:
+            print(f"Resuming sync run started at {manifest['started_at']}")
+        self.manifest = manifest
+        self._written = None
+
+    @property
+    def resumed(self):
+        """Whether any progress was loaded from a previous run."""
+        return bool(self.manifest['groups'] or self.manifest['planned'])
+
+    def _page_key(self, group_index, page_index):
+        return f'{self.key}-group-{group_index}-page-{page_index}'
+
+    def _group(self, group):
+        groups = self.manifest['groups']
+        if group not in groups:
+            groups[group] = {
+                # Group names can be anything, so pages are keyed by index
+                'index': len(groups),
+                'pages': 0,
+                'next_url': None,
+                'done': False,
+            }
+        return groups[group]
+
+    def group_progress(self, group):
+        """Get how far a group's events were fetched.
+
+        :param group: ActionNetwork group name
+        :return: tuple of (whether every page has been fetched, link to the
+            next page to fetch or None to start from the first page)
+        :rtype: tuple[bool, str]
+        """
+        with self._lock:
+            progress = self.manifest['groups'].get(group)
+        if progress is None:
+            return False, None
+        return progress['done'], progress['next_url']
+
+    def pages(self, group):
+        """Load the pages of raw events fetched for a group so far.
+
+        :return: generator of lists of raw event dicts, in page order
+        """
+        with self._lock:
+            progress = self.manifest['groups'].get(group)
+        if progress is None:
+            return
+        for page_index in range(progress['pages']):
+            yield self.store.load(self._page_key(progress['index'], page_index))
+
+    def save_page(self, group, raw_events, next_url):
+        """Save a page of raw events as fetched.
+
+        :param group: ActionNetwork group name
+        :param raw_events: the page's raw event dicts
+        :param next_url: link to the group's next page, or None if this was
+            the last page
+        """
+        with self._lock:
+            progress = self._group(group)
+            self.store.save(
+                self._page_key(progress['index'], progress['pages']),
+                raw_events,
+            )
+            progress['pages'] += 1
+            progress['next_url'] = next_url
+            progress['done'] = next_url is None
+            self.store.save(self.key, self.manifest)
+
+    def plan(self):
+        """Load the saved plan of writes, if the run got as far as diffing.
+
+        :return: the document given to save_plan, or None
+        """
+        if not self.manifest['planned']:
+            return None
+        return self.store.load(f'{self.key}-plan')
+
+    def save_plan(self, plan):
+        """Save what is to be written, once fetching and diffing are done.
+
+        Fetched pages aren't needed past this point, and are deleted.
+
+        :param plan: JSON-serializable description of the writes
+        :type plan: dict
+        """
+        with self._lock:
+            self.store.save(f'{self.key}-plan', plan)
+            self.store.save(f'{self.key}-written', [])
+            self._delete_pages(self.manifest)
+            self.manifest['groups'] = {}
+            self.manifest['planned'] = True
+            self._written = set()
+            self.store.save(self.key, self.manifest)
+
+    def written(self):
+        """Get the IDs of the records written so far.
+
+        :return: Airtable IDs and actionnetwork_ids of the written records
+        :rtype: set[str]
+        """
+        with self._lock:
+            if self._written is None:
+                self._written = set(self.store.load(f'{self.key}-written') or [])
+            return set(self._written)
+
+    def save_written(self, records):
+        """Record a committed write batch.
+
+        :param records: records returned by Airtable for the batch
+        :type records: list[dict]
+        """
+        ids = set()
+        for record in records:
+            ids.add(record['id'])
+            if record.get('fields', {}).get('actionnetwork_id'):
+                ids.add(record['fields']['actionnetwork_id'])
+        with self._lock:
+            if self._written is None:
+                self._written = set(self.store.load(f'{self.key}-written') or [])
+            self._written |= ids
+            self.store.save(f'{self.key}-written', sorted(self._written))
+
+    def _delete_pages(self, manifest):
+        for progress in manifest['groups'].values():
+            for page_index in range(progress['pages']):
+                self.store.delete(self._page_key(progress['index'], page_index))
+
+    def _delete(self, manifest):
+        self._delete_pages(manifest)
+        self.store.delete(f'{self.key}-plan')
+        self.store.delete(f'{self.key}-written')
+        self.store.delete(self.key)
+
+    def clear(self):
+        """Delete the checkpoint, once the run it tracks has finished."""
+        with self._lock:
+            self._delete(self.manifest)
+            self.manifest = {
+                'run': self.run,
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'groups': {},
+                'planned': False,
+            }
+            self._written = None
@@ -0,0 +1,218 @@
+import gzip
+import json
+import os
+from datetime import datetime
+from datetime import timezone
+
+from event_models.events import AirtableEvent
+
+
+class Plan:
+    """The changes a sync would make to Airtable, computed once so that they
+    can be reviewed, then applied later without fetching or diffing again.
+
+    Updates and removals only hold the fields that changed, along with their
+    values at the time of the diff and the row's Airtable modified time.
+    Before a plan is applied, the rows it touches are read again and any
+    change whose row has since been edited (or added, for new events) is
+    left out, rather than overwriting the edit with stale values.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        new_events=(),
+        changed_events=(),
+        removed_events=(),
+        base_id=None,
+        created_at=None,
+    ):
+        """
+        :param new_events: events to add, as they would be added
+        :type new_events: list[AirtableEvent]
+        :param changed_events: updates to existing rows, as (event with only
+            its changed fields, expected modified time, previous values of the
+            changed fields) tuples
+        :type changed_events: list[tuple]
+        :param removed_events: updates marking rows removed, like
+            changed_events
+        :type removed_events: list[tuple]
+        :param base_id: ID of the Airtable base the plan was computed against
+        :type base_id: str, optional
+        :param created_at: when the plan was computed, as an ISO timestamp.
+            defaults to now
+        :type created_at: str, optional
+        """
+        self.new_events = list(new_events)
+        self.changed_events = list(changed_events)
+        self.removed_events = list(removed_events)
+        self.base_id = base_id
+        self.created_at = created_at or datetime.now(timezone.utc).isoformat()
+
+    def __len__(self):
+        return len(self.new_events) + len(self.changed_events) + len(self.removed_events)
+
+    @classmethod
+    def from_differ(cls, differ, new_events, changed_events, removed_events, base_id=None):
+        """Build a plan from the results of an EventDiffer.
+
+        :param differ: the differ, after events_to_update has been called
+        :type differ: EventDiffer
+        :param new_events: the differ's events_to_add
+        :param changed_events: the differ's updated events that aren't
+            removals
+        :param removed_events: the differ's updated events that are removals
+        :param base_id: ID of the Airtable base that was diffed
+        :rtype: Plan
+        """
+        def updates(events):
+            for event in events:
+                previous_event = differ.previous_events[event.primary_id]
+                changes = event.subset(differ.changed_fields[event.primary_id])
+                # Copied as they are rather than through the properties,
+                # whose setters can't take the empty values Airtable leaves
+                # out of a row
+                previous_fields = previous_event.raw.get('fields', {})
+                previous = {
+                    column: previous_fields.get(column)
+                    for column in changes.raw.get('fields', {})
+                }
+                # Rewriting the (unchanged) actionnetwork_id is harmless,
+                # and lets the row be looked up again when applying
+                changes.actionnetwork_id = event.actionnetwork_id
+                yield changes, previous_event.updated_at, previous
+
+        return cls(
+            new_events,
+            updates(changed_events),
+            updates(removed_events),
+            base_id=base_id,
+        )
+
+    def actionnetwork_ids(self):
+        """Get the ActionNetwork IDs of every event the plan touches."""
+        ids = [event.actionnetwork_id for event in self.new_events]
+        for event, _, _ in self.changed_events + self.removed_events:
+            ids.append(event.actionnetwork_id)
+        return ids
+
+    def check(self, destination_events):
+        """Find the changes that can still be applied, given the current
+        state of the rows the plan touches.
+
+        A new event can't be added if a row for it now exists, and a row
+        can't be updated if it no longer exists or was modified after the
+        plan was computed. A plan that was partly applied before is therefore
+        safe to apply again: the rows it already wrote have been modified
+        since, and are left out.
+
+        :param destination_events: the current Airtable events for the
+            plan's actionnetwork_ids
+        :type destination_events: list[AirtableEvent]
+        :return: tuple of (a plan with only the applicable changes, list of
+            (actionnetwork_id, reason) tuples for the changes left out)
+        :rtype: tuple[Plan, list]
+        """
+        by_actionnetwork_id = {e.actionnetwork_id: e for e in destination_events}
+        by_airtable_id = {e.airtable_id: e for e in destination_events}
+        skipped = []
+
+        new_events = []
+        for event in self.new_events:
+            if event.actionnetwork_id in by_actionnetwork_id:
+                skipped.append((event.actionnetwork_id, 'already exists'))
+            else:
+                new_events.append(event)
+
+        def applicable(updates):
+            for update in updates:
+                event, modified, _ = update
+                current = by_airtable_id.get(event.airtable_id)
+                if current is None:
+                    skipped.append((event.actionnetwork_id, 'no longer exists'))
+                elif current.updated_at != modified:
+                    skipped.append((event.actionnetwork_id, f'modified at {current.updated_at}'))
+                else:
+                    yield update
+
+        plan = Plan(
+            new_events,
+            applicable(self.changed_events),
+            applicable(self.removed_events),
+            base_id=self.base_id,
+            created_at=self.created_at,
+        )
+        return plan, skipped
+
+    def to_document(self):
+        """Serialize the plan, using Airtable's own field names.
+
+        :return: JSON-serializable dict
+        """
+        def updates(events):
+            return [
+                {
+                    'id': event.airtable_id,
+                    'modified': modified,
+                    'fields': event.raw['fields'],
+                    'previous': previous,
+                }
+                for event, modified, previous in events
+            ]
+
+        return {
+            'version': self.VERSION,
+            'created_at': self.created_at,
+            'base_id': self.base_id,
+            'add': [event.raw['fields'] for event in self.new_events],
+            'update': updates(self.changed_events),
+            'remove': updates(self.removed_events),
+        }
+
+    @classmethod
+    def from_document(cls, document):
+        """Load a plan serialized with to_document.
+
+        :raises ValueError: if the document is from an unknown version
+        :rtype: Plan
+        """
+        if document.get('version') != cls.VERSION:
+            raise ValueError(f"Unsupported plan version: {document.get('version')}")
+
+        def updates(entries):
+            return [
+                (
+                    AirtableEvent({'id': entry['id'], 'fields': entry['fields']}),
+                    entry['modified'],
+                    entry['previous'],
+                )
+                for entry in entries
+            ]
+
+        return cls(
+            [AirtableEvent({'fields': fields}) for fields in document['add']],
+            updates(document['update']),
+            updates(document['remove']),
+            base_id=document.get('base_id'),
+            created_at=document.get('created_at'),
+        )
+
+    def save(self, path):
+        """Write the plan to a JSON file, gzipped if the path ends in .gz."""
+        opener = gzip.open if path.endswith('.gz') else open
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with opener(path, 'wt') as f:
+            json.dump(self.to_document(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """Read a plan written by save.
+
+        :rtype: Plan
+        """
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as f:
+            return cls.from_document(json.load(f))
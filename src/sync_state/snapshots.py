@@ -0,0 +1,185 @@
+from datetime import timezone
+
+from event_models.events import AirtableEvent
+
+class Snapshot:
+    """The state of each event as of the last successful sync, keyed by
+    actionnetwork_id.
+
+    For each event, the snapshot stores the fingerprint and modification
+    time of the source event that was synced, along with the Airtable ID,
+    fingerprint and modification time of the row it was synced to (when
+    known). Source events whose fingerprint matches the snapshot have not
+    changed since they were last synced, and don't need to be compared
+    against (or written to) Airtable at all, unless their row has since been
+    edited in Airtable.
+
+    Changes are staged while events are tracked, and only become part of the
+    snapshot once commit is called after the events have been written.
+    """
+
+    KEY = 'snapshot'
+
+    def __init__(self, store, key=KEY):
+        """Load the snapshot saved in the given store.
+
+        :param store: where the snapshot is persisted between runs
+        :type store: StateStore
+        :param key: key the snapshot is saved under, for syncs that only
+            cover some groups (such as shards) to keep their own snapshot.
+            defaults to KEY
+        :type key: str, optional
+        """
+        self.store = store
+        self.key = key
+        self.entries = store.load(key) or {}
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        """Forget every event, so the snapshot is rebuilt from the events
+        tracked from now on (for full syncs)."""
+        self.entries = {}
+        self.pending = {}
+
+    @staticmethod
+    def destination_fingerprint(record):
+        """Get the fingerprint of an Airtable row's synced fields.
+
+        Columns that are only read when comparing by fingerprint are left
+        out, and times are compared in UTC, so that rows returned by writes
+        and rows read either way have the same fingerprint.
+
+        :param record: the row, as returned by the Airtable API
+        :type record: dict
+        :rtype: str
+        """
+        event = AirtableEvent({'fields': dict(record.get('fields', {}))})
+        for field in ('start', 'end'):
+            value = getattr(event, field)
+            if value is not None:
+                setattr(event, field, value.astimezone(timezone.utc))
+        return event.fingerprint(sorted(
+            AirtableEvent.event_fields() -
+            AirtableEvent.FINGERPRINT_ONLY_FIELD_NAMES -
+            {'airtable_id', AirtableEvent.SOURCE_FINGERPRINT_FIELD_NAME}
+        ))
+
+    def modified_since(self):
+        """Get the newest modification time of any row in the snapshot.
+        Rows modified after it have been edited since they were synced.
+
+        :return: Airtable timestamp, or None if no rows are known
+        :rtype: str
+        """
+        return max((
+            entry['destination_updated_at']
+            for entry in self.entries.values()
+            if entry.get('destination_updated_at')
+        ), default=None)
+
+    def edited(self, destination_events):
+        """Find the rows that were edited in Airtable since they were synced.
+
+        :param destination_events: Airtable events to check
+        :type destination_events: Iterable[AirtableEvent]
+        :return: actionnetwork_ids of the edited rows
+        :rtype: set[str]
+        """
+        edited = set()
+        for event in destination_events:
+            fingerprint = self.entries.get(event.actionnetwork_id, {}).get('destination_fingerprint')
+            if fingerprint is not None and fingerprint != self.destination_fingerprint(event.raw):
+                edited.add(event.actionnetwork_id)
+        return edited
+
+    def track(self, source_events, only_changed=False, edited_ids=()):
+        """Stage the fingerprints of source events as they pass through.
+
+        :param source_events: events to track; may be an iterator
+        :type source_events: Iterable[Event]
+        :param only_changed: if True, events whose fingerprint matches the
+            snapshot are dropped rather than passed through
+        :type only_changed: bool, optional
+        :param edited_ids: actionnetwork_ids of rows edited in Airtable (see
+            edited), whose events are passed through even if unchanged so
+            that the edits are synced over
+        :type edited_ids: Collection[str], optional
+        :return: generator of the source events
+        """
+        for event in source_events:
+            common_id = event.actionnetwork_id
+            if common_id is None:
+                continue
+            fingerprint = event.fingerprint()
+            entry = self.entries.get(common_id, {})
+            if (
+                only_changed and
+                entry.get('source_fingerprint') == fingerprint and
+                common_id not in edited_ids
+            ):
+                continue
+            self.pending[common_id] = {
+                'source_fingerprint': fingerprint,
+                'source_updated_at': event.updated_at,
+            }
+            yield event
+
+    def commit(self, report=None, destination_events=()):
+        """Apply the staged changes for every event that was written
+        successfully, and save the snapshot.
+
+        :param report: results of writing the events to Airtable. Events
+            that failed to write stay out of the snapshot so that they are
+            retried next time.
+        :type report: WriteReport, optional
+        :param destination_events: Airtable events read during this sync, to
+            record the Airtable IDs of events that didn't need writing
+        :type destination_events: Iterable[AirtableEvent], optional
+        """
+        destination_events = list(destination_events)
+
+        failed_ids = set()
+        if report is not None:
+            # Records updated by Airtable ID may only carry the changed
+            # fields, so look up their actionnetwork_id by Airtable ID
+            ids_by_airtable_id = {
+                entry.get('airtable_id'): common_id
+                for common_id, entry in self.entries.items()
+            }
+            ids_by_airtable_id.update({
+                e.airtable_id: e.actionnetwork_id for e in destination_events
+            })
+            failed_ids = {
+                record.get('fields', {}).get('actionnetwork_id') or
+                ids_by_airtable_id.get(record.get('id'))
+                for record, _ in report.failed
+            }
+
+        for common_id, changes in self.pending.items():
+            if common_id not in failed_ids:
+                self.entries.setdefault(common_id, {}).update(changes)
+        self.pending = {}
+
+        destination_records = [
+            ({'id': e.airtable_id, 'fields': e.raw.get('fields', {})}, False)
+            for e in destination_events
+        ]
+        if report is not None:
+            # Written records take precedence over what was read before
+            destination_records += [(record, True) for record in report.succeeded]
+        for record, written in destination_records:
+            fields = record.get('fields', {})
+            entry = self.entries.get(fields.get('actionnetwork_id'))
+            if entry is not None:
+                entry['airtable_id'] = record.get('id')
+                entry['destination_updated_at'] = fields.get('modified')
+                # A row that was read keeps the fingerprint it was synced
+                # with, so that an edit that wasn't synced over is still
+                # found next time
+                if written or 'destination_fingerprint' not in entry:
+                    entry['destination_fingerprint'] = self.destination_fingerprint(record)
+
+        self.store.save(self.key, self.entries)
@@ -0,0 +1,87 @@
+import gzip
+import json
+import os
+from abc import ABC, abstractmethod
+
+
+class StateStore(ABC):
+    """Abstract base class for places we persist sync state between runs.
+
+    State is stored as JSON-serializable documents under string keys. Stores
+    only need to be able to load and save whole documents; any structure
+    within a document is up to the caller.
+    """
+
+    @abstractmethod
+    def load(self, key):
+        """Load a document.
+
+        :param str key: name of the document
+        :return: the stored document, or None if nothing has been saved yet
+        """
+
+    @abstractmethod
+    def save(self, key, document):
+        """Save a document, replacing any previous version.
+
+        :param str key: name of the document
+        :param document: JSON-serializable value to store
+        """
+
+    @abstractmethod
+    def delete(self, key):
+        """Delete a document, if it exists.
+
+        :param str key: name of the document
+        """
+
+
+class LocalFileStore(StateStore):
+    """Stores each document as a JSON file in a local directory."""
+
+    def __init__(self, directory, compress=False):
+        """
+        :param directory: directory to keep the files in; created on first
+            save if needed
+        :type directory: str
+        :param compress: whether to gzip the files, for large documents.
+            defaults to False
+        :type compress: bool, optional
+        """
+        self.directory = directory
+        self.compress = compress
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.directory!r})"
+
+    def _path(self, key):
+        extension = '.json.gz' if self.compress else '.json'
+        return os.path.join(self.directory, f'{key}{extension}')
+
+    def _open(self, path, mode):
+        if self.compress:
+            return gzip.open(path, f'{mode}t')
+        return open(path, mode)
+
+    def load(self, key):
+        try:
+            with self._open(self._path(key), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, document):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so an interrupted run never leaves
+        # a half-written document behind
+        path = self._path(key)
+        tmp_path = f'{path}.tmp'
+        with self._open(tmp_path, 'w') as f:
+            json.dump(document, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
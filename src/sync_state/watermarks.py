@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+
+# Watermarks are moved back by this much before being used as a filter, so
+# that events modified in the same instant as the last event we saw (or
+# shortly before it, due to clock skew) are not missed. Re-fetching a few
+# unchanged events is harmless since the differ will find nothing to update.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# How often to ignore the watermarks and fetch everything, so that events
+# which disappear from ActionNetwork are still noticed
+DEFAULT_FULL_SYNC_INTERVAL = timedelta(hours=24)
+
+
+class Watermarks:
+    """Per-group high-water marks for incremental ActionNetwork syncs.
+
+    The high-water mark for a group is the most recent modification time
+    of any event we have fetched for it. Later runs only need to ask for
+    events modified after that time.
+    """
+
+    KEY = 'actionnetwork_watermarks'
+
+    def __init__(
+        self,
+        store,
+        full_sync_interval=DEFAULT_FULL_SYNC_INTERVAL,
+        key=KEY
+    ):
+        """Load the watermarks saved in the given store.
+
+        :param store: where watermarks are persisted between runs
+        :type store: StateStore
+        :param full_sync_interval: how often a full sync is due, defaults to
+            DEFAULT_FULL_SYNC_INTERVAL
+        :type full_sync_interval: timedelta, optional
+        :param key: key the watermarks are saved under, for syncs that only
+            cover some groups (such as shards) to keep their own. defaults
+            to KEY
+        :type key: str, optional
+        """
+        self.store = store
+        self.full_sync_interval = full_sync_interval
+        self.key = key
+
+        document = store.load(key) or {}
+        self.groups = document.get('groups', {})
+        self.last_full_sync = document.get('last_full_sync')
+
+    def full_sync_due(self, now=None):
+        """Whether it has been long enough that we should fetch everything.
+
+        :param now: the current time, defaults to datetime.now()
+        :type now: datetime, optional
+        :rtype: bool
+        """
+        if self.last_full_sync is None:
+            return True
+        now = now or datetime.now(timezone.utc)
+        last_full_sync = datetime.fromisoformat(self.last_full_sync)
+        return now - last_full_sync >= self.full_sync_interval
+
+    def since(self, group):
+        """The modification time to fetch a group's events from.
+
+        :param str group: name of the ActionNetwork group
+        :return: ISO-formatted timestamp, or None if the group has never been
+            synced
+        :rtype: str
+        """
+        watermark = self.groups.get(group)
+        if watermark is None:
+            return None
+        since = datetime.fromisoformat(watermark) - WATERMARK_OVERLAP
+        return since.isoformat()
+
+    def since_by_group(self, groups):
+        return {
+            group: since for group in groups
+            if (since := self.since(group)) is not None
+        }
+
+    def advance(self, modified_by_group, full_sync=False, now=None):
+        """Move each group's watermark up to its newest fetched event, and
+        save the result.
+
+        Should only be called once the fetched events have been successfully
+        applied to the destination.
+
+        :param modified_by_group: ISO-formatted modification times of the
+            fetched events (or just the newest of them) keyed by group name
+        :type modified_by_group: dict[str, Iterable[str]]
+        :param full_sync: whether the events came from a full sync
+        :type full_sync: bool, optional
+        :param now: the current time, defaults to datetime.now()
+        :type now: datetime, optional
+        """
+        for group, modified_times in modified_by_group.items():
+            newest = newest_modified([self.groups.get(group), *modified_times])
+            if newest is not None:
+                self.groups[group] = newest
+
+        if full_sync:
+            now = now or datetime.now(timezone.utc)
+            self.last_full_sync = now.isoformat()
+
+        self.store.save(self.key, {
+            'groups': self.groups,
+            'last_full_sync': self.last_full_sync,
+        })
+
+
+def newest_modified(modified_times):
+    """Get the most recent of some ISO-formatted timestamps.
+
+    :param modified_times: timestamps, any of which may be None
+    :type modified_times: Iterable[str]
+    :return: the most recent timestamp in ISO format, or None if there are no
+        timestamps
+    :rtype: str
+    """
+    parsed = [datetime.fromisoformat(t) for t in modified_times if t]
+    return max(parsed).isoformat() if parsed else None
@@ -0,0 +1,157 @@
+import base64
+import hmac
+import json
+import os
+import time
+
+from event_connectors.actionnetwork import ActionNetwork
+from event_connectors.airtable import Airtable
+from event_connectors.metrics import start_metrics
+from event_models.events import ActionNetworkEvent
+from event_models.events import EventDiffer
+from sync import AIRTABLE_FINGERPRINTS
+from sync import AIRTABLE_REQUESTS_PER_SECOND
+from sync import AIRTABLE_WRITE_WORKERS
+from sync import METRICS_NAMESPACE
+from sync import credentials
+
+# Token ActionNetwork must send as the 'token' query parameter of the webhook
+# URL. ActionNetwork doesn't sign its webhooks, so without a token anyone who
+# knows the URL could write to Airtable; every request is rejected until one
+# is set.
+WEBHOOK_TOKEN = os.environ.get('WEBHOOK_TOKEN')
+
+
+def response(status_code, body):
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(body),
+    }
+
+
+def request_body(event):
+    """Parse the JSON body of an HTTP request from a Lambda function URL or
+    API Gateway."""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode()
+    return json.loads(body)
+
+
+def webhook_events(payload):
+    """Get the raw events from an ActionNetwork webhook payload.
+
+    ActionNetwork posts a list of items, each holding a single resource keyed
+    by its type, such as 'osdi:event'. Items for anything other than events
+    (such as attendances) are skipped.
+
+    :param payload: the parsed webhook payload
+    :type payload: list
+    :return: raw event dicts. An event sent more than once is only returned
+        once, as sent last.
+    :rtype: list[dict]
+    """
+    if isinstance(payload, dict):
+        payload = [payload]
+    raw_events = {}
+    for item in payload:
+        raw_event = item.get('osdi:event')
+        if raw_event is None:
+            continue
+        raw_events[ActionNetworkEvent(raw_event).actionnetwork_id] = raw_event
+    return list(raw_events.values())
+
+
+def handler(event, *_):
+    """Apply the events in an ActionNetwork webhook to Airtable.
+
+    Only the Airtable rows for the events in the webhook are read, rather
+    than the whole table, and only events that changed are written. The
+    scheduled sync still reconciles everything, catching any webhook that
+    was missed.
+    """
+    event = event or {}
+    token = (event.get('queryStringParameters') or {}).get('token') or ''
+    if not WEBHOOK_TOKEN:
+        print("WARNING: Rejected webhook because WEBHOOK_TOKEN is not set")
+        return response(403, {'error': 'Forbidden'})
+    if not hmac.compare_digest(token, WEBHOOK_TOKEN):
+        print("WARNING: Rejected webhook with a missing or wrong token")
+        return response(403, {'error': 'Forbidden'})
+
+    try:
+        payload = request_body(event)
+    except ValueError as e:
+        print(f"WARNING: Rejected webhook with an invalid body: {e!r}")
+        return response(400, {'error': 'Invalid JSON body'})
+    print(f'WEBHOOK {json.dumps(payload)}')
+
+    source_events = ActionNetwork._records(webhook_events(payload))
+    if not source_events:
+        print("No events to sync in webhook")
+        return response(200, {'source_events': 0, 'written_events': 0})
+
+    metrics = start_metrics(
+        namespace=METRICS_NAMESPACE,
+        dimensions={'Service': 'webhook'},
+    )
+    handler_start = time.perf_counter()
+
+    _, airtable_token, airtable_base_id = credentials(actionnetwork=False)
+    airtable = Airtable(
+        airtable_token,
+        airtable_base_id,
+        requests_per_second=AIRTABLE_REQUESTS_PER_SECOND,
+        write_workers=AIRTABLE_WRITE_WORKERS,
+    )
+    with metrics.timed('airtable_read'):
+        airtable_events = airtable.events_by_actionnetwork_id(
+            [e.actionnetwork_id for e in source_events],
+            fingerprints=AIRTABLE_FINGERPRINTS,
+        )
+
+    with metrics.timed('diff'):
+        differ = EventDiffer(
+            events_from_source=source_events,
+            events_at_destination=airtable_events,
+            # Every other event is left alone
+            partial_source=True,
+            use_fingerprints=AIRTABLE_FINGERPRINTS,
+        )
+        differ.match_events()
+        new_events = differ.events_to_add()
+        updated_events = differ.events_to_update()
+
+    print(f"{len(new_events)} new events")
+    print(f"{len(updated_events)} changed events")
+
+    # Upserting, rather than adding, keeps an event from being added twice if
+    # the scheduled sync adds it at the same time
+    with metrics.timed('airtable_write'):
+        report = airtable.upsert_events(
+            new_events + updated_events,
+            changed_fields=differ.changed_fields,
+        )
+    print(f"{len(report.succeeded)} events written to Airtable")
+
+    metrics.add('source_events', len(source_events))
+    metrics.add('new_events', len(new_events))
+    metrics.add('changed_events', len(updated_events))
+    metrics.add('written_events', len(report.succeeded))
+    metrics.add('failed_writes', len(report.failed))
+    metrics.add('total_seconds', time.perf_counter() - handler_start, unit='Seconds')
+    metrics.emit()
+
+    if report.failed:
+        raise RuntimeError(
+            f"{len(report.failed)} events failed to write to Airtable: "
+            f"{sorted({error for _, error in report.failed})}"
+        )
+
+    return response(200, {
+        'source_events': len(source_events),
+        'new_events': len(new_events),
+        'changed_events': len(updated_events),
+        'written_events': len(report.succeeded),
+    })
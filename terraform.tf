@@ -15,7 +15,7 @@ provider "aws" {
 
 locals {
   app_name                       = "actionnetwork-airtable-sync"
-  event_rule_schedule_expression = "rate(1 hour)"
+  event_rule_schedule_expression = "rate(6 hours)"
   event_rule_is_enabled          = true
   repo                           = "https://github.com/BostonDSA/facebook-gcal-sync"
 
@@ -83,6 +83,21 @@ data "aws_iam_policy_document" "inline" {
     ]
   }
 
+  # Secrets are fetched together with BatchGetSecretValue, which can't be
+  # scoped to particular secrets. The secrets themselves are still limited
+  # by GetSecretValue above.
+  statement {
+    sid = "BatchGetSecretValues"
+
+    actions = [
+      "secretsmanager:BatchGetSecretValue",
+    ]
+
+    resources = [
+      "*",
+    ]
+  }
+
   statement {
     sid = "PublishToSns"
 
@@ -189,6 +204,44 @@ resource "aws_lambda_permission" "sync" {
   source_arn    = aws_cloudwatch_event_rule.sync.arn
 }
 
+/* WEBHOOK - Apply Action Network event webhooks to Airtable as they arrive
+ *
+ * Lambda function URL receives webhooks from Action Network
+ * Lambda function upserts the events in each webhook
+ * The scheduled sync reconciles anything the webhooks missed
+ */
+
+resource "aws_cloudwatch_log_group" "webhook" {
+  name              = "/aws/lambda/${aws_lambda_function.webhook.function_name}"
+  retention_in_days = 30
+}
+
+resource "aws_lambda_function" "webhook" {
+  description      = "Apply Action Network event webhooks to Airtable"
+  filename         = "dist/sync.zip"
+  function_name    = "${local.app_name}-webhook"
+  handler          = "webhook.handler"
+  role             = aws_iam_role.role.arn
+  runtime          = "python3.11"
+  source_code_hash = filebase64sha256("dist/sync.zip")
+  tags             = local.tags
+  timeout          = 30
+
+  environment {
+    variables = {
+      AIRTABLE_SECRET_ID = data.aws_secretsmanager_secret.airtable.name
+      WEBHOOK_TOKEN      = var.WEBHOOK_TOKEN
+    }
+  }
+}
+
+resource "aws_lambda_function_url" "webhook" {
+  # Action Network can't sign requests, so webhooks are authenticated by the
+  # token in the URL instead
+  authorization_type = "NONE"
+  function_name      = aws_lambda_function.webhook.function_name
+}
+
 /* ALARM - Send a Slack alert when sync is failing
  *
  * CloudWatch metric alarm publishes message to SNS
@@ -206,11 +259,11 @@ resource "aws_cloudwatch_metric_alarm" "alarm" {
   alarm_description   = "${local.app_name} is failing"
   alarm_name          = local.app_name
   comparison_operator = "GreaterThanOrEqualToThreshold"
-  evaluation_periods  = "6"
+  evaluation_periods  = "2"
   metric_name         = "FailedInvocations"
   namespace           = "AWS/Events"
   ok_actions          = [aws_sns_topic.alarm.arn]
-  period              = "3600"
+  period              = "21600"
   statistic           = "Sum"
   threshold           = "1"
   treat_missing_data  = "notBreaching"
@@ -276,6 +329,11 @@ output "sync_function_name" {
   value       = aws_lambda_function.sync.function_name
 }
 
+output "webhook_function_url" {
+  description = "Webhook Lambda function URL, to give Action Network with ?token=WEBHOOK_TOKEN"
+  value       = aws_lambda_function_url.webhook.function_url
+}
+
 variable "VERSION" {
   description = "Release tag name"
 }
@@ -283,3 +341,13 @@ variable "VERSION" {
 variable "AWS_ROLE_ARN" {
   description = "AWS Role ARN to assume"
 }
+
+variable "WEBHOOK_TOKEN" {
+  description = "Token Action Network webhooks must send"
+  sensitive   = true
+
+  validation {
+    condition     = length(var.WEBHOOK_TOKEN) > 0
+    error_message = "WEBHOOK_TOKEN must be set, or anyone could call the public webhook URL."
+  }
+}
@@ -1,170 +1,114 @@
+import json
+import threading
+import time
 import unittest.mock as mock
-import requests
-from src import actionnetwork
+import urllib.parse
 from datetime import datetime
 
+import requests
+
+from event_connectors import actionnetwork
+from event_connectors.actionnetwork import ActionNetwork
+from event_connectors.actionnetwork import EventIndex
+from event_models.events import EASTERN
+from event_models.events import ActionNetworkEvent
+from event_models.events import EventDiffer
+
 TEST_KEY = 'test_key'
 
 HEADER = {'OSDI-API-Token': TEST_KEY}
 
 
 class MockResponse:
+    request = None
+    raw = None
+
     def __init__(self, json_data, status_code):
         self.json_data = json_data
         self.status_code = status_code
+        self.content = json.dumps(json_data).encode()
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode()
 
     def json(self):
         return self.json_data
 
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error")
+
 
 ACTION_NETWORK_EVENTS = [
     [
         {
             'identifiers': [
-                'action_network_id:1',
-                'facebook_id:1',
+                'action_network:1',
             ],
+            'browser_url': 'https://actionnetwork.org/events/1',
             'title': 'event_1',
-            'name': 'event_1',
             'description': 'test',
-            '_links': {
-                'self': {'href': 'https://actionnetwork.org/api/v2/events/1'}
-            }
+            'start_date': '2018-12-12T12:00:00Z',
+            'end_date': '2018-12-12T13:00:00Z',
+            'location': {
+                'venue': 'Boston Public Library',
+                'address_lines': ['700 Boylston St'],
+                'locality': 'Boston',
+                'region': 'MA',
+                'postal_code': '02116',
+            },
+            'status': 'confirmed',
+            'origin_system': 'Action Network',
+            'action_network:sponsor': {'title': 'Boston DSA'},
+            'modified_date': '2018-11-12T13:00:00Z',
         },
         {
             'identifiers': [
-                'action_network_id:2',
+                'action_network:2',
+                'facebook_id:2',
             ],
+            'browser_url': 'https://actionnetwork.org/events/2',
             'title': 'ignored',
-            '_links': {
-                'self': {'href': 'https://actionnetwork.org/api/v2/events/2'}
-            }
+            'description': 'created by the old Facebook sync',
+            'start_date': '2018-12-13T12:00:00Z',
+            'location': {},
+            'status': 'confirmed',
+            'origin_system': 'Facebook Sync',
+            'action_network:sponsor': {'title': 'Boston DSA'},
+            'modified_date': '2018-11-12T13:00:00Z',
         },
     ],
     [
         {
             'identifiers': [
-                'action_network_id:3',
-                'facebook_id:2',
+                'action_network:3',
             ],
-            'title': 'event_1',
-            'name': 'event_1',
-            'description': 'test',
-            'modified_date': '2018-11-12T13:00:00-0500',
-            '_links': {
-                'self': {'href': 'https://actionnetwork.org/api/v2/events/3'}
-            }
+            'browser_url': 'https://actionnetwork.org/events/3',
+            'title': 'event_3',
+            'description': 'cancelled, with no end time',
+            'start_date': '2018-12-14T12:00:00Z',
+            'location': {'venue': 'Zoom'},
+            'status': 'cancelled',
+            'origin_system': 'Action Network',
+            'action_network:sponsor': {'title': 'Boston DSA'},
+            'modified_date': '2018-11-13T13:00:00Z',
         },
     ]
 
 ]
 
-FACEBOOK_EVENTS = [
-    {
-        'id': '1',
-        'start_time': '2018-12-12T12:00:00-0500',
-        'end_time': '2018-12-12T13:00:00-0500',
-        'description': 'doesnt update because no modified time',
-        'name': 'Event 1',
-        'place': {
-            'name': 'Boston Public Library',
-            'location': {
-                'city': 'Boston',
-                'country': 'United States',
-                'state': 'MA',
-                'street': '700 Boylston St',
-                'zip': '02116',
-            },
-        },
-    },
-    {
-        'id': '2',
-        'start_time': '2018-12-13T12:00:00-0500',
-        'end_time': '2018-12-13T13:00:00-0500',
-        'updated_time': '2018-11-13T13:00:00-0500',
-        'description': 'updates',
-        'name': 'Updated Event 2',
-        'place': {
-            'name': 'Boston Public Library',
-            'location': {
-                'city': 'Boston',
-                'country': 'United States',
-                'state': 'MA',
-                'street': '700 Boylston St',
-                'zip': '02116',
-                'latitude': '100',
-                'longitude': '150',
-            },
-        },
-    },
-    {
-        'id': '3',
-        'start_time': '2018-12-14T12:00:00-0500',
-        'end_time': '2018-12-14T13:00:00-0500',
-        'description': 'some description 3',
-        'name': 'Event 3',
-        'place': {
-            'name': 'Boston Public Library',
-            'location': {
-                'city': 'Boston',
-                'country': 'United States',
-                'state': 'MA',
-                'street': '700 Boylston St',
-                'zip': '02116',
-            },
-        },
-    },
-    {
-        'id': '4',
-        'start_time': '2019-12-20T12:00:00-0500',
-        'end_time': '2019-12-20T13:00:00-0500',
-        'description': 'will not be created -- too far in advance',
-        'name': 'Event 4',
-        'place': {
-            'name': 'Boston Public Library',
-            'location': {
-                'city': 'Boston',
-                'country': 'United States',
-                'state': 'MA',
-                'street': '700 Boylston St',
-                'zip': '02116',
-            },
-        },
-    },
-    {
-        'id': '5',
-        'start_time': '2019-08-14T12:00:00-0500',
-        'end_time': '2019-08-14T13:00:00-0500',
-        'description': 'some description 3',
-        'name': 'Event 5',
-        'place': {
-            'name': 'Zoom meeting',
-        },
-    },
-    {
-        'id': '6',
-        'description': 'not created with no time',
-        'name': 'Event 6',
-        'place': {
-            'name': 'Somerville Public Library',
-            'location': {
-                'city': 'Somerville',
-                'country': 'United States',
-                'state': 'MA',
-                'street': '700 Summer St',
-                'zip': '02143',
-            },
-        },
-    },
-]
-
 
 def fake_get(url, *args, **kwargs):
     if url == "https://actionnetwork.org/api/v2/":
         resp = {
             'motd': 'test',
             '_links': {
-                'events': {
+                'osdi:events': {
                     'href': 'https://actionnetwork.org/api/v2/events'
                 }
             }
@@ -203,92 +147,139 @@ def fake_get(url, *args, **kwargs):
     return MockResponse({}, 404)
 
 
-@mock.patch('actionnetwork.datetime')
-@mock.patch('actionnetwork.requests.post')
-@mock.patch('actionnetwork.requests.put')
-@mock.patch('actionnetwork.requests.get', side_effect=fake_get)
-def test_sync(get, put, post, dt):
-    dt.utcnow.return_value = datetime(year=2018, day=5, month=12, hour=0, minute=0)
-    dt.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
-    mockf = mock.MagicMock()
+def test_events():
+    session = mock.MagicMock()
+    session.get.side_effect = fake_get
 
-    mockf.get_object.side_effect = [{'data': FACEBOOK_EVENTS}]
-    mockf.get_objects.side_effect = [{x['id']: x for x in FACEBOOK_EVENTS}]
+    client = ActionNetwork(TEST_KEY, session=session)
+    events = client.events(min_modified_time='2018-11-01T00:00:00Z')
 
-    page = facebook.FacebookPage(mockf, 'TestPage')
+    # The event created by the Facebook sync is skipped
+    assert [e.actionnetwork_id for e in events] == ['1', '3']
 
-    client = actionnetwork.ActionNetwork(TEST_KEY)
+    assert events[0].title == 'event_1'
+    assert events[0].host_group == 'Boston DSA'
+    assert events[0].location == 'Boston Public Library, 700 Boylston St, Boston MA, 02116'
+    assert events[0].start == datetime(2018, 12, 12, 12, tzinfo=EASTERN)
+    assert not events[0].removed
 
-    client.sync(page).execute()
+    assert events[1].location == 'Zoom'
+    assert events[1].end == datetime(2018, 12, 14, 13, tzinfo=EASTERN)
+    assert events[1].removed
 
-    put.assert_called_once_with(
-        'https://actionnetwork.org/api/v2/events/3',
+    session.get.assert_any_call(
+        'https://actionnetwork.org/api/v2/events',
+        params={'filter': "modified_date gt '2018-11-01T00:00:00Z'"},
         headers=HEADER,
-        json={
-            'name': 'Updated Event 2',
-            'title': 'Updated Event 2',
-            'origin_system': 'Facebook Sync',
-            'description': 'updates',
-            'start_date': '2018-12-13T12:00:00-0500',
-            'identifiers': [
-                'facebook_id:2'
-            ],
-            'location': {
-                'venue': 'Boston Public Library',
-                'postal_code': '02116',
-                'locality': 'Boston',
-                'location': {
-                    'latitude': '100',
-                    'longitude': '150',
-                },
-                'address_lines': [
-                    '700 Boylston St',
-                ],
-            }
-        },
     )
+    assert session.get.call_count == 3
 
-    post.assert_has_calls([
-        mock.call(
-            'https://actionnetwork.org/api/v2/events',
-            json={
-                'name': 'Event 3',
-                'title': 'Event 3',
-                'origin_system': 'Facebook Sync',
-                'description': 'some description 3',
-                'start_date': '2018-12-14T12:00:00-0500',
-                'identifiers': [
-                    'facebook_id:3',
-                ],
-                'location': {
-                    'venue': 'Boston Public Library',
-                    'postal_code': '02116',
-                    'locality': 'Boston',
-                    'address_lines': [
-                        '700 Boylston St',
-                    ],
-                }
-            },
-            headers=HEADER,
-        ),
-
-        mock.call('https://actionnetwork.org/api/v2/events',
-                  json={
-                      'name': 'Event 5',
-                      'title': 'Event 5',
-                      'origin_system': 'Facebook Sync',
-                      'description': 'some description 3',
-                      'start_date': '2019-08-14T12:00:00-0500',
-                      'identifiers': [
-                          'facebook_id:5',
-                      ],
-                      'location': {
-                          'venue': 'Zoom meeting',
-                      }
-                  },
-                  headers=HEADER,
-                  )], any_order=True)
-
-    assert put.call_count == 1
-    assert post.call_count == 2
-    assert get.call_count == 3
+
+def test_fetch_group_events_isolates_failures():
+    hung = threading.Event()
+
+    def fetch_group(group, api_key, *args, **kwargs):
+        if group == 'Broken':
+            raise requests.exceptions.ConnectionError('refused')
+        if group == 'Hanging':
+            hung.wait()
+        return [api_key]
+
+    with mock.patch.object(actionnetwork, '_fetch_group', side_effect=fetch_group):
+        events_by_group, errors_by_group = actionnetwork.fetch_group_events(
+            {'Boston': 'key_1', 'Broken': 'key_2', 'Hanging': 'key_3', 'Unset': ''},
+            timeout=0.5,
+        )
+    hung.set()
+
+    # One group failing or hanging doesn't lose the others' events
+    assert events_by_group == {'Boston': ['key_1']}
+    assert isinstance(errors_by_group['Broken'], requests.exceptions.ConnectionError)
+    assert isinstance(errors_by_group['Hanging'], TimeoutError)
+    # Groups without a key are skipped rather than reported
+    assert list(errors_by_group) == ['Broken', 'Hanging']
+
+
+def test_events_page_workers():
+    session = mock.MagicMock()
+    session.get.side_effect = fake_get
+
+    client = ActionNetwork(TEST_KEY, session=session)
+    events = client.events(page_workers=4)
+
+    # Pages fetched concurrently come back in page order
+    assert [e.actionnetwork_id for e in events] == ['1', '3']
+    assert session.get.call_count == 3
+
+
+def test_page_workers_keep_page_order():
+    filter_param = "modified_date gt '2018-11-01T00:00:00Z'"
+    requested_urls = []
+
+    def get(url, params=None, **kwargs):
+        if url == actionnetwork.API_URL:
+            return fake_get(url)
+        requested_urls.append(url)
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(url).query))
+        page = int(query.get('page', 1))
+        # Earlier pages take longer, so they finish last
+        time.sleep((5 - page) * 0.02)
+        return MockResponse({
+            'total_pages': 4,
+            'page': page,
+            '_links': {'next': {'href': f'{url}?filter={urllib.parse.quote(filter_param)}&page=2'}},
+            '_embedded': {'osdi:events': [{'page': page, 'index': i} for i in range(2)]},
+        }, 200)
+
+    session = mock.MagicMock()
+    session.get.side_effect = get
+    client = ActionNetwork(TEST_KEY, session=session)
+
+    events = client.raw_events(page_workers=4)
+
+    assert [(e['page'], e['index']) for e in events] == [
+        (page, i) for page in range(1, 5) for i in range(2)
+    ]
+    # Every page keeps the filter from the 'next' link
+    assert all(filter_param in urllib.parse.unquote_plus(url) for url in requested_urls[1:])
+    assert len(requested_urls) == 4
+
+
+def co_sponsored(modified_date, title):
+    raw_event = dict(ACTION_NETWORK_EVENTS[0][0], modified_date=modified_date, title=title)
+    return ActionNetworkEvent(raw_event).to_record()
+
+
+def test_event_index_keeps_newest_copy():
+    older = co_sponsored('2018-11-12T13:00:00Z', 'older')
+    newer = co_sponsored('2018-11-14T13:00:00Z', 'newer')
+    tied = co_sponsored('2018-11-14T13:00:00Z', 'tied')
+
+    # Whatever order the groups' pages arrive in
+    for pages in (
+        [('Group A', older), ('Group B', newer), ('Group C', tied)],
+        [('Group C', tied), ('Group B', newer), ('Group A', older)],
+    ):
+        index = EventIndex()
+        for group, event in pages:
+            index.add(group, [event])
+
+        # Ties go to the group that comes first by name
+        assert [e.title for e in index.events()] == ['newer']
+        assert index.duplicates_by_group == {'Group A': 1, 'Group C': 1}
+
+
+def test_streamed_duplicates_replace_older_copies():
+    older = co_sponsored('2018-11-12T13:00:00Z', 'older')
+    newer = co_sponsored('2018-11-14T13:00:00Z', 'newer')
+    index = EventIndex()
+
+    events = index.iter_newest(iter([('Group A', older), ('Group B', newer), ('Group C', older)]))
+    differ = EventDiffer(
+        events_from_source=(event for _, event in events),
+        events_at_destination=[],
+    )
+    differ.match_events()
+
+    assert [e.title for e in differ.events_to_add()] == ['newer']
+    assert differ.source_count == 1
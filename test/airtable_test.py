@@ -0,0 +1,112 @@
+import unittest.mock as mock
+from datetime import datetime
+
+import pyairtable
+
+from event_connectors.airtable import Airtable
+from event_models.events import EASTERN
+from event_models.events import AirtableEvent
+
+RECORD = {
+    'id': 'rec1',
+    'createdTime': '2024-01-01T00:00:00.000Z',
+    'fields': {
+        'actionnetwork_id': '1',
+        'actionnetwork_link': 'https://actionnetwork.org/events/1',
+        'Event Title': 'event_1',
+        'Description': 'test',
+        'Host Group': 'Boston DSA',
+        'Start Time': '2024-03-01T18:00:00-05:00',
+        'End Time': '2024-03-01T19:00:00-05:00',
+        'Location': 'Online',
+        'modified': '2024-01-01T00:00:00.000Z',
+        # Columns maintained by hand, which the sync never needs
+        'Notes': 'bring snacks',
+        'Flyer': [{'url': 'https://example.test/flyer.png'}],
+    },
+}
+
+
+def test_events_read_only_used_columns():
+    airtable = Airtable('patTest', 'appTest')
+
+    with mock.patch.object(pyairtable.Table, 'all', return_value=[RECORD]) as read:
+        airtable.events(min_start_time=datetime(2024, 1, 1, tzinfo=EASTERN))
+
+    options = read.call_args.kwargs
+    assert options['fields'] == AirtableEvent.RAW_FIELD_NAMES
+    # Rows entered by hand are not read at all
+    assert "{actionnetwork_id} != ''" in options['formula']
+    assert 'IS_AFTER({Start Time}' in options['formula']
+
+
+def test_used_columns_cover_every_event_field():
+    projected = {
+        'id': RECORD['id'],
+        'fields': {
+            name: value for name, value in RECORD['fields'].items()
+            if name in AirtableEvent.RAW_FIELD_NAMES
+        },
+    }
+
+    assert AirtableEvent(projected).event_info() == AirtableEvent(RECORD).event_info()
+
+
+def test_partial_updates_send_only_changed_fields():
+    airtable = Airtable('patTest', 'appTest')
+    event = AirtableEvent(RECORD)
+
+    with mock.patch.object(airtable.writer, 'write') as write:
+        airtable.update_events([event], {'rec1': {'title', 'start'}})
+        airtable.update_events([event])
+
+    partial, full = (call.args for call in write.call_args_list)
+    assert partial == ('patch', [{
+        'id': 'rec1',
+        'fields': {
+            'Event Title': 'event_1',
+            'Start Time': '2024-03-01T18:00:00-05:00',
+        },
+    }])
+    # Without changed fields, every field is sent
+    assert full == ('patch', [RECORD])
+
+
+def test_upsert_payload():
+    airtable = Airtable('patTest', 'appTest')
+    changed = AirtableEvent(RECORD)
+    new = AirtableEvent()
+    new.actionnetwork_id = '2'
+    new.title = 'event_2'
+
+    with mock.patch.object(airtable.writer, 'write') as write:
+        airtable.upsert_events([changed, new], {'rec1': {'location'}})
+
+    write.assert_called_once_with(
+        'patch',
+        [
+            {'id': 'rec1', 'fields': {'Location': 'Online'}},
+            # Matched to an existing row, if there is one, by actionnetwork_id
+            {'fields': {'actionnetwork_id': '2', 'Event Title': 'event_2'}},
+        ],
+        on_written=None,
+        performUpsert={'fieldsToMergeOn': ['actionnetwork_id']},
+    )
+
+
+def test_added_events_are_upserted():
+    airtable = Airtable('patTest', 'appTest')
+    new = AirtableEvent()
+    new.actionnetwork_id = '2'
+    new.title = 'event_2'
+
+    with mock.patch.object(airtable.writer, 'write') as write:
+        airtable.add_events([new])
+
+    # Retrying a batch that was already created can't duplicate its rows
+    write.assert_called_once_with(
+        'patch',
+        [{'fields': {'actionnetwork_id': '2', 'Event Title': 'event_2'}}],
+        on_written=None,
+        performUpsert={'fieldsToMergeOn': ['actionnetwork_id']},
+    )
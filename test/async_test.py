@@ -0,0 +1,105 @@
+import asyncio
+import contextlib
+import types
+from unittest import mock
+
+import aiohttp
+from benchmark import run
+from benchmark import synthetic
+from event_connectors import async_actionnetwork
+from event_connectors.async_airtable import AsyncAirtable
+from event_connectors.async_http import client_session
+from event_connectors.async_http import request_with_retries
+from event_connectors.retries import RetryPolicy
+
+
+def test_async_handler_against_stand_ins():
+    data = synthetic.generate(300, groups=3, seed=2)
+    args = run.default_args(airtable_rate_limit=20, write_requests_per_second=1000)
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, airtable_stand_in), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            run.quiet():
+        result = sync.handler({'dryrun': False, 'async': True})
+
+        # Writing the changes leaves nothing to do
+        assert sync.handler({'dryrun': True, 'async': True})['changed_events'] == 0
+
+    # Only new and changed events are written, as by the blocking connectors
+    assert airtable_stand_in.written_count == data.new + data.changed
+    assert result['written_events'] == data.new + data.changed
+    assert result['source_events'] == len(data.source_events())
+
+
+def test_async_connectors_match_blocking():
+    data = synthetic.generate(300, groups=3, seed=4)
+    args = run.default_args(airtable_rate_limit=20, write_requests_per_second=1000)
+
+    async def fetch(group_key_map, page_workers):
+        async with client_session() as session:
+            events_by_group, errors = await async_actionnetwork.fetch_group_events(
+                group_key_map, session, page_workers=page_workers
+            )
+            airtable = AsyncAirtable(run.AIRTABLE_TOKEN, run.AIRTABLE_BASE_ID, session)
+            airtable_events = await airtable.events()
+            looked_up = await airtable.events_by_actionnetwork_id(
+                [e.actionnetwork_id for e in airtable_events[:150]]
+            )
+        return events_by_group, errors, airtable_events, looked_up
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, airtable_stand_in), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            run.quiet():
+        blocking_events, _ = sync.fetch_group_events(actionnetwork_stand_in.group_key_map)
+        for page_workers in (1, 4):
+            events_by_group, errors, airtable_events, looked_up = asyncio.run(
+                fetch(actionnetwork_stand_in.group_key_map, page_workers)
+            )
+            assert not errors
+            assert {
+                group: [e.event_info() for e in events]
+                for group, events in events_by_group.items()
+            } == {
+                group: [e.event_info() for e in events]
+                for group, events in blocking_events.items()
+            }
+        blocking_airtable_events = sync.Airtable(run.AIRTABLE_TOKEN, run.AIRTABLE_BASE_ID).events()
+        assert [e.raw for e in airtable_events] == [e.raw for e in blocking_airtable_events]
+        # Looked up in more than one batch
+        assert [e.airtable_id for e in looked_up] == [e.airtable_id for e in airtable_events[:150]]
+
+
+def test_non_idempotent_async_requests_are_only_retried_when_not_acted_on():
+    class Session:
+        def __init__(self, outcomes):
+            self.outcomes = list(outcomes)
+            self.calls = 0
+
+        @contextlib.asynccontextmanager
+        async def request(self, method, url, **kwargs):
+            self.calls += 1
+            outcome = self.outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            yield types.SimpleNamespace(
+                url=url, status=outcome, headers={},
+                read=mock.AsyncMock(return_value=b'{}'),
+            )
+
+    def attempts(*outcomes):
+        session = Session(outcomes)
+        try:
+            asyncio.run(request_with_retries(
+                session, 'POST', 'https://example.test/', 'test',
+                RetryPolicy(backoff_seconds=0), idempotent=False,
+            ))
+        except asyncio.TimeoutError:
+            pass
+        return session.calls
+
+    # The server may have acted on these, so sending again could repeat it
+    assert attempts(asyncio.TimeoutError(), 200) == 1
+    assert attempts(500, 200) == 1
+    # But not on these
+    assert attempts(aiohttp.ConnectionTimeoutError(), 200) == 2
+    assert attempts(429, 200) == 2
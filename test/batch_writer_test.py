@@ -0,0 +1,65 @@
+import types
+import unittest.mock as mock
+
+import pytest
+
+from actionnetwork_test import MockResponse
+from event_connectors import batch_writer
+from event_connectors import retries
+from event_connectors.batch_writer import RATE_LIMIT_PENALTY_SECONDS
+from event_connectors.batch_writer import BatchWriter
+from event_connectors.batch_writer import TokenBucket
+from retries_test import error_response
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Stand-in for the time module, whose sleep moves the clock forward."""
+    clock = types.SimpleNamespace(now=0.0)
+    clock.monotonic = lambda: clock.now
+    # Like a real clock, time moves on by at least a microsecond
+    clock.sleep = lambda seconds: setattr(clock, 'now', clock.now + max(seconds, 1e-6))
+    monkeypatch.setattr(batch_writer, 'time', clock)
+    monkeypatch.setattr(retries, 'time', clock)
+    monkeypatch.setattr(retries, '_breakers', {})
+    return clock
+
+
+def test_token_bucket_paces_requests(clock):
+    bucket = TokenBucket(5)
+
+    # A full bucket allows a burst, then one request every 1/rate seconds
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.now == 0
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.now == pytest.approx(1.0)
+
+    bucket.pause(RATE_LIMIT_PENALTY_SECONDS)
+    bucket.acquire()
+    assert clock.now == pytest.approx(1.0 + RATE_LIMIT_PENALTY_SECONDS + 0.2)
+
+
+def test_rate_limited_chunk_waits_out_the_penalty(clock):
+    session = mock.MagicMock()
+    session.request.side_effect = [
+        # No Retry-After header, as is usual from Airtable
+        error_response(429),
+        MockResponse({'records': [{'id': 'rec1'}]}, 200),
+        MockResponse({'records': [{'id': 'rec2'}]}, 200),
+    ]
+    writer = BatchWriter('https://api.airtable.test/v0/app/Events', {}, session, max_workers=1)
+
+    report = writer.write('post', [{'fields': {}} for _ in range(20)])
+
+    assert [record['id'] for record in report.succeeded] == ['rec1', 'rec2']
+    assert not report.failed
+    # Airtable's penalty is waited out before retrying, rather than the
+    # usual backoff
+    assert clock.now >= RATE_LIMIT_PENALTY_SECONDS
+    assert session.request.call_count == 3
+    assert all(
+        len(call.kwargs['json']['records']) == batch_writer.MAX_RECORDS_PER_REQUEST
+        for call in session.request.call_args_list
+    )
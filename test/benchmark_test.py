@@ -0,0 +1,28 @@
+from benchmark import run
+from benchmark import synthetic
+
+
+def test_generate():
+    data = synthetic.generate(500, groups=3, seed=1)
+
+    assert data.event_count == 500
+    assert set(data.events_by_group) == {'Group 0', 'Group 1', 'Group 2'}
+    # The same seed gives the same data
+    assert data == synthetic.generate(500, groups=3, seed=1)
+    assert len(data.airtable_records) == (
+        len(data.source_events()) - data.new + data.orphaned
+    )
+
+
+def test_handler_against_stand_ins():
+    data = synthetic.generate(300, groups=3, seed=2)
+    args = run.default_args(airtable_rate_limit=20, write_requests_per_second=1000)
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, airtable_stand_in), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            run.quiet():
+        sync.handler({'dryrun': False})
+
+    # Only new and changed events are written
+    assert airtable_stand_in.written_count == data.new + data.changed
+    assert airtable_stand_in.request_count > 0
@@ -0,0 +1,106 @@
+import unittest.mock as mock
+
+from actionnetwork_test import fake_get
+from benchmark import run
+from benchmark import synthetic
+from event_connectors.actionnetwork import iter_checkpointed_pages
+from sync_state.checkpoints import Checkpoint
+from sync_state.stores import LocalFileStore
+
+
+def test_resume_fetch(tmp_path):
+    store = LocalFileStore(tmp_path)
+    session = mock.MagicMock()
+    session.get.side_effect = fake_get
+
+    # The run is cut short after the first page
+    pages = iter_checkpointed_pages('Boston DSA', 'key', Checkpoint(store), session)
+    first_page = next(pages)
+    pages.close()
+    assert session.get.call_count == 2
+
+    # The next run replays the first page, then fetches the second page only
+    session.reset_mock()
+    checkpoint = Checkpoint(store)
+    assert checkpoint.resumed
+    pages = list(iter_checkpointed_pages('Boston DSA', 'key', checkpoint, session))
+    assert pages[0] == first_page
+    assert len(pages) == 2
+    urls = [call.args[0] for call in session.get.call_args_list]
+    assert urls == [
+        'https://actionnetwork.org/api/v2/',
+        'https://actionnetwork.org/api/v2/events?page=2',
+    ]
+
+    # Once a group is fully fetched, it makes no requests at all
+    session.reset_mock()
+    pages = list(iter_checkpointed_pages('Boston DSA', 'key', Checkpoint(store), session))
+    assert len(pages) == 2
+    assert session.get.call_count == 0
+
+
+def test_checkpoint_discarded_for_other_run(tmp_path):
+    store = LocalFileStore(tmp_path)
+    Checkpoint(store, run={'full_sync': True}).save_page('Boston DSA', [], None)
+
+    assert Checkpoint(store, run={'full_sync': True}).resumed
+    assert not Checkpoint(store, run={'full_sync': False}).resumed
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_handler_resumes_writes(tmp_path):
+    data = synthetic.generate(300, groups=3, seed=3)
+    args = run.default_args(airtable_rate_limit=20, write_requests_per_second=1000)
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, airtable_stand_in), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            mock.patch.object(sync, 'SYNC_STATE_DIR', str(tmp_path)), \
+            mock.patch.object(sync, 'SYNC_CHECKPOINTS', True), \
+            run.quiet():
+        # The run is cut short once the new events have been written
+        with mock.patch(
+            'event_connectors.airtable.Airtable.update_events',
+            side_effect=TimeoutError,
+        ):
+            try:
+                sync.handler({'dryrun': False})
+            except TimeoutError:
+                pass
+        assert airtable_stand_in.written_count == data.new
+        fetch_requests = actionnetwork_stand_in.request_count
+
+        result = sync.handler({'dryrun': False})
+
+    # The next run neither fetches again nor writes the new events twice
+    assert actionnetwork_stand_in.request_count == fetch_requests
+    assert airtable_stand_in.written_count == data.new + data.changed
+    assert result['written_events'] == data.changed
+    assert result['new_events'] == data.new
+    # The checkpoint is cleared once the run is done
+    assert not any(path.name.startswith('checkpoint') for path in tmp_path.iterdir())
+
+
+def test_checkpoint_with_empty_previous_description(tmp_path):
+    data = synthetic.generate(100, groups=2, seed=8)
+    descriptions = {e.actionnetwork_id: e.description for e in data.source_events()}
+    # A synced row whose description was cleared by hand; Airtable leaves
+    # the empty cell out of the row
+    record = next(
+        record for record in data.airtable_records
+        if not record['fields'].get('removed')
+        and record['fields']['Description'] == descriptions.get(record['fields']['actionnetwork_id'])
+    )
+    del record['fields']['Description']
+    args = run.default_args(airtable_rate_limit=20, write_requests_per_second=1000)
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, airtable_stand_in), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            mock.patch.object(sync, 'SYNC_STATE_DIR', str(tmp_path)), \
+            mock.patch.object(sync, 'SYNC_CHECKPOINTS', True), \
+            run.quiet():
+        result = sync.handler({'dryrun': False})
+
+    assert result['changed_events'] == data.changed + 1
+    assert airtable_stand_in.records[record['id']]['fields']['Description'] == (
+        descriptions[record['fields']['actionnetwork_id']]
+    )
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Modules import each other relative to src, as they do when deployed, and
+# the benchmark harness is imported from the repo root
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / 'src'), str(ROOT)]
@@ -0,0 +1,175 @@
+import dataclasses
+import sys
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+
+from actionnetwork_test import ACTION_NETWORK_EVENTS
+from event_models.events import EASTERN
+from event_models.events import ActionNetworkEvent
+from event_models.events import ActionNetworkRecord
+from event_models.events import AirtableEvent
+from event_models.events import EventDiffer
+
+
+def airtable_event(actionnetwork_id, start):
+    event = AirtableEvent({'id': f'rec{actionnetwork_id}'})
+    event.actionnetwork_id = actionnetwork_id
+    event.title = 'title'
+    event.start = start
+    return event
+
+
+def test_out_of_window_events_are_not_orphaned():
+    window_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    destination_events = [
+        # Started before the window
+        airtable_event('1', datetime(2023, 6, 1, 18, tzinfo=EASTERN)),
+        airtable_event('2', datetime(2024, 3, 1, 18, tzinfo=EASTERN)),
+        airtable_event('3', datetime(2025, 3, 1, 18, tzinfo=EASTERN)),
+    ]
+
+    differ = EventDiffer([], destination_events, window_start=window_start)
+    differ.match_events()
+
+    assert list(differ.destination_only_events) == ['2', '3']
+
+
+def test_source_events_before_the_window_are_ignored():
+    window_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    past, upcoming = (
+        ActionNetworkEvent(dict(ACTION_NETWORK_EVENTS[0][0], identifiers=[f'action_network:{i}'], start_date=start))
+        for i, start in (('1', '2023-06-01T18:00:00'), ('2', '2024-03-01T18:00:00'))
+    )
+
+    differ = EventDiffer([past, upcoming], [], window_start=window_start)
+    differ.match_events()
+
+    assert [event.actionnetwork_id for event in differ.events_to_add()] == ['2']
+
+
+def test_event_fields_are_computed_once_per_class():
+    # The same set every time, rather than rebuilt from dir() on each call
+    assert AirtableEvent.event_fields() is AirtableEvent.event_fields()
+    # Helpers defined on Event, and derived fields, are left out
+    assert ActionNetworkEvent.event_fields() == {
+        'actionnetwork_id', 'actionnetwork_link', 'title', 'description',
+        'host_group', 'start', 'end', 'location', 'removed',
+    }
+    assert AirtableEvent.event_fields() == (
+        ActionNetworkEvent.event_fields() | {'airtable_id', 'source_fingerprint'}
+    )
+
+
+def synced_with_fingerprint(source_event):
+    differ = EventDiffer([source_event], [], use_fingerprints=True)
+    differ.match_events()
+    [event] = differ.events_to_add()
+    event.airtable_id = 'rec1'
+    # Descriptions are not read along with fingerprints
+    del event.raw['fields']['Description']
+    return event
+
+
+def test_unchanged_fingerprints_are_skipped():
+    source_event = ActionNetworkEvent(ACTION_NETWORK_EVENTS[0][0])
+    synced = synced_with_fingerprint(source_event)
+
+    differ = EventDiffer([source_event], [synced], use_fingerprints=True)
+    differ.match_events()
+    assert differ.events_to_update() == []
+
+    differ = EventDiffer(
+        [ActionNetworkEvent(dict(ACTION_NETWORK_EVENTS[0][0], title='renamed'))],
+        [synced],
+        use_fingerprints=True,
+    )
+    differ.match_events()
+    [event] = differ.events_to_update()
+    assert event.title == 'renamed'
+    assert event.source_fingerprint != synced.source_fingerprint
+
+
+def test_unread_descriptions_are_compared_by_fingerprint():
+    source_event = ActionNetworkEvent(ACTION_NETWORK_EVENTS[0][0])
+    synced = synced_with_fingerprint(source_event)
+
+    for edit, expected_fields in [
+        ({'title': 'renamed'}, {'title', 'source_fingerprint'}),
+        ({'description': 'edited'}, {'description', 'source_fingerprint'}),
+    ]:
+        differ = EventDiffer(
+            [ActionNetworkEvent(dict(ACTION_NETWORK_EVENTS[0][0], **edit))],
+            [synced],
+            use_fingerprints=True,
+        )
+        differ.match_events()
+        differ.events_to_update()
+        assert differ.changed_fields == {'rec1': expected_fields}
+
+    # Fingerprints stored before descriptions had their own can't rule out
+    # a changed description
+    synced.source_fingerprint = source_event.fingerprint()
+    differ = EventDiffer(
+        [ActionNetworkEvent(dict(ACTION_NETWORK_EVENTS[0][0], title='renamed'))],
+        [synced],
+        use_fingerprints=True,
+    )
+    differ.match_events()
+    differ.events_to_update()
+    assert differ.changed_fields == {'rec1': {'title', 'description', 'source_fingerprint'}}
+
+
+def test_streaming_differ_matches_list_differ():
+    first, third = ACTION_NETWORK_EVENTS[0][0], ACTION_NETWORK_EVENTS[1][0]
+    differ = EventDiffer([ActionNetworkEvent(first)], [])
+    differ.match_events()
+    [synced] = differ.events_to_add()
+    synced.airtable_id = 'rec1'
+
+    source_events = [
+        ActionNetworkEvent(dict(first, title='renamed')),
+        ActionNetworkEvent(third),
+    ]
+    # An outdated copy of an event comes through first, as with
+    # co-sponsored events while streaming
+    outdated = ActionNetworkEvent(dict(first, title='outdated'))
+
+    results = []
+    for events_from_source in ([outdated] + source_events, iter([outdated] + source_events)):
+        differ = EventDiffer(events_from_source, [synced])
+        differ.match_events()
+        results.append((
+            [e.raw for e in differ.events_to_add()],
+            [(e.primary_id, e.raw) for e in differ.events_to_update()],
+            differ.changed_fields,
+            differ.source_count,
+        ))
+
+    listed, streamed = results
+    assert streamed == listed
+    assert [raw['fields']['Event Title'] for raw in listed[0]] == ['event_3']
+    assert listed[2] == {'rec1': {'title'}}
+
+
+def test_records_match_the_events_they_were_made_from():
+    event = ActionNetworkEvent(ACTION_NETWORK_EVENTS[0][0])
+    record = event.to_record()
+
+    assert isinstance(record, ActionNetworkRecord)
+    assert record.event_info() == event.event_info()
+    assert record.fingerprint() == event.fingerprint()
+    assert record.updated_at == event.updated_at
+    # Equal to other records with the same fields, like other events
+    assert record == ActionNetworkEvent(dict(ACTION_NETWORK_EVENTS[0][0])).to_record()
+    assert record != dataclasses.replace(record, title='renamed')
+    assert record != event
+
+    assert record.translate_to(AirtableEvent).raw == event.translate_to(AirtableEvent).raw
+
+    # Compact and read-only
+    assert not hasattr(record, '__dict__')
+    assert record.location is sys.intern(event.location)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        record.title = 'renamed'
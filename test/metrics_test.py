@@ -0,0 +1,52 @@
+import json
+
+from benchmark import run
+from benchmark import synthetic
+from event_connectors.metrics import Metrics
+
+
+def test_documents():
+    metrics = Metrics(namespace='Test', dimensions={'Service': 'sync'})
+    metrics.add('new_events', 3)
+    metrics.add('new_events', 2)
+    metrics.add('actionnetwork_fetch_seconds', 1.5, unit='Seconds', group='Group 0')
+
+    run_document, group_document = metrics.documents(timestamp=1000)
+
+    assert run_document == {
+        '_aws': {
+            'Timestamp': 1000,
+            'CloudWatchMetrics': [{
+                'Namespace': 'Test',
+                'Dimensions': [['Service']],
+                'Metrics': [{'Name': 'new_events', 'Unit': 'Count'}],
+            }],
+        },
+        'Service': 'sync',
+        'new_events': 5,
+    }
+    assert group_document['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Service', 'Group']]
+    assert group_document['Group'] == 'Group 0'
+    assert group_document['actionnetwork_fetch_seconds'] == 1.5
+
+
+def test_handler_emits_metrics(capsys):
+    data = synthetic.generate(200, groups=2, seed=3)
+    # Low enough that Airtable rate limits the writes
+    args = run.default_args(airtable_rate_limit=2)
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, airtable_stand_in), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync:
+        sync.handler({'dryrun': False})
+
+    documents = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+        if line.startswith('{"_aws"')
+    ]
+    run_document = documents[0]
+    assert run_document['actionnetwork_requests'] == actionnetwork_stand_in.request_count
+    assert run_document['airtable_requests'] == airtable_stand_in.request_count
+    assert run_document['airtable_rate_limited'] == airtable_stand_in.rate_limited_count > 0
+    assert run_document['airtable_bytes_received'] > 0
+    assert run_document['written_events'] == data.new + data.changed
+    assert {d.get('Group') for d in documents[1:]} == {'Group 0', 'Group 1'}
@@ -0,0 +1,86 @@
+import unittest.mock as mock
+
+import pytest
+import sync
+from actionnetwork_test import ACTION_NETWORK_EVENTS
+from benchmark import run
+from benchmark import synthetic
+from event_models.events import ActionNetworkEvent
+from event_models.events import AirtableEvent
+from event_models.events import EventDiffer
+from sync_state.plans import Plan
+
+
+def test_plan_then_apply(tmp_path):
+    data = synthetic.generate(300, groups=3, seed=5)
+    args = run.default_args(airtable_rate_limit=20, write_requests_per_second=1000)
+    path = str(tmp_path / 'plan.json.gz')
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, airtable_stand_in), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            run.quiet():
+        result = sync.handler({'dryrun': False, 'plan': path})
+        # Saving a plan never writes
+        assert airtable_stand_in.written_count == 0
+        assert result['new_events'] == data.new
+        assert result['changed_events'] == data.changed
+
+        changeset = Plan.load(path)
+        assert len(changeset.new_events) == data.new
+        assert len(changeset.changed_events) == data.changed
+        # Updates only hold the changed fields, and what they were before
+        event, modified, previous = changeset.changed_events[0]
+        assert airtable_stand_in.records[event.airtable_id]['fields']['modified'] == modified
+        assert set(previous) < set(event.raw['fields'])
+
+        # Someone edits a planned row before the plan is applied
+        airtable_stand_in.records[event.airtable_id]['fields']['modified'] = '2024-06-02T00:00:00.000Z'
+        fetch_requests = actionnetwork_stand_in.request_count
+
+        result = sync.apply_plan(path)
+        assert result['skipped_changes'] == 1
+        assert airtable_stand_in.written_count == data.new + data.changed - 1
+        assert actionnetwork_stand_in.request_count == fetch_requests
+
+        # Applying the plan again leaves out everything it already wrote
+        result = sync.apply_plan(path)
+        assert result['written_events'] == 0
+        assert result['skipped_changes'] == data.new + data.changed
+
+
+def test_apply_plan_for_other_base(tmp_path):
+    path = str(tmp_path / 'plan.json')
+    Plan(base_id='appOther').save(path)
+
+    with mock.patch.object(sync, 'credentials', return_value=(None, 'token', 'appEvents')), \
+            pytest.raises(RuntimeError, match='appOther'):
+        sync.apply_plan(path)
+
+
+def test_plan_with_empty_previous_values():
+    source_event = ActionNetworkEvent(ACTION_NETWORK_EVENTS[0][0]).to_record()
+    synced = source_event.translate_to(AirtableEvent)
+    synced.airtable_id = 'rec1'
+    synced.set('2024-01-01T00:00:00.000Z', 'fields', 'modified')
+    # Airtable leaves empty cells out of a row
+    for column in ('Description', 'Start Time', 'End Time'):
+        del synced.raw['fields'][column]
+
+    differ = EventDiffer([source_event], [synced])
+    differ.match_events()
+    changed_events = differ.events_to_update()
+    changeset = Plan.from_differ(differ, [], changed_events, [], base_id='appEvents')
+    changeset = Plan.from_document(changeset.to_document())
+
+    [(event, modified, previous)] = changeset.changed_events
+    assert event.raw == {
+        'id': 'rec1',
+        'fields': {
+            'actionnetwork_id': '1',
+            'Description': 'test',
+            'Start Time': '2018-12-12T12:00:00-05:00',
+            'End Time': '2018-12-12T13:00:00-05:00',
+        },
+    }
+    assert modified == '2024-01-01T00:00:00.000Z'
+    assert previous == {'Description': None, 'Start Time': None, 'End Time': None}
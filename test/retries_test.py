@@ -0,0 +1,122 @@
+import unittest.mock as mock
+
+import pytest
+import requests
+
+from actionnetwork_test import MockResponse
+from actionnetwork_test import fake_get
+from event_connectors import retries
+from event_connectors.actionnetwork import ActionNetwork
+from event_connectors.metrics import start_metrics
+from event_connectors.retries import CircuitOpenError
+from event_connectors.retries import RetryPolicy
+from event_connectors.retries import request_with_retries
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(retries, '_breakers', {})
+    monkeypatch.setattr(retries.time, 'sleep', mock.MagicMock())
+
+
+def error_response(status_code, headers=None):
+    response = MockResponse({}, status_code)
+    response.headers = headers or {}
+    return response
+
+
+def test_retries_with_retry_after():
+    metrics = start_metrics()
+    send = mock.MagicMock(side_effect=[
+        error_response(503, {'Retry-After': '2'}),
+        MockResponse({}, 200),
+    ])
+
+    response = request_with_retries(send, 'https://example.test/', 'test')
+
+    assert response.status_code == 200
+    retries.time.sleep.assert_called_once_with(2.0)
+    assert metrics.values['test_retries'] == 1
+    assert metrics.values['test_requests'] == 2
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(backoff_seconds=1, max_backoff_seconds=5)
+
+    assert 0.5 <= policy.delay(None, 0) <= 1.5
+    assert policy.delay(None, 10) == 5
+
+
+def test_circuit_breaker_fails_fast():
+    metrics = start_metrics()
+    send = mock.MagicMock(side_effect=requests.exceptions.ConnectionError)
+    policy = RetryPolicy(max_retries=10)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        request_with_retries(send, 'https://down.test/a', 'test', policy)
+    # Retrying stops once the breaker opens
+    assert send.call_count == retries.DEFAULT_FAILURE_THRESHOLD
+
+    # Other requests to the host aren't even attempted
+    with pytest.raises(CircuitOpenError):
+        request_with_retries(send, 'https://down.test/b', 'test', policy)
+    assert send.call_count == retries.DEFAULT_FAILURE_THRESHOLD
+    assert metrics.values['test_circuit_opened'] == 1
+    assert metrics.values['test_circuit_rejected'] == 1
+
+    # The breaker lets requests through again once it resets
+    breaker = retries.circuit_breaker('https://down.test/')
+    breaker.opened_at -= breaker.reset_seconds
+    send.side_effect = None
+    send.return_value = MockResponse({}, 200)
+    assert request_with_retries(send, 'https://down.test/c', 'test').status_code == 200
+    assert not breaker.is_open
+
+
+def test_actionnetwork_retries_failed_page():
+    pages = {'failures': 0}
+
+    def flaky_get(url, *args, **kwargs):
+        if 'page=2' in url and pages['failures'] < 2:
+            pages['failures'] += 1
+            return error_response(502)
+        return fake_get(url, *args, **kwargs)
+
+    session = mock.MagicMock()
+    session.get.side_effect = flaky_get
+
+    events = ActionNetwork('key', session=session).events()
+
+    assert [e.actionnetwork_id for e in events] == ['1', '3']
+
+
+def test_actionnetwork_failed_page_fails_group():
+    def failing_get(url, *args, **kwargs):
+        if 'page=2' in url:
+            return error_response(404)
+        return fake_get(url, *args, **kwargs)
+
+    session = mock.MagicMock()
+    session.get.side_effect = failing_get
+
+    # Rather than being mistaken for the last page
+    with pytest.raises(requests.exceptions.HTTPError):
+        ActionNetwork('key', session=session).events()
+
+
+def test_non_idempotent_requests_are_only_retried_when_not_acted_on():
+    def attempts(*outcomes):
+        send = mock.MagicMock(side_effect=outcomes)
+        try:
+            request_with_retries(send, 'https://example.test/', 'test', idempotent=False)
+        except requests.exceptions.RequestException:
+            pass
+        return send.call_count
+
+    ok = MockResponse({}, 200)
+    # The server may have acted on these, so sending again could repeat it
+    assert attempts(requests.exceptions.ReadTimeout(), ok) == 1
+    assert attempts(error_response(500), ok) == 1
+    # But not on these
+    assert attempts(requests.exceptions.ConnectTimeout(), ok) == 2
+    assert attempts(error_response(429), ok) == 2
@@ -0,0 +1,120 @@
+import json
+import os
+import unittest.mock as mock
+
+import botocore.session
+from botocore.stub import Stubber
+
+from benchmark.import_time import import_time
+from event_connectors.secrets import SecretCache
+
+
+def secret_value(name, secret):
+    return {
+        'Name': name,
+        'ARN': f'arn:aws:secretsmanager:us-east-1:000000000000:secret:{name}',
+        'SecretString': json.dumps(secret),
+    }
+
+
+def fake_client():
+    client = mock.MagicMock()
+    client.batch_get_secret_value.side_effect = lambda SecretIdList: {
+        'SecretValues': [
+            secret_value(name, {'name': name}) for name in SecretIdList
+        ],
+        'Errors': [],
+    }
+    return client
+
+
+def test_secrets_are_fetched_together():
+    client = fake_client()
+    secrets = SecretCache(client=client)
+
+    assert secrets.get('actionnetwork', 'airtable') == {
+        'actionnetwork': {'name': 'actionnetwork'},
+        'airtable': {'name': 'airtable'},
+    }
+    client.batch_get_secret_value.assert_called_once_with(
+        SecretIdList=['actionnetwork', 'airtable']
+    )
+
+    # Cached secrets aren't fetched again
+    assert secrets.get('airtable') == {'airtable': {'name': 'airtable'}}
+    assert client.batch_get_secret_value.call_count == 1
+
+
+@mock.patch('event_connectors.secrets.time.monotonic')
+def test_secrets_expire(monotonic):
+    client = fake_client()
+    secrets = SecretCache(ttl=60, client=client)
+
+    monotonic.return_value = 1000
+    secrets.get('actionnetwork', 'airtable')
+    monotonic.return_value = 1059
+    secrets.get('actionnetwork', 'airtable')
+    assert client.batch_get_secret_value.call_count == 1
+
+    monotonic.return_value = 1060
+    secrets.get('actionnetwork', 'airtable')
+    assert client.batch_get_secret_value.call_count == 2
+
+
+def stubbed_client():
+    """A real Secrets Manager client, whose requests are checked against the
+    API model rather than sent."""
+    client = botocore.session.get_session().create_client(
+        'secretsmanager',
+        region_name='us-east-1',
+        aws_access_key_id='test',
+        aws_secret_access_key='test',
+    )
+    return client, Stubber(client)
+
+
+def test_secrets_are_fetched_with_batch_get_secret_value():
+    client, stubber = stubbed_client()
+    stubber.add_response(
+        'batch_get_secret_value',
+        {
+            'SecretValues': [secret_value('actionnetwork', {'name': 'actionnetwork'})],
+            'Errors': [],
+        },
+        {'SecretIdList': ['actionnetwork']},
+    )
+
+    with stubber:
+        secrets = SecretCache(client=client).get('actionnetwork')
+
+    assert secrets == {'actionnetwork': {'name': 'actionnetwork'}}
+    stubber.assert_no_pending_responses()
+
+
+def test_secrets_are_fetched_one_at_a_time_without_batch_api(monkeypatch):
+    client, stubber = stubbed_client()
+    # As in botocore releases from before BatchGetSecretValue
+    monkeypatch.delattr(type(client), 'batch_get_secret_value')
+    for name in ('actionnetwork', 'airtable'):
+        stubber.add_response(
+            'get_secret_value',
+            secret_value(name, {'name': name}),
+            {'SecretId': name},
+        )
+
+    with stubber:
+        secrets = SecretCache(client=client).get('actionnetwork', 'airtable')
+
+    assert secrets == {
+        'actionnetwork': {'name': 'actionnetwork'},
+        'airtable': {'name': 'airtable'},
+    }
+    stubber.assert_no_pending_responses()
+
+
+def test_imports_dont_load_boto3():
+    # Checked in a fresh interpreter, as other tests may have loaded boto3
+    env = {**os.environ, 'AWS_DEFAULT_REGION': 'us-east-1'}
+    for module in ('sync', 'alarm'):
+        _, boto3_imported = import_time(module, env)
+        assert not boto3_imported
@@ -0,0 +1,32 @@
+import unittest.mock as mock
+
+import requests
+
+from actionnetwork_test import fake_get
+from event_connectors.actionnetwork import ActionNetwork
+from event_connectors.session import TimeoutSession
+from event_connectors.session import shared_session
+
+
+def test_clients_share_one_session():
+    with mock.patch.object(shared_session(), 'get', side_effect=fake_get) as get:
+        boston = ActionNetwork('key_1')
+        cambridge = ActionNetwork('key_2')
+
+    # Connections are pooled across groups, and across warm invocations
+    assert boston.session is cambridge.session is shared_session()
+    assert get.call_count == 2
+    assert shared_session(timeout=(1, 2)) is shared_session(timeout=(1, 2))
+    assert shared_session(timeout=(1, 2)) is not shared_session()
+
+
+def test_session_applies_default_timeout():
+    session = TimeoutSession(timeout=(1, 2), pool_maxsize=3)
+
+    with mock.patch.object(requests.Session, 'request') as request:
+        session.get('https://example.test/')
+        session.get('https://example.test/', timeout=10)
+
+    assert request.call_args_list[0].kwargs['timeout'] == (1, 2)
+    assert request.call_args_list[1].kwargs['timeout'] == 10
+    assert session.get_adapter('https://example.test/')._pool_maxsize == 3
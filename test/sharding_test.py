@@ -0,0 +1,99 @@
+import unittest.mock as mock
+
+import pytest
+
+from benchmark import run
+from benchmark import synthetic
+from event_connectors.invokers import LocalInvoker
+
+
+def test_shard_groups():
+    import sync
+
+    group_key_map = {'c': 'key', 'a': 'key', 'd': '', 'b': 'key'}
+
+    assert sync.shard_groups(group_key_map, 2) == [['a', 'c'], ['b']]
+    # Never more shards than groups
+    assert sync.shard_groups(group_key_map, 5) == [['a'], ['b'], ['c']]
+
+
+def test_sharded_sync_against_stand_ins():
+    data = synthetic.generate(300, groups=5, seed=4)
+    args = run.default_args(write_requests_per_second=1000)
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, airtable_stand_in), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            mock.patch.object(sync, 'SYNC_FUNCTION_NAME', None), \
+            run.quiet():
+        result = sync.handler({'dryrun': False, 'shards': 3})
+
+    assert [shard['groups'] for shard in result['shards']] == [
+        ['Group 0', 'Group 3'], ['Group 1', 'Group 4'], ['Group 2'],
+    ]
+    assert airtable_stand_in.written_count == data.new + data.changed
+    # Each shard only sees its own groups' events, so only the coordinator
+    # can tell which events have gone from ActionNetwork
+    assert result['destination_only_ids'] == sorted(
+        f'orphan-{i}' for i in range(data.orphaned)
+    )
+
+
+def test_cross_shard_cosponsored_event_is_written_once():
+    data = synthetic.generate(100, groups=2, seed=5)
+    args = run.default_args(write_requests_per_second=1000)
+    # A new event co-sponsored by groups that end up in different shards
+    cosponsored = dict(
+        data.events_by_group['Group 0'][0],
+        identifiers=['action_network:cosponsored'],
+        status='confirmed',
+        origin_system='Action Network',
+    )
+    data.events_by_group['Group 0'].append(cosponsored)
+    data.events_by_group['Group 1'].append(dict(cosponsored))
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, airtable_stand_in), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            mock.patch.object(sync, 'SYNC_FUNCTION_NAME', None), \
+            run.quiet():
+        read_events = sync.Airtable.events
+
+        # As if both shards read Airtable before either one wrote to it
+        def events(self, **kwargs):
+            return [
+                event for event in read_events(self, **kwargs)
+                if not event.airtable_id.startswith('recnew')
+            ]
+
+        with mock.patch.object(sync.Airtable, 'events', events):
+            result = sync.handler({'dryrun': False, 'shards': 2})
+
+    assert [shard['groups'] for shard in result['shards']] == [['Group 0'], ['Group 1']]
+    # The only new event in Group 1, which was new to both shards
+    assert result['shards'][1]['new_events'] == 1
+    assert [
+        record for record in airtable_stand_in.records.values()
+        if record['fields'].get('actionnetwork_id') == 'cosponsored'
+    ] == [mock.ANY]
+
+
+def test_failed_shard_fails_the_sync():
+    import sync
+
+    def shard_handler(event):
+        if event['shard']['index'] == 1:
+            raise RuntimeError('shard failed')
+        return {
+            'groups': event['shard']['groups'],
+            'failed_groups': [],
+            'source_events': 0,
+            'new_events': 0,
+            'changed_events': 0,
+            'removed_events': 0,
+            'written_events': 0,
+            'destination_only_ids': [],
+        }
+
+    group_key_map = {'a': 'key', 'b': 'key'}
+    with mock.patch.object(sync, 'credentials', return_value=(group_key_map, None, None)), \
+            run.quiet(), pytest.raises(RuntimeError, match='1 of 2 shards failed'):
+        sync.coordinate({}, 2, LocalInvoker(shard_handler))
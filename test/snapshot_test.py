@@ -0,0 +1,71 @@
+import dataclasses
+from datetime import timezone
+
+from actionnetwork_test import ACTION_NETWORK_EVENTS
+from event_connectors.batch_writer import WriteReport
+from event_models.events import ActionNetworkEvent
+from event_models.events import AirtableEvent
+from sync_state.snapshots import Snapshot
+from sync_state.stores import LocalFileStore
+
+
+def test_snapshot_skips_synced_events(tmp_path):
+    store = LocalFileStore(str(tmp_path))
+    first, second = (
+        ActionNetworkEvent(raw_event).to_record()
+        for raw_event in (ACTION_NETWORK_EVENTS[0][0], ACTION_NETWORK_EVENTS[1][0])
+    )
+
+    snapshot = Snapshot(store)
+    assert list(snapshot.track([first, second], only_changed=True)) == [first, second]
+    report = WriteReport()
+    report.succeeded = [{'id': 'rec1', 'fields': {'actionnetwork_id': '1', 'modified': '2024-01-01'}}]
+    report.failed = [({'fields': {'actionnetwork_id': '3'}}, '422: INVALID_VALUE')]
+    snapshot.commit(report)
+
+    # Only the event that was written is part of the snapshot
+    snapshot = Snapshot(store)
+    assert snapshot.entries == {
+        '1': {
+            'source_fingerprint': first.fingerprint(),
+            'source_updated_at': first.updated_at,
+            'airtable_id': 'rec1',
+            'destination_updated_at': '2024-01-01',
+            'destination_fingerprint': Snapshot.destination_fingerprint(report.succeeded[0]),
+        },
+    }
+
+    # So the next run only passes on the event that failed, and changed ones
+    edited = dataclasses.replace(first, title='renamed')
+    assert list(snapshot.track([first, second], only_changed=True)) == [second]
+    assert list(snapshot.track([edited], only_changed=True)) == [edited]
+
+
+def test_snapshot_passes_on_events_whose_rows_were_edited(tmp_path):
+    store = LocalFileStore(str(tmp_path))
+    event = ActionNetworkEvent(ACTION_NETWORK_EVENTS[0][0]).to_record()
+    written = event.translate_to(AirtableEvent)
+    written.raw['id'] = 'rec1'
+    written.raw['fields']['modified'] = '2024-01-01T00:00:00.000Z'
+
+    snapshot = Snapshot(store)
+    list(snapshot.track([event]))
+    report = WriteReport()
+    report.succeeded = [{'id': 'rec1', 'fields': written.raw['fields']}]
+    snapshot.commit(report)
+
+    snapshot = Snapshot(store)
+    assert snapshot.modified_since() == '2024-01-01T00:00:00.000Z'
+    # Times read back in UTC match the times that were written
+    read = AirtableEvent({'id': 'rec1', 'fields': dict(written.raw['fields'])})
+    read.start = written.start.astimezone(timezone.utc)
+    assert snapshot.edited([read]) == set()
+    assert list(snapshot.track([event], only_changed=True)) == []
+
+    read.title = 'Edited by hand'
+    assert snapshot.edited([read]) == {event.actionnetwork_id}
+    assert list(snapshot.track([event], only_changed=True, edited_ids={event.actionnetwork_id})) == [event]
+
+    # An edit that wasn't synced over is still found by the next run
+    snapshot.commit(destination_events=[read])
+    assert Snapshot(store).edited([read]) == {event.actionnetwork_id}
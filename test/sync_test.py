@@ -0,0 +1,116 @@
+import asyncio
+import random
+import threading
+import unittest.mock as mock
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from benchmark import run
+from benchmark import synthetic
+from event_models.events import ActionNetworkEvent
+from event_models.events import EventDiffer
+from sync_state.stores import LocalFileStore
+
+
+def test_airtable_read_overlaps_actionnetwork_fetch():
+    data = synthetic.generate(100, groups=2, seed=6)
+    args = run.default_args(airtable_rate_limit=20, write_requests_per_second=1000)
+    reading = threading.Event()
+    fetching = threading.Event()
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, _), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            run.quiet():
+        read_events = sync.Airtable.events
+        fetch_group_events = sync.fetch_group_events
+
+        # Each side only carries on once the other has started
+        def events(self, **kwargs):
+            reading.set()
+            assert fetching.wait(5)
+            return read_events(self, **kwargs)
+
+        def fetch(*args, **kwargs):
+            fetching.set()
+            assert reading.wait(5)
+            return fetch_group_events(*args, **kwargs)
+
+        with mock.patch.object(sync.Airtable, 'events', events), \
+                mock.patch.object(sync, 'fetch_group_events', fetch):
+            result = sync.handler({'dryrun': True})
+
+    assert result['new_events'] == data.new
+    assert result['changed_events'] == data.changed
+
+
+def test_window_covers_upcoming_events_created_before_it():
+    data = synthetic.generate(50, groups=1, seed=7)
+    args = run.default_args(airtable_rate_limit=20, write_requests_per_second=1000)
+    now = datetime.now(timezone.utc)
+    # Every synthetic event started long ago, other than this one, which is
+    # coming up but was created (and synced) well before the window
+    [raw_events] = data.events_by_group.values()
+    upcoming = raw_events[0]
+    upcoming.update(
+        start_date=(now + timedelta(days=30)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        created_date=(now - timedelta(days=400)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        status='confirmed',
+        origin_system='Action Network',
+    )
+    upcoming.pop('end_date', None)
+    record = synthetic.airtable_record(random.Random(0), ActionNetworkEvent(upcoming), 'recupcoming')
+    record['createdTime'] = upcoming['created_date']
+    record['fields']['Event Title'] += ' (old title)'
+    data.airtable_records = [
+        existing for existing in data.airtable_records
+        if existing['fields']['actionnetwork_id'] != record['fields']['actionnetwork_id']
+    ] + [record]
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, _), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            run.quiet():
+        result = sync.handler({'dryrun': True, 'window_days': 7})
+
+    assert result['new_events'] == 0
+    assert result['changed_events'] == 1
+
+
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def test_blocking_stages_run_off_the_event_loop(tmp_path):
+    data = synthetic.generate(100, groups=2, seed=8)
+    args = run.default_args(airtable_rate_limit=20, write_requests_per_second=1000)
+    saved_on_loop = []
+    matched_on_loop = []
+    save = LocalFileStore.save
+    match_events = EventDiffer.match_events
+
+    def record_save(self, *args, **kwargs):
+        saved_on_loop.append(on_event_loop())
+        return save(self, *args, **kwargs)
+
+    def record_match_events(self):
+        matched_on_loop.append(on_event_loop())
+        return match_events(self)
+
+    with run.stand_ins(data, args) as (actionnetwork_stand_in, _), \
+            run.configured_sync(actionnetwork_stand_in, args) as sync, \
+            mock.patch.object(sync, 'SYNC_STATE_DIR', str(tmp_path)), \
+            mock.patch.object(sync, 'SYNC_CHECKPOINTS', True), \
+            mock.patch.object(LocalFileStore, 'save', record_save), \
+            mock.patch.object(EventDiffer, 'match_events', record_match_events), \
+            run.quiet():
+        # Checkpoints are saved as pages are fetched and records written
+        sync.handler({'dryrun': False, 'async': True, 'full_sync': True})
+        # The differ waits on the stream's fetches as it consumes it
+        sync.handler({'dryrun': True, 'stream': True, 'full_sync': True})
+
+    assert saved_on_loop and not any(saved_on_loop)
+    assert matched_on_loop == [False, False]
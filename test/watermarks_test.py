@@ -0,0 +1,34 @@
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from sync_state.stores import LocalFileStore
+from sync_state.watermarks import WATERMARK_OVERLAP
+from sync_state.watermarks import Watermarks
+
+
+def test_watermarks_advance_and_overlap(tmp_path):
+    store = LocalFileStore(str(tmp_path))
+    now = datetime(2024, 1, 3, tzinfo=timezone.utc)
+
+    watermarks = Watermarks(store)
+    assert watermarks.full_sync_due(now)
+    assert watermarks.since('Boston DSA') is None
+
+    watermarks.advance({
+        'Boston DSA': ['2024-01-01T10:00:00+00:00', '2024-01-02T10:00:00+00:00', None],
+        'Cambridge DSA': [],
+    }, full_sync=True, now=now)
+
+    # Saved for the next run
+    watermarks = Watermarks(store)
+    newest = datetime(2024, 1, 2, 10, tzinfo=timezone.utc)
+    assert watermarks.since_by_group(['Boston DSA', 'Cambridge DSA']) == {
+        'Boston DSA': (newest - WATERMARK_OVERLAP).isoformat(),
+    }
+    assert not watermarks.full_sync_due(now + timedelta(hours=1))
+    assert watermarks.full_sync_due(now + watermarks.full_sync_interval)
+
+    # Fetching only older events never moves a watermark back
+    watermarks.advance({'Boston DSA': ['2023-12-01T10:00:00+00:00']})
+    assert Watermarks(store).groups['Boston DSA'] == newest.isoformat()
@@ -0,0 +1,72 @@
+import json
+import os
+import unittest.mock as mock
+
+from benchmark.standins import AirtableStandIn
+from event_connectors import airtable
+from event_models.events import ActionNetworkEvent
+from event_models.events import AirtableEvent
+
+import webhook
+
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'webhook_events.json')) as f:
+    PAYLOAD = json.load(f)
+
+
+def existing_record(raw_event, airtable_id, **fields):
+    record = ActionNetworkEvent(raw_event).translate_to(AirtableEvent).raw
+    record['fields'].update(fields)
+    return {'id': airtable_id, 'createdTime': '2024-06-01T00:00:00.000Z', **record}
+
+
+def call(stand_in, body, token='secret', configured_token='secret'):
+    with mock.patch.object(airtable, 'API_URL', stand_in.api_url), \
+            mock.patch.object(webhook, 'WEBHOOK_TOKEN', configured_token), \
+            mock.patch.object(webhook, 'credentials', return_value=(None, 'pat', stand_in.base_id)), \
+            mock.patch.object(airtable.Airtable, 'events', side_effect=AssertionError('full scan')):
+        return webhook.handler({
+            'queryStringParameters': {'token': token},
+            'body': json.dumps(body),
+        })
+
+
+def test_webhook_upserts_changed_events():
+    meeting = PAYLOAD[0]['osdi:event']
+    stand_in = AirtableStandIn([
+        existing_record(meeting, 'recMeeting', **{'Event Title': 'General Meeting'}),
+        existing_record({**meeting, 'identifiers': ['action_network:13']}, 'recOther'),
+    ])
+
+    with stand_in:
+        result = call(stand_in, PAYLOAD)
+        assert result['statusCode'] == 200
+        assert json.loads(result['body']) == {
+            'source_events': 2,
+            'new_events': 1,
+            'changed_events': 1,
+            'written_events': 2,
+        }
+        assert stand_in.records['recMeeting']['fields']['Event Title'] == 'General Meeting (new room)'
+        assert len(stand_in.records) == 3
+
+        # Replaying the webhook changes nothing
+        result = call(stand_in, PAYLOAD)
+        assert json.loads(result['body'])['written_events'] == 0
+        assert stand_in.written_count == 2
+
+
+def test_webhook_rejects_wrong_token():
+    with AirtableStandIn([]) as stand_in:
+        result = call(stand_in, PAYLOAD, token='wrong')
+
+    assert result['statusCode'] == 403
+    assert stand_in.request_count == 0
+
+
+def test_webhook_rejects_requests_without_configured_token():
+    with AirtableStandIn([]) as stand_in:
+        for configured_token in (None, ''):
+            result = call(stand_in, PAYLOAD, token='', configured_token=configured_token)
+            assert result['statusCode'] == 403
+
+    assert stand_in.request_count == 0